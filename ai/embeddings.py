@@ -0,0 +1,132 @@
+# ai/embeddings.py
+import asyncio
+import logging
+import threading
+from typing import List, Sequence
+
+from django.conf import settings
+
+from ai.prompting import count_tokens
+from ai.rate_limits import LIVE, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Embeddings through one ``AsyncOpenAI`` client per process.
+
+    The client and its HTTP connection pool live on a dedicated event loop
+    thread. Async callers on any loop await the request without blocking it
+    or holding a threadpool slot; sync callers (ingestion views, management
+    commands) block only their own thread. At most EMBEDDING_MAX_CONCURRENCY
+    requests are in flight, within the shared rate limits (ai.rate_limits);
+    ingestion passes ``priority=BULK`` so live chat keeps its headroom.
+    Rate limits, timeouts and 5xx responses are retried with backoff.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._limit = None
+
+    @property
+    def default_model(self) -> str:
+        return getattr(settings, 'EMBEDDING_MODEL', 'text-embedding-3-small')
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'EMBEDDING_BATCH_SIZE', 100)
+
+    async def embed(self, text: str, model: str = None, priority: str = LIVE) -> List[float]:
+        """Embedding of one text"""
+        return (await self.embed_many([text], model, priority))[0]
+
+    async def embed_many(self, texts: Sequence[str], model: str = None, priority: str = LIVE) -> List[List[float]]:
+        """Embeddings of several texts, in order; sent in batches of EMBEDDING_BATCH_SIZE"""
+        loop = self._ensure_worker()
+        future = asyncio.run_coroutine_threadsafe(self._embed_many(list(texts), model, priority), loop)
+        return await asyncio.wrap_future(future)
+
+    def embed_sync(self, text: str, model: str = None, priority: str = LIVE) -> List[float]:
+        return self.embed_many_sync([text], model, priority)[0]
+
+    def embed_many_sync(self, texts: Sequence[str], model: str = None, priority: str = LIVE) -> List[List[float]]:
+        loop = self._ensure_worker()
+        future = asyncio.run_coroutine_threadsafe(self._embed_many(list(texts), model, priority), loop)
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(ready,),
+                    name='embeddings',
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_worker(self, ready: threading.Event):
+        import httpx
+        from openai import AsyncOpenAI
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        concurrency = getattr(settings, 'EMBEDDING_MAX_CONCURRENCY', 8)
+        self._limit = asyncio.Semaphore(concurrency)
+        self._client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            # Retried here instead, so rate limits are seen by the limiter
+            max_retries=0,
+            timeout=getattr(settings, 'EMBEDDING_TIMEOUT_SECONDS', 30),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            )
+        )
+        self._loop = loop
+        ready.set()
+        loop.run_forever()
+
+    async def _embed_many(self, texts: List[str], model: str, priority: str) -> List[List[float]]:
+        model = model or self.default_model
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._request(batch, model, priority) for batch in batches))
+        return [embedding for batch in results for embedding in batch]
+
+    async def _request(self, batch: List[str], model: str, priority: str) -> List[List[float]]:
+        import openai
+
+        tokens = sum(count_tokens(text, model) for text in batch)
+        retries = getattr(settings, 'EMBEDDING_MAX_RETRIES', 4)
+
+        for attempt in range(retries + 1):
+            # Capacity first: requests waiting for it must not hold connection slots
+            async with rate_limiter.limit(model, settings.OPENAI_API_KEY, tokens=tokens, priority=priority) as lease:
+                try:
+                    async with self._limit:
+                        raw = await self._client.embeddings.with_raw_response.create(input=batch, model=model)
+                except openai.RateLimitError as e:
+                    await lease.settle(0)
+                    await lease.rate_limited(e.response.headers)
+                    if attempt == retries:
+                        raise
+                    continue
+                except (openai.APIConnectionError, openai.InternalServerError) as e:
+                    await lease.settle(0)
+                    if attempt == retries:
+                        raise
+                    logger.warning(f"Embedding request failed ({e}), retrying")
+                else:
+                    await lease.observe(raw.headers)
+                    response = raw.parse()
+                    await lease.settle(getattr(response.usage, 'total_tokens', None))
+                    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            await asyncio.sleep(min(2 ** attempt, 30))
+
+
+embedding_service = EmbeddingService()
@@ -0,0 +1,266 @@
+# ai/llm.py
+"""
+LLM calls through a model router.
+
+A request names a primary model and fallbacks (TenantAISetting.primary_model
+and fallback_models, else LLM_MODEL and LLM_FALLBACK_MODELS). The router
+keeps rolling latency and errors per model in this process and:
+
+* hedges: when the current model has not answered by its p95 latency, the
+  next model is started too and the first answer wins;
+* fails over at once when a model errors;
+* opens a circuit breaker after LLM_CIRCUIT_FAILURES consecutive failures,
+  skipping the model for LLM_CIRCUIT_COOLDOWN_SECONDS, then lets one trial
+  request through.
+
+Every attempt runs within the shared rate limits (ai.rate_limits).
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+import litellm
+from django.conf import settings
+from litellm import acompletion
+
+from ai.prompting import MESSAGE_OVERHEAD, count_tokens
+from ai.rate_limits import LIVE, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def _error_headers(error) -> Optional[dict]:
+    headers = getattr(error, 'litellm_response_headers', None)
+    if headers is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    return dict(headers) if headers else None
+
+
+def estimate_tokens(messages: List[Dict], model: str, max_tokens: Optional[int] = None) -> int:
+    """Prompt tokens plus the expected completion, for reserving rate limit capacity"""
+    prompt = sum(count_tokens(m.get('content') or '', model) + MESSAGE_OVERHEAD for m in messages)
+    return prompt + (max_tokens or getattr(settings, 'LLM_COMPLETION_TOKEN_ESTIMATE', 500))
+
+
+def _provider(model: str) -> str:
+    return model.split('/', 1)[0] if '/' in model else 'openai'
+
+
+class Endpoint:
+    """Rolling latency, errors and circuit state of one model"""
+
+    def __init__(self, model: str):
+        window = getattr(settings, 'LLM_ROUTER_WINDOW', 100)
+        self.model = model
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def available(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= getattr(settings, 'LLM_CIRCUIT_COOLDOWN_SECONDS', 30):
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            return not self.trial_running
+        return self.state == CLOSED
+
+    def started(self):
+        if self.state == HALF_OPEN:
+            self.trial_running = True
+
+    def succeeded(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.trial_running = False
+
+    def cancelled(self, elapsed: Optional[float]):
+        # Lost a hedge race: says nothing about health, but the time it ran is
+        # a lower bound on its latency. Dropping it would pull p95 down exactly
+        # when the model is slow.
+        if elapsed is not None:
+            self.latencies.append(elapsed)
+        self.trial_running = False
+
+    def failed(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.trial_running = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= getattr(settings, 'LLM_CIRCUIT_FAILURES', 5):
+            if self.state != OPEN:
+                logger.warning(f"Circuit opened for {self.model} after {self.consecutive_failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def percentile(self, share: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(share * (len(ordered) - 1))]
+
+    def hedge_after(self) -> float:
+        """Seconds to wait for this model before starting the next one"""
+        if len(self.latencies) < getattr(settings, 'LLM_ROUTER_MIN_SAMPLES', 20):
+            return getattr(settings, 'LLM_HEDGE_DEFAULT_SECONDS', 5)
+        return max(self.percentile(0.95), getattr(settings, 'LLM_HEDGE_MIN_SECONDS', 1))
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'requests': len(self.outcomes),
+            'error_rate': round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+        }
+
+
+class ModelRouter:
+    """Sends completions to the fastest healthy model of a primary/fallback list"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Endpoint] = {}
+        self._api_bases = None
+
+    @property
+    def api_bases(self) -> Dict[str, str]:
+        # Per-model API base URLs: self-hosted models, or fake servers in load tests
+        if self._api_bases is None:
+            self._api_bases = dict(getattr(settings, 'LLM_MODEL_API_BASES', {}))
+        return self._api_bases
+
+    def endpoint(self, model: str) -> Endpoint:
+        with self._lock:
+            if model not in self._endpoints:
+                self._endpoints[model] = Endpoint(model)
+            return self._endpoints[model]
+
+    def stats(self) -> Dict[str, dict]:
+        return {model: endpoint.stats() for model, endpoint in self._endpoints.items()}
+
+    def candidates(self, models: Sequence[str]) -> List[str]:
+        """Models to try in order; when every circuit is open, the primary anyway"""
+        ordered = list(dict.fromkeys(m for m in models if m))
+        healthy = [m for m in ordered if self.endpoint(m).available()]
+        return healthy or ordered[:1]
+
+    @staticmethod
+    def api_key(model: str) -> Optional[str]:
+        keys = getattr(settings, 'LLM_PROVIDER_API_KEYS', {})
+        provider = _provider(model)
+        if provider in keys:
+            return keys[provider]
+        if provider == _provider(settings.LLM_MODEL):
+            return getattr(settings, 'LLM_API_KEY', None) or settings.OPENAI_API_KEY
+        # Left to LiteLLM, which reads the provider's usual environment variable
+        return None
+
+    async def complete(self, messages: List[Dict], models: Sequence[str], priority: str = LIVE, **kwargs):
+        candidates = self.candidates(models)
+        retries = getattr(settings, 'LLM_RATE_LIMIT_RETRIES', 3) if len(candidates) == 1 else 0
+        pending = set()
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            model = candidates[launched]
+            launched += 1
+            task = asyncio.ensure_future(self._attempt(model, messages, priority, retries, **kwargs))
+            pending.add(task)
+            return model
+
+        current = launch()
+        try:
+            while pending:
+                hedge_after = self.endpoint(current).hedge_after() if launched < len(candidates) else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"{current} slower than {hedge_after:.1f}s, hedging with {candidates[launched]}")
+                    current = launch()
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+
+                if launched < len(candidates):
+                    current = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise errors[-1]
+
+    async def _attempt(self, model: str, messages: List[Dict], priority: str, retries: int, **kwargs):
+        endpoint = self.endpoint(model)
+        endpoint.started()
+        api_key = self.api_key(model)
+        estimate = estimate_tokens(messages, model, kwargs.get('max_tokens'))
+        if model in self.api_bases:
+            kwargs.setdefault('api_base', self.api_bases[model])
+        kwargs.setdefault('timeout', getattr(settings, 'LLM_REQUEST_TIMEOUT_SECONDS', 60))
+
+        started = None
+        try:
+            for attempt in range(retries + 1):
+                async with rate_limiter.limit(model, api_key, tokens=estimate, priority=priority) as lease:
+                    started = time.monotonic()
+                    try:
+                        response = await acompletion(model=model, messages=messages, api_key=api_key, **kwargs)
+                    except litellm.RateLimitError as e:
+                        await lease.settle(0)
+                        await lease.rate_limited(_error_headers(e))
+                        if attempt == retries:
+                            endpoint.failed()
+                            raise
+                        continue
+                    except asyncio.CancelledError:
+                        await lease.settle(0)
+                        raise
+                    except Exception:
+                        await lease.settle(0)
+                        endpoint.failed()
+                        raise
+
+                    endpoint.succeeded(time.monotonic() - started)
+                    await lease.observe(getattr(response, '_hidden_params', {}).get('additional_headers'))
+                    await lease.settle(getattr(response.usage, 'total_tokens', None))
+                    return response
+        except asyncio.CancelledError:
+            endpoint.cancelled(time.monotonic() - started if started is not None else None)
+            raise
+
+
+model_router = ModelRouter()
+
+
+def tenant_models(ai_settings) -> List[str]:
+    """Primary and fallback models of a TenantAISetting, defaulting to the global ones"""
+    primary = getattr(ai_settings, 'primary_model', '') or settings.LLM_MODEL
+    fallbacks = getattr(ai_settings, 'fallback_models', None) or getattr(settings, 'LLM_FALLBACK_MODELS', [])
+    return [primary, *fallbacks]
+
+
+async def complete(messages: List[Dict], model: str = None, fallback_models: Sequence[str] = None,
+                   priority: str = LIVE, **kwargs):
+    """
+    A chat completion from ``model`` or, when it is slow or failing, one of
+    ``fallback_models`` (LLM_FALLBACK_MODELS when not given).
+    """
+    model = model or settings.LLM_MODEL
+    if fallback_models is None:
+        fallback_models = getattr(settings, 'LLM_FALLBACK_MODELS', [])
+    return await model_router.complete(messages, [model, *fallback_models], priority=priority, **kwargs)
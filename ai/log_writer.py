@@ -0,0 +1,164 @@
+# ai/log_writer.py
+import asyncio
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import List
+
+from django.conf import settings
+from django.db import models
+
+from core.db import new_worker_loop, worker_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class LogWriter:
+    """
+    Buffers unsaved log rows (KnowledgeRetrievalLog, AIUsageLog) and writes
+    them with one ``bulk_create`` per model.
+
+    A batch is flushed once LOG_WRITER_BATCH_SIZE rows are waiting or
+    LOG_WRITER_FLUSH_MS after its first row arrived, whichever comes first.
+    Writes happen on a dedicated event loop thread, so the RAG pipeline never
+    waits on them. The buffer is bounded by LOG_WRITER_QUEUE_SIZE; when the
+    database cannot keep up, new rows are dropped and counted rather than
+    growing memory. Anything still buffered is written at interpreter exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._flushing = None
+        self._pending = []
+        self.dropped = 0
+        self.written = 0
+        atexit.register(self.close)
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(settings, 'LOG_WRITER_BATCH_SIZE', 200)
+
+    @property
+    def flush_interval(self) -> float:
+        return getattr(settings, 'LOG_WRITER_FLUSH_MS', 1000) / 1000
+
+    @property
+    def queue_size(self) -> int:
+        return getattr(settings, 'LOG_WRITER_QUEUE_SIZE', 10000)
+
+    def add(self, instance: models.Model):
+        """Queue an unsaved model instance; safe to call from sync or async code"""
+        loop = self._ensure_worker()
+        loop.call_soon_threadsafe(self._enqueue, instance)
+
+    def _enqueue(self, instance: models.Model):
+        try:
+            self._queue.put_nowait(instance)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            # One line per thousand drops is enough to notice
+            if self.dropped % 1000 == 1:
+                logger.error(f"Log writer buffer full, dropped {self.dropped} rows so far")
+
+    def flush(self, timeout: float = 10):
+        """Write everything buffered so far and wait for it; for shutdown and management commands"""
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._drain(), self._loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.error(f"Log writer flush failed: {e}")
+
+    def close(self):
+        self.flush(getattr(settings, 'LOG_WRITER_SHUTDOWN_TIMEOUT', 10))
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(ready,),
+                    name='log-writer',
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_worker(self, ready: threading.Event):
+        loop = new_worker_loop('log-writer', 1)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._flushing = asyncio.Lock()
+        self._loop = loop
+        ready.set()
+        loop.run_until_complete(self._consume())
+
+    async def _consume(self):
+        while True:
+            self._pending.append(await self._queue.get())
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._write_pending()
+
+    async def _drain(self):
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+        await self._write_pending()
+
+    async def _write_pending(self):
+        # Serializes the consumer and a shutdown flush; either may find nothing left
+        async with self._flushing:
+            batch, self._pending = self._pending, []
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: List[models.Model]):
+        try:
+            self.written += await worker_sync_to_async(self._bulk_create)(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} log rows: {e}")
+
+    def _bulk_create(self, batch: List[models.Model]) -> int:
+        by_model = defaultdict(list)
+        for instance in batch:
+            by_model[type(instance)].append(instance)
+
+        written = 0
+        for model, instances in by_model.items():
+            try:
+                model.objects.bulk_create(instances, batch_size=self.batch_size)
+                written += len(instances)
+            except Exception as e:
+                logger.error(f"Failed to write {len(instances)} {model.__name__} rows: {e}")
+        return written
+
+
+def sample_embedding(embedding: List[float]) -> List[float]:
+    """
+    The query embedding to store on a retrieval log. Only a
+    RETRIEVAL_LOG_EMBEDDING_SAMPLE_RATE share of logs keep it; the rest store
+    an empty array, which is most of the row's size.
+    """
+    rate = getattr(settings, 'RETRIEVAL_LOG_EMBEDDING_SAMPLE_RATE', 1.0)
+    if rate >= 1 or (rate > 0 and random.random() < rate):
+        return embedding
+    return []
+
+
+log_writer = LogWriter()
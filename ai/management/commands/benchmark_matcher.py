@@ -0,0 +1,56 @@
+# ai/management/commands/benchmark_matcher.py
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai.matching import KeywordMatcher
+
+
+def _word(rng, low=4, high=12):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(low, high)))
+
+
+class Command(BaseCommand):
+    help = 'Compare the compiled keyword matcher with per-keyword substring checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keywords', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                            help='Keyword list sizes to test (split between escalation and blocked)')
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--words', type=int, default=40, help='Words per message')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [
+            ' '.join(_word(rng, 2, 10) for _ in range(options['words']))
+            for _ in range(options['messages'])
+        ]
+
+        self.stdout.write(f"{'keywords':>9} {'build ms':>9} {'naive µs/msg':>13} {'compiled µs/msg':>16} {'speedup':>8}")
+        for size in options['keywords']:
+            keywords = [_word(rng) for _ in range(size)]
+            escalation, blocked = keywords[:size // 2], keywords[size // 2:]
+
+            started = time.perf_counter()
+            matcher = KeywordMatcher(escalation, blocked)
+            build = (time.perf_counter() - started) * 1000
+
+            naive = self._time(messages, lambda text: [
+                k for k in keywords if k.lower() in text.lower()
+            ])
+            compiled = self._time(messages, matcher.find)
+
+            self.stdout.write(
+                f'{size:>9} {build:>9.1f} {naive:>13.1f} {compiled:>16.1f} {naive / compiled:>7.1f}x'
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete'))
+
+    @staticmethod
+    def _time(messages, func):
+        started = time.perf_counter()
+        for text in messages:
+            func(text)
+        return (time.perf_counter() - started) / len(messages) * 1_000_000
@@ -0,0 +1,116 @@
+# ai/matching.py
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple
+
+ESCALATION = 'escalation'
+BLOCKED = 'blocked'
+AGENT_REQUEST = 'agent_request'
+
+# Explicit requests for a human, matched in the same pass as the keywords
+AGENT_REQUEST_PATTERNS = [
+    r'\b(?:speak|talk)\s+to\s+(?:human|agent|person|representative)\b',
+    r'\b(?:human|agent|person|representative)\s+please\b',
+    r'\bcan\s+i\s+(?:speak|talk)\s+to\s+someone\b',
+    r'\btransfer\s+me\s+to\s+(?:human|agent)\b',
+]
+
+
+class KeywordMatch(NamedTuple):
+    kind: str
+    keyword: str
+    start: int
+    end: int
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex for a set of literals, factored into a trie so the engine follows
+    one path per input position instead of trying every keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        # Optional tail: the greedy match prefers the longest keyword
+        return pattern + '?' if terminal else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Escalation keywords, blocked topics and agent-request phrases of one
+    TenantAISetting compiled into a single case-insensitive regex, so a
+    message is scanned once however many keywords the tenant configured.
+    Keywords match anywhere in the text, as plain substrings.
+    """
+
+    def __init__(self, escalation_keywords: Iterable[str] = (), blocked_topics: Iterable[str] = ()):
+        self._kinds: Dict[str, List[tuple]] = {}
+        for kind, words in ((ESCALATION, escalation_keywords), (BLOCKED, blocked_topics)):
+            for word in words or []:
+                if word and word.strip():
+                    self._kinds.setdefault(word.lower(), []).append((kind, word))
+
+        alternatives = [f'(?P<agent>{"|".join(AGENT_REQUEST_PATTERNS)})']
+        if self._kinds:
+            alternatives.append(f'(?P<keyword>{_trie_pattern(self._kinds)})')
+        self._regex = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+    def find(self, text: str) -> List[KeywordMatch]:
+        """Every non-overlapping match in the text, in order of position"""
+        matches = []
+        for m in self._regex.finditer(text or ''):
+            if m.group('agent'):
+                matches.append(KeywordMatch(AGENT_REQUEST, m.group(0), m.start(), m.end()))
+                continue
+            for kind, keyword in self._kinds.get(m.group(0).lower(), []):
+                matches.append(KeywordMatch(kind, keyword, m.start(), m.end()))
+        return matches
+
+
+_lock = threading.Lock()
+_matchers: Dict[str, tuple] = {}  # setting id -> (version, matcher)
+
+
+def _version(ai_settings) -> str:
+    updated_at = getattr(ai_settings, 'updated_at', None)
+    return updated_at.isoformat() if updated_at else ''
+
+
+def get_matcher(ai_settings) -> KeywordMatcher:
+    """
+    The compiled matcher for a TenantAISetting, rebuilt only when the
+    setting's version (updated_at) changes.
+    """
+    key = str(getattr(ai_settings, 'id', ''))
+    version = _version(ai_settings)
+    cached = _matchers.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    matcher = KeywordMatcher(
+        getattr(ai_settings, 'escalation_keywords', None),
+        getattr(ai_settings, 'blocked_topics', None)
+    )
+    if key:
+        with _lock:
+            _matchers[key] = (version, matcher)
+    return matcher
+
+
+def forget_matcher(setting_id):
+    with _lock:
+        _matchers.pop(str(setting_id), None)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.partitioning import convert_to_partitioned
+
+
+def partition_ai_usage_logs(apps, schema_editor):
+    convert_to_partitioned(schema_editor, 'ai_usage_logs')
+
+
+class Migration(migrations.Migration):
+    # Rows are moved in batches, one transaction each
+    atomic = False
+
+    dependencies = [
+        ('ai', '0001_initial'),
+        ('conversations', '0007_partition_messages'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='aiusagelog',
+                    name='message',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage_logs', to='conversations.message'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(partition_ai_usage_logs),
+            ],
+        ),
+    ]
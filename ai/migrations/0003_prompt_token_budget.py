@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0002_partition_ai_usage_logs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenantaisetting',
+            name='prompt_token_budget',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aiusagelog',
+            name='prompt_tokens',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aiusagelog',
+            name='completion_tokens',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aiusagelog',
+            name='prompt_sections',
+            field=models.JSONField(default=dict),
+        ),
+    ]
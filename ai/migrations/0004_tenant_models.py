@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:00
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_prompt_token_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenantaisetting',
+            name='primary_model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='tenantaisetting',
+            name='fallback_models',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), blank=True, default=list, size=None),
+        ),
+    ]
@@ -18,6 +18,11 @@ class TenantAISetting(models.Model):
     knowledge_base_enabled = models.BooleanField(default=True)
     max_knowledge_chunks = models.IntegerField(default=5)
     similarity_threshold = models.DecimalField(max_digits=5, decimal_places=4, default=0.7500)
+    # Prompt size limit for AI replies; PROMPT_TOKEN_BUDGET when unset
+    prompt_token_budget = models.IntegerField(null=True, blank=True)
+    # LiteLLM model names; LLM_MODEL and LLM_FALLBACK_MODELS when empty
+    primary_model = models.CharField(max_length=100, blank=True)
+    fallback_models = ArrayField(models.CharField(max_length=100), default=list, blank=True)
     business_hours = models.JSONField(default=dict)
     escalation_keywords = ArrayField(models.CharField(max_length=100), default=list, blank=True)
     blocked_topics = ArrayField(models.CharField(max_length=100), default=list, blank=True)
@@ -81,9 +86,13 @@ class AIUsageLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='ai_usage_logs')
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='ai_usage_logs')
-    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='ai_usage_logs')
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='ai_usage_logs', db_constraint=False)
     usage_date = models.DateField()
     tokens_used = models.IntegerField()
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    # Tokens per prompt section as budgeted locally (system, question, context, summary, history, total)
+    prompt_sections = models.JSONField(default=dict)
     processing_time_ms = models.IntegerField()
     confidence_score = models.DecimalField(max_digits=5, decimal_places=2)
     knowledge_chunks_used = models.IntegerField(default=0)
@@ -92,7 +101,7 @@ class AIUsageLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = 'ai_usage_logs'
+        db_table = 'ai_usage_logs'  # partitioned by month on created_at
 
     def __str__(self):
         return f"{self.tenant.business_name} - {self.usage_date} - {self.tokens_used} tokens"
\ No newline at end of file
@@ -0,0 +1,175 @@
+# ai/prompting.py
+"""
+Token-budgeted prompt assembly for AI replies.
+
+Prompt sections are counted with a local tokenizer (tiktoken) and added by
+priority until the tenant's budget is spent: the system prompt and the
+customer's question always, then knowledge chunks by similarity score, then
+conversation history: the conversation's running summary when one exists,
+then the newest exchanges that still fit.
+"""
+import functools
+import hashlib
+import re
+from typing import Dict, List
+
+import tiktoken
+from django.conf import settings
+
+# Tokens the chat format adds per message (role and separators)
+MESSAGE_OVERHEAD = 4
+# Chunks are only truncated when at least this much of them still fits
+MIN_CHUNK_TOKENS = 64
+
+
+@functools.lru_cache(maxsize=16)
+def get_encoding(model: str):
+    """Tokenizer for a LiteLLM model name such as 'openai/gpt-4o-mini'"""
+    try:
+        return tiktoken.encoding_for_model(model.split('/')[-1])
+    except KeyError:
+        # Other providers: close enough for budgeting
+        return tiktoken.get_encoding('o200k_base')
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text or '', disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str) -> str:
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text or '', disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(max_tokens, 0)]).rstrip() + '…'
+
+
+def prompt_budget(ai_settings) -> int:
+    """Tokens a tenant's prompts may use; TenantAISetting overrides PROMPT_TOKEN_BUDGET"""
+    return getattr(ai_settings, 'prompt_token_budget', None) or getattr(settings, 'PROMPT_TOKEN_BUDGET', 6000)
+
+
+def _fingerprint(text: str) -> str:
+    normalized = re.sub(r'\s+', ' ', text or '').strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+class PromptBuilder:
+    """
+    Fills a token budget section by section. ``sections`` keeps the tokens
+    spent per section, for AIUsageLog.prompt_sections.
+    """
+
+    def __init__(self, budget: int, model: str):
+        self.budget = budget
+        self.model = model
+        self.sections: Dict[str, int] = {}
+
+    @property
+    def remaining(self) -> int:
+        return self.budget - sum(self.sections.values())
+
+    def _spend(self, section: str, text: str) -> int:
+        tokens = count_tokens(text, self.model) + MESSAGE_OVERHEAD
+        self.sections[section] = self.sections.get(section, 0) + tokens
+        return tokens
+
+    def required(self, section: str, text: str, max_share: float = 0.5) -> str:
+        """A section that is always sent; cut down if it alone would take over the budget"""
+        text = truncate_tokens(text, int(self.budget * max_share), self.model)
+        self._spend(section, text)
+        return text
+
+    def chunks(self, chunks: List[dict], scores: List[float], reserve: int = 0) -> List[dict]:
+        """
+        Knowledge chunks by descending score, skipping duplicates. A chunk that
+        does not fit whole is truncated to what is left, leaving ``reserve``
+        tokens for later sections.
+        """
+        ranked = sorted(zip(chunks, scores), key=lambda pair: pair[1] or 0, reverse=True)
+        seen = set()
+        selected = []
+        self.sections.setdefault('context', 0)
+
+        for chunk, score in ranked:
+            fingerprint = _fingerprint(chunk['content'])
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+
+            available = self.remaining - reserve
+            tokens = count_tokens(chunk['content'], self.model)
+            if tokens > available:
+                if available < MIN_CHUNK_TOKENS:
+                    break
+                chunk = {**chunk, 'content': truncate_tokens(chunk['content'], available, self.model)}
+                tokens = count_tokens(chunk['content'], self.model)
+            self.sections['context'] += tokens
+            selected.append(chunk)
+        return selected
+
+    def history(self, exchanges: List[Dict], running_summary: str = '') -> tuple:
+        """
+        The running summary of the conversation (if any, up to half of what is
+        left), then the newest exchanges that fit, returned oldest first.
+        Returns (exchanges, summary or '').
+        """
+        summary = ''
+        if running_summary and self.remaining > MIN_CHUNK_TOKENS:
+            summary = truncate_tokens(running_summary, self.remaining // 2, self.model)
+            self._spend('summary', summary)
+
+        kept = []
+        spent = 0
+        for exchange in reversed(exchanges):
+            cost = (count_tokens(exchange['question'], self.model)
+                    + count_tokens(exchange['answer'], self.model) + 2 * MESSAGE_OVERHEAD)
+            if spent + cost > self.remaining:
+                break
+            kept.append(exchange)
+            spent += cost
+        self.sections['history'] = self.sections.get('history', 0) + spent
+        return list(reversed(kept)), summary
+
+    def total(self) -> int:
+        return sum(self.sections.values())
+
+
+def history_reserve(budget: int) -> int:
+    """Tokens kept back from knowledge chunks so some history always fits"""
+    return int(budget * getattr(settings, 'PROMPT_HISTORY_SHARE', 0.2))
+
+
+def build_reply_prompt(ai_settings, model: str, question: str, chunks: List[dict], scores: List[float],
+                       history: List[Dict], running_summary: str = '') -> tuple:
+    """
+    Chat messages for an AI reply within the tenant's budget. Returns
+    (messages, chunks used, tokens per section).
+    """
+    builder = PromptBuilder(prompt_budget(ai_settings), model)
+    system_prompt = builder.required('system', ai_settings.system_prompt or '')
+    question = builder.required('question', question, max_share=0.25)
+
+    used_chunks = builder.chunks(chunks, scores, reserve=history_reserve(builder.budget))
+    context = "\n\n".join(c['content'] for c in used_chunks)
+    exchanges, summary = builder.history(history, running_summary)
+
+    system = system_prompt + f"\n\nRelevant context:\n{context}"
+    if summary:
+        # Covers the earlier parts of long conversations
+        system += f"\n\nConversation so far:\n{summary}"
+
+    messages = [{"role": "system", "content": system}]
+    for exchange in exchanges:
+        messages.append({"role": "user", "content": exchange['question']})
+        messages.append({"role": "assistant", "content": exchange['answer']})
+    messages.append({"role": "user", "content": question})
+
+    return messages, used_chunks, {**builder.sections, 'total': builder.total()}
+
+
+def fit_history(history: List[Dict], max_tokens: int, model: str) -> List[Dict]:
+    """The newest exchanges that fit in max_tokens, oldest first"""
+    builder = PromptBuilder(max_tokens, model)
+    exchanges, _ = builder.history(history)
+    return exchanges
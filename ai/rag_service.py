@@ -0,0 +1,542 @@
+# ai/rag_service.py
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import List, Tuple, Dict, Optional
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from conversations.models import Conversation, Message
+from conversations.summaries import get_summary, history_pairs
+from knowledgebase.models import DocumentEmbedding, KnowledgeRetrievalLog
+from ai.models import AIUsageLog, TenantAISetting
+from ai.log_writer import log_writer, sample_embedding
+from ai.embeddings import embedding_service
+from ai.llm import complete, tenant_models
+from ai.prompting import build_reply_prompt, fit_history
+from core.db import new_worker_loop, worker_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class RAGJob:
+    """A single question waiting for an AI reply"""
+    __slots__ = ('conversation_id', 'question', 'message_id', 'reply_to_platform')
+
+    def __init__(self, conversation_id, question: str, message_id=None, reply_to_platform: bool = True):
+        self.conversation_id = str(conversation_id)
+        self.question = question
+        self.message_id = message_id
+        self.reply_to_platform = reply_to_platform
+
+
+class RAGPipeline:
+    """RAG pipeline with context awareness for one conversation"""
+
+    def __init__(self, conversation):
+        self.conversation = conversation
+        self.tenant = conversation.tenant
+        self.customer = conversation.customer
+        self.platform_account = conversation.platform_account
+        self.ai_settings = None
+        self.running_summary = ''
+        self.prompt_sections = {}
+        self.chunks_used = 0
+        self.usage = None
+        # Get config from Django settings or environment
+        self.llm_model = getattr(settings, 'LLM_MODEL', 'openai/gpt-4o-mini')
+        self.fallback_models = None
+        self.embedding_model = getattr(settings, 'EMBEDDING_MODEL', 'text-embedding-3-small')
+
+    @classmethod
+    async def for_conversation(cls, conversation_id) -> Optional['RAGPipeline']:
+        """Load the conversation and AI settings the pipeline works against"""
+        conversation = await cls.get_conversation(conversation_id)
+        if not conversation:
+            return None
+
+        pipeline = cls(conversation)
+        pipeline.ai_settings = await pipeline.get_ai_settings()
+        # The tenant may pick its own primary and fallback models
+        pipeline.llm_model, *pipeline.fallback_models = tenant_models(pipeline.ai_settings)
+        return pipeline
+
+    async def run(self, job: RAGJob) -> Tuple[Message, str]:
+        """Main RAG pipeline, returns the stored AI message and its text"""
+        start_time = timezone.now()
+        question = job.question
+
+        # 1. Platform messages are already stored by the webhook
+        if job.message_id:
+            user_message = await self.get_message(job.message_id)
+        elif not job.reply_to_platform:
+            user_message = await self.create_message(
+                content=question,
+                sender_type='customer',
+                direction='inbound'
+            )
+        else:
+            # Get the latest customer message for this conversation
+            user_message = await self.get_latest_customer_message()
+
+        # 2. Get conversation history for context analysis
+        conversation_history = await self.get_conversation_history()
+
+        # 3. Analyze if this is a follow-up question or new question
+        analyzed_question = await self.analyze_question(question, conversation_history)
+
+        # 4. Generate embedding for the analyzed question
+        embedding = await self.generate_embedding(analyzed_question)
+
+        # 5. Search knowledge base with the analyzed question
+        chunks, scores = await self.search_knowledge_base(embedding)
+
+        # 6. Log retrieval in KNOWLEDGE_RETRIEVAL_LOGS (buffered, written in batches)
+        self.log_retrieval(user_message, analyzed_question, embedding, chunks, scores, start_time)
+
+        # 7. Generate AI response with conversation context, within the tenant's token budget
+        ai_response, tokens = await self.generate_ai_response(
+            original_question=question,
+            analyzed_question=analyzed_question,
+            chunks=chunks,
+            scores=scores,
+            conversation_history=conversation_history
+        )
+
+        # 8. Create AI message in MESSAGES table
+        ai_message = await self.create_message(
+            content=ai_response,
+            sender_type='ai',
+            direction='outbound',
+            ai_confidence=0.9
+        )
+
+        # 9. Log AI usage in AI_USAGE_LOGS
+        self.log_ai_usage(user_message, tokens, self.chunks_used, start_time)
+
+        # 10. Update conversation timestamps
+        await self.update_conversation()
+
+        # 11. Update customer last contact
+        await self.update_customer()
+
+        return ai_message, ai_response
+
+    async def send_platform_response(self, ai_message: Message, response: str):
+        """Send AI response back to the platform where message originated"""
+        # Imported here because the webhook views import this module
+        from platforms.webhook_views import PlatformMessenger
+
+        try:
+            platform_name = self.conversation.platform.name
+            customer_external_id = self.customer.external_id
+
+            if platform_name == 'facebook':
+                success = await PlatformMessenger.send_facebook_message(
+                    customer_external_id,
+                    response,
+                    self.platform_account
+                )
+            elif platform_name == 'whatsapp':
+                success = await PlatformMessenger.send_whatsapp_message(
+                    customer_external_id,
+                    response,
+                    self.platform_account
+                )
+            else:
+                logger.warning(f"Unsupported platform: {platform_name}")
+                return
+
+            if success:
+                # Update message delivery status
+                await self.update_message_delivery_status(ai_message)
+            else:
+                logger.error(f"Failed to send message to {platform_name}")
+
+        except Exception as e:
+            logger.error(f"Error sending platform response: {e}")
+
+    @staticmethod
+    @worker_sync_to_async
+    def get_conversation(conversation_id):
+        """Get conversation with related data"""
+        try:
+            return Conversation.objects.select_related(
+                'tenant', 'customer', 'platform', 'platform_account'
+            ).get(id=conversation_id)
+        except Conversation.DoesNotExist:
+            return None
+
+    @worker_sync_to_async
+    def get_ai_settings(self):
+        """Get AI settings for tenant"""
+        try:
+            return TenantAISetting.objects.get(
+                tenant=self.tenant,
+                platform=self.conversation.platform
+            )
+        except TenantAISetting.DoesNotExist:
+            # Return default settings
+            return type('obj', (object,), {
+                'max_knowledge_chunks': 5,
+                'similarity_threshold': 0.7,
+                'system_prompt': 'You are a helpful AI assistant.',
+                'prompt_token_budget': None,
+                'primary_model': '',
+                'fallback_models': []
+            })
+
+    @worker_sync_to_async
+    def get_message(self, message_id):
+        """Get a stored message of this conversation"""
+        return Message.objects.filter(
+            id=message_id,
+            conversation=self.conversation
+        ).first()
+
+    @worker_sync_to_async
+    def get_latest_customer_message(self):
+        """Get the latest customer message for this conversation"""
+        return Message.objects.filter(
+            conversation=self.conversation,
+            sender_type='customer'
+        ).order_by('-created_at').first()
+
+    @worker_sync_to_async
+    def update_message_delivery_status(self, message):
+        """Mark the AI message as delivered to the platform"""
+        message.delivery_status = 'delivered'
+        message.save(update_fields=['delivery_status'])
+
+    async def analyze_question(self, question: str, conversation_history: List[Dict]) -> str:
+        """
+        Analyzes if a question is a follow-up or a unique question.
+        For follow-up questions, it rewrites them with context from previous conversation.
+        For unique questions, it returns the original question.
+        """
+        if not conversation_history:
+            return question  # No conversation history, so must be a unique question
+
+        # Prepare context for the LLM to analyze
+        analysis_prompt = """
+Analyze the following conversation and determine if the latest question is a follow-up question
+or a unique question. If it's a follow-up, rewrite it to include the necessary context.
+If it's a unique question, return the original question unchanged.
+
+Previous conversation:
+"""
+
+        # Add conversation history (last 3 exchanges, as far as they fit the analysis budget)
+        recent_history = fit_history(
+            conversation_history[-3:],
+            getattr(settings, 'PROMPT_ANALYSIS_HISTORY_TOKENS', 1500),
+            self.llm_model
+        )
+        for i, exchange in enumerate(recent_history):
+            analysis_prompt += f"\nQ{i+1}: {exchange['question']}\nA{i+1}: {exchange['answer']}\n"
+
+        analysis_prompt += f"\nLatest question: {question}\n\nInstructions:\n"
+        analysis_prompt += """
+1. If this is a follow-up question that relies on previous context (contains pronouns like "it", "they",
+   "this", "that", refers to something previously discussed, or is incomplete without context),
+   rewrite it to be self-contained with relevant context.
+2. If this is a brand new question unrelated to previous exchanges, return the original question unchanged.
+3. Start your response with either "REWRITTEN:" followed by the rewritten question, or "ORIGINAL:"
+   followed by the unchanged question.
+"""
+
+        # Use LiteLLM to analyze the question
+        messages = [
+            {"role": "system", "content": "You are an AI assistant that analyzes conversations to determine if questions are follow-ups or unique questions."},
+            {"role": "user", "content": analysis_prompt}
+        ]
+
+        response = await complete(
+            messages,
+            model=self.llm_model,
+            fallback_models=self.fallback_models
+        )
+
+        analysis_result = response.choices[0].message.content.strip()
+
+        # Parse the response to get the analyzed question
+        if analysis_result.startswith("REWRITTEN:"):
+            return analysis_result.replace("REWRITTEN:", "").strip()
+        elif analysis_result.startswith("ORIGINAL:"):
+            return analysis_result.replace("ORIGINAL:", "").strip()
+        else:
+            # If the format is not as expected, return the original question to be safe
+            return question
+
+    @worker_sync_to_async
+    def get_conversation_history(self, limit: int = 10) -> List[Dict]:
+        """Get recent conversation history in Q&A format, from the conversation summary"""
+        summary = get_summary(self.conversation.id)
+        self.running_summary = summary.running_summary if summary else ''
+        return history_pairs(summary, limit)
+
+    @worker_sync_to_async
+    def create_message(self, content, sender_type, direction, ai_confidence=None):
+        """Create message in MESSAGES table"""
+        # Generate a unique external_message_id to avoid duplicate key constraint
+        external_message_id = f"{sender_type}_{uuid.uuid4().hex[:16]}_{int(timezone.now().timestamp())}"
+
+        message = Message.objects.create(
+            tenant=self.tenant,
+            conversation=self.conversation,
+            external_message_id=external_message_id,
+            message_type='text',
+            direction=direction,
+            sender_type=sender_type,
+            sender_id=self.customer.id if sender_type == 'customer' else None,
+            sender_name=self.customer.platform_display_name if sender_type == 'customer' else 'AI Assistant',
+            content_encrypted=content,  # Add encryption in production
+            content_hash=str(hash(content)),
+            ai_processed=True if sender_type == 'ai' else False,
+            ai_confidence=ai_confidence,
+            delivery_status='delivered',
+            platform_timestamp=timezone.now()
+        )
+        return message
+
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Generate embedding using OpenAI"""
+        return await embedding_service.embed(text, self.embedding_model)
+
+    @worker_sync_to_async
+    def search_knowledge_base(
+        self,
+        query_embedding: List[float],
+        *,
+        top_k: int = 5,
+    ) -> Tuple[List[dict], List[float]]:
+        """
+        Run similarity search in a thread and return **plain data**:
+        - a list of dictionaries describing each chunk
+        - a parallel list of similarity scores
+        """
+        rows = (
+            DocumentEmbedding.find_top_k(
+                query_vector=query_embedding,
+                tenant_id=self.tenant.id,
+                top_k=top_k,
+                similarity_threshold=0.1,
+                embedding_model=self.embedding_model,
+            )
+            .select_related("chunk")
+            .values(
+                "chunk_id",
+                "chunk__content",
+                "similarity_score",
+            )
+        )
+
+        chunk_dicts = [
+            {"id": r["chunk_id"], "content": r["chunk__content"]}
+            for r in rows
+        ]
+        scores = [r["similarity_score"] for r in rows]
+
+        return chunk_dicts, scores
+
+    async def generate_ai_response(self, original_question: str, analyzed_question: str, chunks: List[dict],
+                                   scores: List[float], conversation_history: List[Dict]) -> Tuple[str, int]:
+        """Generate response using LiteLLM with conversation awareness"""
+
+        # System prompt, best chunks and recent history, filled up to the token budget.
+        # The current question is the original, not analyzed, for natural conversation flow
+        messages, used_chunks, self.prompt_sections = build_reply_prompt(
+            self.ai_settings,
+            self.llm_model,
+            question=original_question,
+            chunks=chunks,
+            scores=scores,
+            history=conversation_history,
+            running_summary=self.running_summary
+        )
+        self.chunks_used = len(used_chunks)
+
+        response = await complete(
+            messages,
+            model=self.llm_model,
+            fallback_models=self.fallback_models
+        )
+
+        # Extract token usage - LiteLLM response structure might vary by provider
+        self.usage = response.usage
+        tokens_used = getattr(response.usage, 'total_tokens', 0)
+
+        return response.choices[0].message.content, tokens_used
+
+    def log_retrieval(self, message, query_text, embedding, chunks, scores, start_time):
+        """Queue an entry for KNOWLEDGE_RETRIEVAL_LOGS"""
+        log_writer.add(KnowledgeRetrievalLog(
+            tenant=self.tenant,
+            conversation=self.conversation,
+            message=message,
+            query_text=query_text,
+            query_embedding=sample_embedding(embedding),
+            retrieved_chunks=[{"chunk_id": str(c["id"])} for c in chunks],
+            similarity_scores=scores,
+            chunks_used_count=len(chunks),
+            retrieval_time_ms=int((timezone.now() - start_time).total_seconds() * 1000)
+        ))
+
+    def log_ai_usage(self, message, tokens, chunks_used, start_time):
+        """Queue an entry for AI_USAGE_LOGS"""
+        log_writer.add(AIUsageLog(
+            tenant=self.tenant,
+            conversation=self.conversation,
+            message=message,
+            usage_date=timezone.now().date(),
+            tokens_used=tokens,
+            prompt_tokens=getattr(self.usage, 'prompt_tokens', 0) or 0,
+            completion_tokens=getattr(self.usage, 'completion_tokens', 0) or 0,
+            prompt_sections=self.prompt_sections,
+            processing_time_ms=int((timezone.now() - start_time).total_seconds() * 1000),
+            confidence_score=0.9,
+            knowledge_chunks_used=chunks_used,
+            handover_triggered=False
+        ))
+
+    @worker_sync_to_async
+    def update_conversation(self):
+        """Update CONVERSATIONS table"""
+        self.conversation.last_message_at = timezone.now()
+        self.conversation.last_ai_response_at = timezone.now()
+        self.conversation.save(update_fields=['last_message_at', 'last_ai_response_at'])
+
+    @worker_sync_to_async
+    def update_customer(self):
+        """Update CUSTOMERS table"""
+        self.customer.last_contact_at = timezone.now()
+        self.customer.save(update_fields=['last_contact_at'])
+        self.customer.touch()
+
+
+class RAGService:
+    """
+    Generates AI replies on a bounded pool of workers, independent of any
+    websocket being open.
+
+    Jobs are submitted from webhook ingestion (or a websocket) and run on a
+    dedicated event loop thread. Each reply is stored, sent back to the
+    platform when the question came from one, and published to
+    ``rag_processor_{conversation_id}`` for subscribed websockets.
+
+    The queue is bounded by RAG_QUEUE_SIZE and lives in process memory:
+    questions submitted while it is full are refused (``submit`` returns
+    False) and counted in ``dropped``, and questions still queued when the
+    process exits are lost. Their messages stay stored, just unanswered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self.dropped = 0
+
+    @property
+    def concurrency(self) -> int:
+        return getattr(settings, 'RAG_WORKER_CONCURRENCY', 4)
+
+    @property
+    def queue_size(self) -> int:
+        return getattr(settings, 'RAG_QUEUE_SIZE', 200)
+
+    def submit(self, conversation_id, question: str, message_id=None, reply_to_platform: bool = True) -> bool:
+        """
+        Queue a question for an AI reply; safe to call from sync or async code.
+        Returns False when the queue is full and the question was not queued.
+        """
+        job = RAGJob(conversation_id, question, message_id, reply_to_platform)
+        loop = self._ensure_workers()
+        if self._queue.full():
+            self._dropped(job)
+            return False
+        loop.call_soon_threadsafe(self._enqueue, job)
+        return True
+
+    def _enqueue(self, job: RAGJob):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Filled up between submit's check and now
+            self._dropped(job)
+
+    def _dropped(self, job: RAGJob):
+        self.dropped += 1
+        logger.error(
+            f"RAG queue full, dropped question for conversation {job.conversation_id} "
+            f"({self.dropped} dropped so far)"
+        )
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_workers,
+                    args=(ready,),
+                    name='rag-service',
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_workers(self, ready: threading.Event):
+        loop = new_worker_loop('rag-service', self.concurrency)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._loop = loop
+        ready.set()
+        loop.run_until_complete(asyncio.gather(
+            *(self._worker() for _ in range(self.concurrency))
+        ))
+
+    async def _worker(self):
+        channel_layer = get_channel_layer()
+
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(channel_layer, job)
+            except Exception as e:
+                logger.error(f"Error generating AI reply for conversation {job.conversation_id}: {e}")
+                await self._publish(channel_layer, job, {'error': str(e)})
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, channel_layer, job: RAGJob):
+        pipeline = await RAGPipeline.for_conversation(job.conversation_id)
+        if not pipeline:
+            logger.error(f"Conversation {job.conversation_id} not found for AI reply")
+            return
+
+        ai_message, response = await pipeline.run(job)
+
+        if job.reply_to_platform:
+            await pipeline.send_platform_response(ai_message, response)
+
+        await self._publish(channel_layer, job, {
+            'message_id': str(ai_message.id),
+            'response': response,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    @staticmethod
+    async def _publish(channel_layer, job: RAGJob, payload: dict):
+        try:
+            await channel_layer.group_send(
+                f"rag_processor_{job.conversation_id}",
+                {'type': 'ai_reply', 'conversation_id': job.conversation_id, **payload}
+            )
+        except Exception as e:
+            logger.error(f"Error publishing AI reply: {e}")
+
+
+rag_service = RAGService()
@@ -0,0 +1,318 @@
+# ai/rate_limits.py
+"""
+Client-side rate limiting of LLM and embedding APIs.
+
+Every provider, model and API key gets two token buckets, one for requests
+per minute and one for tokens per minute, shared by all workers through
+Redis (or process memory without it). Callers wait for capacity before
+sending a request instead of finding out through a 429.
+
+Live chat traffic may drain the buckets completely; bulk work (ingestion,
+summaries) leaves LLM_RATE_LIMIT_BULK_RESERVE of each bucket free, so a
+burst of ingestion never starves replies to customers. Buckets follow the
+provider's own view: remaining-request/token headers lower them, and a
+429 with Retry-After pauses the key for every worker.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Mapping, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LIVE = 'live'
+BULK = 'bulk'
+
+
+def _limits(model: str) -> dict:
+    configured = getattr(settings, 'LLM_RATE_LIMITS', {}).get(model, {})
+    return {
+        'rpm': configured.get('rpm') or getattr(settings, 'LLM_DEFAULT_RPM', 500),
+        'tpm': configured.get('tpm') or getattr(settings, 'LLM_DEFAULT_TPM', 200000),
+    }
+
+
+def _qualified(model: str) -> str:
+    # Bare OpenAI model names (the embedding models) as LiteLLM spells them
+    return model if '/' in model else f'openai/{model}'
+
+
+def limit_key(model: str, api_key: Optional[str]) -> str:
+    fingerprint = hashlib.sha1((api_key or '').encode()).hexdigest()[:12]
+    return f'{_qualified(model)}:{fingerprint}'
+
+
+def _header(headers: Mapping, name: str) -> Optional[str]:
+    # LiteLLM passes provider headers through with an 'llm_provider-' prefix
+    for key in (name, f'llm_provider-{name}'):
+        value = headers.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def retry_after(headers: Optional[Mapping]) -> Optional[float]:
+    """Seconds from Retry-After (or retry-after-ms) of a 429 response"""
+    if not headers:
+        return None
+    try:
+        value = _header(headers, 'retry-after-ms')
+        if value is not None:
+            return float(value) / 1000
+        value = _header(headers, 'retry-after')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class InMemoryRateLimitBackend:
+    """Buckets of this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> {requests, tokens, updated, blocked_until}
+
+    def _bucket(self, key, rpm, tpm, now):
+        bucket = self._buckets.setdefault(key, {'requests': rpm, 'tokens': tpm, 'updated': now, 'blocked_until': 0})
+        elapsed = max(0.0, now - bucket['updated'])
+        bucket['requests'] = min(rpm, bucket['requests'] + elapsed * rpm / 60)
+        bucket['tokens'] = min(tpm, bucket['tokens'] + elapsed * tpm / 60)
+        bucket['updated'] = now
+        return bucket
+
+    async def acquire(self, key, rpm, tpm, tokens, reserve) -> float:
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(key, rpm, tpm, now)
+            if bucket['blocked_until'] > now:
+                return bucket['blocked_until'] - now
+
+            need_requests = 1 + reserve * rpm
+            # A request larger than the whole bucket goes through once it is full
+            need_tokens = min(tokens + reserve * tpm, tpm)
+            if bucket['requests'] >= need_requests and bucket['tokens'] >= need_tokens:
+                bucket['requests'] -= 1
+                bucket['tokens'] -= tokens
+                return 0.0
+            return max(
+                (need_requests - bucket['requests']) * 60 / rpm,
+                (need_tokens - bucket['tokens']) * 60 / tpm,
+                0.001
+            )
+
+    async def adjust(self, key, rpm, tpm, tokens):
+        with self._lock:
+            self._bucket(key, rpm, tpm, time.time())['tokens'] -= tokens
+
+    async def observe(self, key, rpm, tpm, remaining_requests=None, remaining_tokens=None, blocked_for=None):
+        now = time.time()
+        with self._lock:
+            bucket = self._bucket(key, rpm, tpm, now)
+            if remaining_requests is not None:
+                bucket['requests'] = min(bucket['requests'], remaining_requests)
+            if remaining_tokens is not None:
+                bucket['tokens'] = min(bucket['tokens'], remaining_tokens)
+            if blocked_for:
+                bucket['blocked_until'] = max(bucket['blocked_until'], now + blocked_for)
+
+
+# Shared refill step: KEYS[1] bucket hash; ARGV[1..2] rpm, tpm. The clock is
+# the Redis server's, so workers on hosts with skewed clocks agree on it.
+_LUA_REFILL = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local rpm, tpm = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated', 'blocked_until')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local updated = tonumber(state[3]) or now
+local blocked_until = tonumber(state[4]) or 0
+local elapsed = math.max(0, now - updated)
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local function save()
+    redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated', now,
+               'blocked_until', blocked_until)
+    redis.call('EXPIRE', KEYS[1], 120)
+end
+"""
+
+_LUA_ACQUIRE = _LUA_REFILL + """
+local cost, reserve = tonumber(ARGV[3]), tonumber(ARGV[4])
+if blocked_until > now then
+    save()
+    return tostring(blocked_until - now)
+end
+local need_requests = 1 + reserve * rpm
+local need_tokens = math.min(cost + reserve * tpm, tpm)
+if requests >= need_requests and tokens >= need_tokens then
+    requests = requests - 1
+    tokens = tokens - cost
+    save()
+    return '0'
+end
+save()
+return tostring(math.max((need_requests - requests) * 60 / rpm, (need_tokens - tokens) * 60 / tpm, 0.001))
+"""
+
+_LUA_ADJUST = _LUA_REFILL + """
+tokens = tokens - tonumber(ARGV[3])
+save()
+"""
+
+_LUA_OBSERVE = _LUA_REFILL + """
+if ARGV[3] ~= '' then requests = math.min(requests, tonumber(ARGV[3])) end
+if ARGV[4] ~= '' then tokens = math.min(tokens, tonumber(ARGV[4])) end
+if ARGV[5] ~= '' then blocked_until = math.max(blocked_until, now + tonumber(ARGV[5])) end
+save()
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Buckets shared by every process; each step is one Lua script.
+
+    Uses redis.asyncio so waiting on Redis never blocks an event loop. Its
+    connections belong to the loop that opened them, and the limiter is used
+    from the ASGI loop as well as the worker loops, so each loop gets its own
+    client.
+    """
+
+    def __init__(self, url: str, prefix: str = 'ratelimit'):
+        self._url = url
+        self._prefix = prefix
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> (acquire, adjust, observe) scripts
+
+    def _scripts(self):
+        loop = asyncio.get_running_loop()
+        scripts = self._clients.get(loop)
+        if scripts is None:
+            import redis.asyncio
+            client = redis.asyncio.Redis.from_url(self._url, decode_responses=True)
+            scripts = self._clients[loop] = (
+                client.register_script(_LUA_ACQUIRE),
+                client.register_script(_LUA_ADJUST),
+                client.register_script(_LUA_OBSERVE),
+            )
+        return scripts
+
+    def _key(self, key):
+        return f'{self._prefix}:{key}'
+
+    async def acquire(self, key, rpm, tpm, tokens, reserve) -> float:
+        acquire, _, _ = self._scripts()
+        return float(await acquire(keys=[self._key(key)], args=[rpm, tpm, tokens, reserve]))
+
+    async def adjust(self, key, rpm, tpm, tokens):
+        _, adjust, _ = self._scripts()
+        await adjust(keys=[self._key(key)], args=[rpm, tpm, tokens])
+
+    async def observe(self, key, rpm, tpm, remaining_requests=None, remaining_tokens=None, blocked_for=None):
+        def arg(value):
+            return '' if value is None else value
+        _, _, observe = self._scripts()
+        await observe(keys=[self._key(key)], args=[
+            rpm, tpm, arg(remaining_requests), arg(remaining_tokens), arg(blocked_for)
+        ])
+
+
+class Lease:
+    """Capacity taken for one request; settle it with the tokens actually used"""
+
+    def __init__(self, limiter, key, limits, tokens):
+        self._limiter = limiter
+        self._key = key
+        self._limits = limits
+        self.tokens = tokens
+
+    async def settle(self, used_tokens: Optional[int]):
+        """Charge or refund the difference between the estimate and the real usage"""
+        if used_tokens is None:
+            return
+        delta = used_tokens - self.tokens
+        self.tokens = used_tokens
+        if delta:
+            await self._limiter._call('adjust', self._key, self._limits['rpm'], self._limits['tpm'], delta)
+
+    async def observe(self, headers: Optional[Mapping]):
+        """Align the buckets with a response's x-ratelimit-remaining-* headers"""
+        if not headers:
+            return
+
+        def number(name):
+            value = _header(headers, name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        remaining_requests = number('x-ratelimit-remaining-requests')
+        remaining_tokens = number('x-ratelimit-remaining-tokens')
+        if remaining_requests is not None or remaining_tokens is not None:
+            await self._limiter._call(
+                'observe', self._key, self._limits['rpm'], self._limits['tpm'],
+                remaining_requests, remaining_tokens, None
+            )
+
+    async def rate_limited(self, headers: Optional[Mapping]):
+        """The provider answered 429: pause this key for every worker"""
+        wait = retry_after(headers) or getattr(settings, 'LLM_RATE_LIMIT_DEFAULT_BACKOFF', 5)
+        logger.warning(f"Rate limited on {self._key}, pausing for {wait:.1f}s")
+        await self._limiter._call('observe', self._key, self._limits['rpm'], self._limits['tpm'], None, None, wait)
+
+
+class RateLimiter:
+    """
+    Waits for request and token capacity per provider, model and API key::
+
+        async with rate_limiter.limit(model, api_key, tokens=estimate) as lease:
+            response = await call()
+            await lease.settle(response.usage.total_tokens)
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    url = getattr(settings, 'RATE_LIMIT_REDIS_URL', None)
+                    self._backend = RedisRateLimitBackend(url) if url else InMemoryRateLimitBackend()
+        return self._backend
+
+    async def _call(self, method, *args):
+        # Limiting is best effort; a Redis outage must not stop AI replies
+        try:
+            return await getattr(self.backend, method)(*args)
+        except Exception as e:
+            logger.error(f"Rate limiter {method} failed: {e}")
+            return 0.0
+
+    def _prepare(self, model, api_key, tokens, priority):
+        key = limit_key(model, api_key)
+        limits = _limits(_qualified(model))
+        reserve = getattr(settings, 'LLM_RATE_LIMIT_BULK_RESERVE', 0.2) if priority == BULK else 0
+        return key, limits, reserve, Lease(self, key, limits, tokens)
+
+    @asynccontextmanager
+    async def limit(self, model: str, api_key: Optional[str], tokens: int = 0, priority: str = LIVE):
+        key, limits, reserve, lease = self._prepare(model, api_key, tokens, priority)
+        while True:
+            wait = await self._call('acquire', key, limits['rpm'], limits['tpm'], tokens, reserve)
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, 5))
+        yield lease
+
+
+rate_limiter = RateLimiter()
@@ -13,7 +13,8 @@ class TenantAISettingSerializer(serializers.ModelSerializer):
             'auto_response_enabled', 'response_delay_seconds', 'confidence_threshold',
             'knowledge_base_enabled', 'max_knowledge_chunks', 'similarity_threshold',
             'business_hours', 'escalation_keywords', 'blocked_topics',
-            'handover_triggers', 'created_at', 'updated_at'
+            'handover_triggers', 'prompt_token_budget', 'primary_model', 'fallback_models',
+            'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
@@ -26,7 +27,8 @@ class TenantAISettingCreateSerializer(serializers.ModelSerializer):
             'platform_id', 'system_prompt', 'auto_response_enabled',
             'response_delay_seconds', 'confidence_threshold', 'knowledge_base_enabled',
             'max_knowledge_chunks', 'similarity_threshold', 'business_hours',
-            'escalation_keywords', 'blocked_topics', 'handover_triggers'
+            'escalation_keywords', 'blocked_topics', 'handover_triggers',
+            'prompt_token_budget', 'primary_model', 'fallback_models'
         ]
     
     def validate_platform_id(self, value):
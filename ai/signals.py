@@ -0,0 +1,17 @@
+# ai/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .matching import forget_matcher, get_matcher
+from .models import TenantAISetting
+
+
+@receiver(post_save, sender=TenantAISetting)
+def compile_keyword_matcher(sender, instance, **kwargs):
+    """Compile the new keyword lists now rather than on the next inbound message"""
+    get_matcher(instance)
+
+
+@receiver(post_delete, sender=TenantAISetting)
+def drop_keyword_matcher(sender, instance, **kwargs):
+    forget_matcher(instance.id)
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from ai.embeddings import EmbeddingService
+from ai.llm import CLOSED, OPEN, ModelRouter
+from ai.rate_limits import RateLimiter, RedisRateLimitBackend
+from core.db import new_worker_loop, worker_sync_to_async
+
+
+class FakeEmbeddingsAPI:
+    """Stands in for ``AsyncOpenAI().embeddings.with_raw_response``"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, input, model):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        response = SimpleNamespace(
+            usage=SimpleNamespace(total_tokens=len(input)),
+            # Out of order on purpose; the service sorts by index
+            data=[SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in reversed(list(enumerate(input)))]
+        )
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+@override_settings(
+    OPENAI_API_KEY='test',
+    RATE_LIMIT_REDIS_URL=None,
+    EMBEDDING_BATCH_SIZE=2,
+    EMBEDDING_MAX_CONCURRENCY=2
+)
+class EmbeddingServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.api = FakeEmbeddingsAPI(delay=0.2)
+        client = SimpleNamespace(embeddings=SimpleNamespace(with_raw_response=self.api))
+        for target, value in (
+            ('openai.AsyncOpenAI', mock.Mock(return_value=client)),
+            ('ai.embeddings.rate_limiter', RateLimiter()),
+            ('ai.embeddings.count_tokens', lambda text, model: len(text)),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.service = EmbeddingService()
+
+    async def test_awaiting_embeddings_does_not_block_the_callers_loop(self):
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = 0.05
+        loop.set_debug(True)
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        try:
+            # asyncio reports callbacks that hold the loop longer than slow_callback_duration
+            with self.assertNoLogs('asyncio', level='WARNING'):
+                embeddings = await self.service.embed_many(['a', 'bb', 'ccc', 'dddd', 'eeeee'])
+        finally:
+            beat.cancel()
+            loop.set_debug(False)
+
+        self.assertEqual(embeddings, [[1.0], [2.0], [3.0], [4.0], [5.0]])
+        # Three batches, two at a time: two rounds of 0.2s with the heartbeat running throughout
+        self.assertGreaterEqual(ticks, 20)
+
+    def test_sync_callers_get_batches_back_in_order(self):
+        texts = ['a' * n for n in range(1, 8)]
+
+        embeddings = self.service.embed_many_sync(texts)
+
+        self.assertEqual(embeddings, [[float(n)] for n in range(1, 8)])
+        self.assertEqual(self.api.requests, 4)
+        self.assertLessEqual(self.api.max_in_flight, 2)
+
+    async def test_concurrent_callers_share_one_connection_limit(self):
+        results = await asyncio.gather(*(self.service.embed(f'text {i}') for i in range(6)))
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.api.max_in_flight, 2)
+
+
+PRIMARY = 'openai/primary'
+FALLBACK = 'openai/fallback'
+
+
+class FakeProviders:
+    """Stands in for litellm's ``acompletion``; each model answers, fails or stalls as told"""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+        self.delays = {}
+
+    async def __call__(self, model, messages, api_key=None, **kwargs):
+        self.calls.append(model)
+        await asyncio.sleep(self.delays.get(model, 0))
+        if model in self.failing:
+            raise RuntimeError(f'{model} is down')
+        return SimpleNamespace(model=model, usage=SimpleNamespace(total_tokens=10), _hidden_params={})
+
+
+@override_settings(
+    LLM_MODEL=PRIMARY,
+    OPENAI_API_KEY='test',
+    LLM_PROVIDER_API_KEYS={},
+    LLM_MODEL_API_BASES={},
+    RATE_LIMIT_REDIS_URL=None,
+    LLM_CIRCUIT_FAILURES=3,
+    LLM_CIRCUIT_COOLDOWN_SECONDS=30,
+    LLM_HEDGE_DEFAULT_SECONDS=5
+)
+class ModelRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.providers = FakeProviders()
+        for target, value in (
+            ('ai.llm.acompletion', self.providers),
+            ('ai.llm.rate_limiter', RateLimiter()),
+            ('ai.llm.estimate_tokens', lambda messages, model, max_tokens=None: 10),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.router = ModelRouter()
+
+    async def _complete(self):
+        return await self.router.complete([{'role': 'user', 'content': 'Hi'}], [PRIMARY, FALLBACK])
+
+    async def _open_primary_circuit(self):
+        self.providers.failing.add(PRIMARY)
+        for _ in range(3):
+            await self._complete()
+        self.providers.calls.clear()
+
+    async def test_fails_over_when_the_primary_errors(self):
+        self.providers.failing.add(PRIMARY)
+
+        response = await self._complete()
+
+        self.assertEqual(response.model, FALLBACK)
+        self.assertEqual(self.providers.calls, [PRIMARY, FALLBACK])
+        self.assertEqual(self.router.endpoint(PRIMARY).consecutive_failures, 1)
+
+    async def test_circuit_opens_after_consecutive_failures(self):
+        await self._open_primary_circuit()
+        self.assertEqual(self.router.endpoint(PRIMARY).state, OPEN)
+
+        response = await self._complete()
+
+        self.assertEqual(response.model, FALLBACK)
+        self.assertEqual(self.providers.calls, [FALLBACK])
+
+    async def test_successful_trial_after_cooldown_closes_the_circuit(self):
+        await self._open_primary_circuit()
+        self.providers.failing.clear()
+        self.router.endpoint(PRIMARY).opened_at = time.monotonic() - 31
+
+        response = await self._complete()
+
+        self.assertEqual(response.model, PRIMARY)
+        self.assertEqual(self.router.endpoint(PRIMARY).state, CLOSED)
+
+    async def test_failed_trial_reopens_the_circuit(self):
+        await self._open_primary_circuit()
+        endpoint = self.router.endpoint(PRIMARY)
+        endpoint.opened_at = time.monotonic() - 31
+
+        response = await self._complete()
+
+        self.assertEqual(response.model, FALLBACK)
+        self.assertEqual(self.providers.calls, [PRIMARY, FALLBACK])
+        self.assertEqual(endpoint.state, OPEN)
+        self.assertFalse(endpoint.trial_running)
+
+    @override_settings(LLM_HEDGE_DEFAULT_SECONDS=0.05)
+    async def test_slow_primary_is_hedged_without_counting_as_a_failure(self):
+        self.providers.delays[PRIMARY] = 1
+
+        started = time.monotonic()
+        response = await self._complete()
+
+        self.assertEqual(response.model, FALLBACK)
+        self.assertLess(time.monotonic() - started, 0.5)
+        # Let the losing attempt process its cancellation
+        await asyncio.sleep(0)
+        endpoint = self.router.endpoint(PRIMARY)
+        self.assertEqual(endpoint.state, CLOSED)
+        self.assertEqual(endpoint.consecutive_failures, 0)
+        # The time it ran before the cancel still counts towards its latency
+        self.assertEqual(len(endpoint.latencies), 1)
+        self.assertGreaterEqual(endpoint.latencies[0], 0.05)
+
+    async def test_raises_when_every_model_fails(self):
+        self.providers.failing.update({PRIMARY, FALLBACK})
+
+        with self.assertRaisesMessage(RuntimeError, f'{FALLBACK} is down'):
+            await self._complete()
+
+    async def test_primary_is_tried_when_every_circuit_is_open(self):
+        self.providers.failing.update({PRIMARY, FALLBACK})
+        for _ in range(3):
+            with self.assertRaises(RuntimeError):
+                await self._complete()
+        self.providers.failing.clear()
+        self.providers.calls.clear()
+
+        response = await self._complete()
+
+        self.assertEqual(response.model, PRIMARY)
+        self.assertEqual(self.providers.calls, [PRIMARY])
+
+
+class WorkerLoopTests(SimpleTestCase):
+    def test_database_calls_from_a_worker_loop_run_in_parallel(self):
+        # Only passes once all four calls are in flight at the same time
+        barrier = threading.Barrier(4, timeout=5)
+
+        def query():
+            barrier.wait()
+            return threading.current_thread().name
+
+        result = {}
+
+        def run_worker():
+            loop = new_worker_loop('test-worker', 4)
+            try:
+                result['threads'] = loop.run_until_complete(
+                    asyncio.gather(*(worker_sync_to_async(query)() for _ in range(4)))
+                )
+            except threading.BrokenBarrierError:
+                result['threads'] = []
+            finally:
+                loop.close()
+
+        # Like the RAG service and log writer: a loop on its own daemon thread
+        worker = threading.Thread(target=run_worker, daemon=True)
+        worker.start()
+        worker.join(10)
+
+        self.assertEqual(len(set(result['threads'])), 4)
+        self.assertTrue(all(name.startswith('test-worker-db') for name in result['threads']))
+
+
+@skipUnless(settings.REDIS_URL, 'REDIS_URL is not set')
+class RedisRateLimitBackendTests(SimpleTestCase):
+    def test_bucket_is_shared_across_event_loops(self):
+        backend = RedisRateLimitBackend(settings.REDIS_URL, prefix=f'ratelimit_test_{uuid.uuid4().hex}')
+
+        # Each asyncio.run is a separate loop, like the ASGI loop and the RAG workers
+        waits = [asyncio.run(backend.acquire('model:key', 2, 1000, 10, 0)) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertGreater(waits[2], 0)
@@ -0,0 +1,40 @@
+# analytics/management/commands/run_rollups.py
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from analytics.rollups import backfill, run_incremental
+
+
+class Command(BaseCommand):
+    help = 'Roll new conversation activity up into ConversationMetrics and DailyAnalytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill-from', type=date.fromisoformat,
+                            help='Rebuild rollups from this UTC date (YYYY-MM-DD) instead of running incrementally')
+        parser.add_argument('--backfill-to', type=date.fromisoformat,
+                            help='Last UTC date to rebuild (default: today)')
+        parser.add_argument('--workers', type=int, default=4, help='Parallel workers for a backfill')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, one incremental pass every N seconds')
+
+    def handle(self, *args, **options):
+        if options['backfill_from']:
+            end = options['backfill_to'] or date.today()
+            conversations, days = backfill(options['backfill_from'], end, workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Rebuilt {conversations} conversation metrics and {days} daily rows '
+                f'for {options["backfill_from"]} - {end}'
+            ))
+            return
+
+        while True:
+            state = run_incremental()
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Rolled up to {state.high_water_mark}: {state.last_run_conversations} conversations, '
+                f'{state.last_run_days} daily rows'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('high_water_mark', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_conversations', models.IntegerField(default=0)),
+                ('last_run_days', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'analytics_rollup_state',
+            },
+        ),
+    ]
@@ -57,4 +57,18 @@ class DailyAnalytics(models.Model):
         verbose_name_plural = 'Daily Analytics'
 
     def __str__(self):
-        return f"{self.tenant.business_name} - {self.platform.name} - {self.analytics_date}"
\ No newline at end of file
+        return f"{self.tenant.business_name} - {self.platform.name} - {self.analytics_date}"
+
+class RollupState(models.Model):
+    """High-water mark of the incremental analytics rollup"""
+    name = models.CharField(max_length=50, primary_key=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_conversations = models.IntegerField(default=0)
+    last_run_days = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'analytics_rollup_state'
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water_mark}"
@@ -0,0 +1,292 @@
+# analytics/rollups.py
+"""
+Incremental rollups of raw conversation activity into ConversationMetrics and
+DailyAnalytics.
+
+Each run looks at the events recorded since the stored high-water mark:
+messages, conversation updates, lead updates and AI usage logs. It works out
+which conversations and which (tenant, platform, day) rows they affect, and
+recomputes exactly those rows with INSERT ... ON CONFLICT DO UPDATE. That
+makes runs idempotent, and late or edited events simply mark their rows dirty
+again. Days are UTC days.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .models import RollupState
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'daily'
+BATCH_SIZE = 1000
+
+REPLY_SENDERS = "('agent', 'human', 'ai')"
+
+_DIRTY_CONVERSATIONS_SQL = """
+    SELECT conversation_id FROM messages WHERE created_at > %(lo)s AND created_at <= %(hi)s
+    UNION
+    SELECT id FROM conversations WHERE updated_at > %(lo)s AND updated_at <= %(hi)s
+    UNION
+    SELECT conversation_id FROM ai_usage_logs WHERE created_at > %(lo)s AND created_at <= %(hi)s
+"""
+
+_DIRTY_DAYS_SQL = """
+    SELECT m.tenant_id, c.platform_id, (m.created_at AT TIME ZONE 'UTC')::date
+    FROM messages m JOIN conversations c ON c.id = m.conversation_id
+    WHERE m.created_at > %(lo)s AND m.created_at <= %(hi)s
+    UNION
+    SELECT tenant_id, platform_id, (created_at AT TIME ZONE 'UTC')::date
+    FROM conversations WHERE id = ANY(%(conversations)s::uuid[])
+    UNION
+    SELECT tenant_id, platform_id, (resolved_at AT TIME ZONE 'UTC')::date
+    FROM conversations WHERE id = ANY(%(conversations)s::uuid[]) AND resolved_at IS NOT NULL
+    UNION
+    SELECT tenant_id, source_platform_id, (created_at AT TIME ZONE 'UTC')::date
+    FROM leads WHERE updated_at > %(lo)s AND updated_at <= %(hi)s AND source_platform_id IS NOT NULL
+    UNION
+    SELECT tenant_id, source_platform_id, (updated_at AT TIME ZONE 'UTC')::date
+    FROM leads WHERE updated_at > %(lo)s AND updated_at <= %(hi)s AND source_platform_id IS NOT NULL
+    UNION
+    SELECT u.tenant_id, c.platform_id, (u.created_at AT TIME ZONE 'UTC')::date
+    FROM ai_usage_logs u JOIN conversations c ON c.id = u.conversation_id
+    WHERE u.created_at > %(lo)s AND u.created_at <= %(hi)s
+"""
+
+_CONVERSATION_METRICS_SQL = f"""
+    WITH targets AS (
+        SELECT id, tenant_id, status, created_at, resolved_at
+        FROM conversations WHERE id = ANY(%(ids)s::uuid[])
+    ),
+    msgs AS (
+        SELECT m.conversation_id, m.sender_type, m.created_at,
+               LAG(m.sender_type) OVER w AS prev_sender,
+               LAG(m.created_at) OVER w AS prev_at
+        FROM messages m
+        WHERE m.conversation_id = ANY(%(ids)s::uuid[]) AND NOT m.is_deleted
+        WINDOW w AS (PARTITION BY m.conversation_id ORDER BY m.created_at, m.id)
+    ),
+    stats AS (
+        SELECT conversation_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE sender_type = 'customer') AS customer,
+               COUNT(*) FILTER (WHERE sender_type IN ('agent', 'human')) AS agent,
+               COUNT(*) FILTER (WHERE sender_type = 'ai') AS ai,
+               -- A human reply straight after an AI message is a handover
+               COUNT(*) FILTER (WHERE sender_type IN ('agent', 'human') AND prev_sender = 'ai') AS handovers,
+               MIN(created_at) FILTER (WHERE sender_type = 'customer') AS first_customer_at,
+               AVG(EXTRACT(EPOCH FROM created_at - prev_at))
+                   FILTER (WHERE sender_type IN {REPLY_SENDERS} AND prev_sender = 'customer') AS avg_response
+        FROM msgs GROUP BY conversation_id
+    ),
+    first_reply AS (
+        SELECT s.conversation_id, MIN(m.created_at) AS replied_at
+        FROM stats s JOIN msgs m ON m.conversation_id = s.conversation_id
+        WHERE m.sender_type IN {REPLY_SENDERS} AND m.created_at > s.first_customer_at
+        GROUP BY s.conversation_id
+    )
+    INSERT INTO conversation_metrics (
+        id, tenant_id, conversation_id, first_response_time_seconds, average_response_time_seconds,
+        resolution_time_seconds, total_messages, customer_messages, agent_messages, ai_messages,
+        handover_count, ai_handling_percentage, resolution_status, created_at, updated_at
+    )
+    SELECT gen_random_uuid(), t.tenant_id, t.id,
+           EXTRACT(EPOCH FROM fr.replied_at - s.first_customer_at)::int,
+           s.avg_response::int,
+           CASE WHEN t.resolved_at IS NOT NULL THEN EXTRACT(EPOCH FROM t.resolved_at - t.created_at)::int END,
+           COALESCE(s.total, 0), COALESCE(s.customer, 0), COALESCE(s.agent, 0), COALESCE(s.ai, 0),
+           COALESCE(s.handovers, 0),
+           CASE WHEN s.ai + s.agent > 0 THEN ROUND(100.0 * s.ai / (s.ai + s.agent), 2) END,
+           t.status, NOW(), NOW()
+    FROM targets t
+    LEFT JOIN stats s ON s.conversation_id = t.id
+    LEFT JOIN first_reply fr ON fr.conversation_id = t.id
+    ON CONFLICT (conversation_id) DO UPDATE SET
+        first_response_time_seconds = EXCLUDED.first_response_time_seconds,
+        average_response_time_seconds = EXCLUDED.average_response_time_seconds,
+        resolution_time_seconds = EXCLUDED.resolution_time_seconds,
+        total_messages = EXCLUDED.total_messages,
+        customer_messages = EXCLUDED.customer_messages,
+        agent_messages = EXCLUDED.agent_messages,
+        ai_messages = EXCLUDED.ai_messages,
+        handover_count = EXCLUDED.handover_count,
+        ai_handling_percentage = EXCLUDED.ai_handling_percentage,
+        resolution_status = EXCLUDED.resolution_status,
+        updated_at = NOW()
+"""
+
+_DAILY_ANALYTICS_SQL = """
+    WITH keys AS (
+        SELECT DISTINCT k.tenant_id, k.platform_id, k.day,
+               k.day::timestamp AT TIME ZONE 'UTC' AS day_start,
+               (k.day + 1)::timestamp AT TIME ZONE 'UTC' AS day_end
+        FROM unnest(%(tenants)s::uuid[], %(platforms)s::uuid[], %(days)s::date[]) AS k(tenant_id, platform_id, day)
+    ),
+    message_stats AS (
+        SELECT k.tenant_id, k.platform_id, k.day,
+               COUNT(m.id) AS messages,
+               COUNT(DISTINCT m.conversation_id) AS conversations,
+               COUNT(DISTINCT m.conversation_id) FILTER (WHERE m.sender_type = 'ai') AS ai_conversations
+        FROM keys k
+        JOIN messages m ON m.tenant_id = k.tenant_id
+            AND m.created_at >= k.day_start AND m.created_at < k.day_end AND NOT m.is_deleted
+        JOIN conversations c ON c.id = m.conversation_id AND c.platform_id = k.platform_id
+        GROUP BY k.tenant_id, k.platform_id, k.day
+    )
+    INSERT INTO daily_analytics (
+        id, tenant_id, platform_id, analytics_date, total_conversations, new_conversations,
+        resolved_conversations, total_messages, new_leads, qualified_leads, converted_leads,
+        ai_handled_conversations, ai_tokens_used, ai_accuracy_score,
+        avg_first_response_time_seconds, avg_resolution_time_seconds, created_at
+    )
+    SELECT gen_random_uuid(), k.tenant_id, k.platform_id, k.day,
+           COALESCE(ms.conversations, 0), created.total, resolved.total, COALESCE(ms.messages, 0),
+           lead_stats.new_leads, lead_stats.qualified, lead_stats.converted,
+           COALESCE(ms.ai_conversations, 0), usage_stats.tokens, usage_stats.accuracy,
+           created.avg_first_response, resolved.avg_resolution, NOW()
+    FROM keys k
+    LEFT JOIN message_stats ms USING (tenant_id, platform_id, day)
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS total, AVG(cm.first_response_time_seconds)::int AS avg_first_response
+        FROM conversations c LEFT JOIN conversation_metrics cm ON cm.conversation_id = c.id
+        WHERE c.tenant_id = k.tenant_id AND c.platform_id = k.platform_id
+          AND c.created_at >= k.day_start AND c.created_at < k.day_end
+    ) created
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS total, AVG(cm.resolution_time_seconds)::int AS avg_resolution
+        FROM conversations c LEFT JOIN conversation_metrics cm ON cm.conversation_id = c.id
+        WHERE c.tenant_id = k.tenant_id AND c.platform_id = k.platform_id
+          AND c.resolved_at >= k.day_start AND c.resolved_at < k.day_end
+    ) resolved
+    CROSS JOIN LATERAL (
+        -- Qualification/conversion is attributed to the day of the lead's last update
+        SELECT COUNT(*) FILTER (WHERE l.created_at >= k.day_start AND l.created_at < k.day_end) AS new_leads,
+               COUNT(*) FILTER (WHERE l.status = 'qualified' AND l.updated_at >= k.day_start AND l.updated_at < k.day_end) AS qualified,
+               COUNT(*) FILTER (WHERE l.status = 'converted' AND l.updated_at >= k.day_start AND l.updated_at < k.day_end) AS converted
+        FROM leads l
+        WHERE l.tenant_id = k.tenant_id AND l.source_platform_id = k.platform_id
+          AND ((l.created_at >= k.day_start AND l.created_at < k.day_end)
+               OR (l.updated_at >= k.day_start AND l.updated_at < k.day_end))
+    ) lead_stats
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(SUM(u.tokens_used), 0) AS tokens, ROUND(AVG(u.confidence_score), 2) AS accuracy
+        FROM ai_usage_logs u JOIN conversations c ON c.id = u.conversation_id
+        WHERE u.tenant_id = k.tenant_id AND c.platform_id = k.platform_id
+          AND u.created_at >= k.day_start AND u.created_at < k.day_end
+    ) usage_stats
+    ON CONFLICT (tenant_id, platform_id, analytics_date) DO UPDATE SET
+        total_conversations = EXCLUDED.total_conversations,
+        new_conversations = EXCLUDED.new_conversations,
+        resolved_conversations = EXCLUDED.resolved_conversations,
+        total_messages = EXCLUDED.total_messages,
+        new_leads = EXCLUDED.new_leads,
+        qualified_leads = EXCLUDED.qualified_leads,
+        converted_leads = EXCLUDED.converted_leads,
+        ai_handled_conversations = EXCLUDED.ai_handled_conversations,
+        ai_tokens_used = EXCLUDED.ai_tokens_used,
+        ai_accuracy_score = EXCLUDED.ai_accuracy_score,
+        avg_first_response_time_seconds = EXCLUDED.avg_first_response_time_seconds,
+        avg_resolution_time_seconds = EXCLUDED.avg_resolution_time_seconds
+"""
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = sorted(items, key=str)  # stable lock order between concurrent upserts
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def dirty_since(lo, hi):
+    """(conversation ids, {(tenant_id, platform_id, day)}) touched by events in (lo, hi]"""
+    with connection.cursor() as cursor:
+        cursor.execute(_DIRTY_CONVERSATIONS_SQL, {'lo': lo, 'hi': hi})
+        conversations = [str(row[0]) for row in cursor.fetchall()]
+        cursor.execute(_DIRTY_DAYS_SQL, {'lo': lo, 'hi': hi, 'conversations': conversations})
+        days = {(str(t), str(p), d) for t, p, d in cursor.fetchall() if t and p and d}
+    return conversations, days
+
+
+def refresh_conversation_metrics(conversation_ids):
+    with connection.cursor() as cursor:
+        for batch in _batches(conversation_ids):
+            cursor.execute(_CONVERSATION_METRICS_SQL, {'ids': batch})
+
+
+def refresh_daily_analytics(keys):
+    with connection.cursor() as cursor:
+        for batch in _batches(keys):
+            cursor.execute(_DAILY_ANALYTICS_SQL, {
+                'tenants': [k[0] for k in batch],
+                'platforms': [k[1] for k in batch],
+                'days': [k[2] for k in batch],
+            })
+
+
+def run_incremental(now=None):
+    """
+    Process events since the high-water mark. Events newer than
+    ANALYTICS_ROLLUP_LAG_SECONDS are left for the next run so rows from
+    transactions that commit late are not skipped.
+    """
+    hi = (now or timezone.now()) - timedelta(seconds=getattr(settings, 'ANALYTICS_ROLLUP_LAG_SECONDS', 120))
+
+    with transaction.atomic():
+        state, _ = RollupState.objects.get_or_create(name=STATE_NAME)
+        # Serializes concurrent runs
+        state = RollupState.objects.select_for_update().get(pk=state.pk)
+        lo = state.high_water_mark or datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+        if hi <= lo:
+            return state
+
+        conversations, days = dirty_since(lo, hi)
+        # Daily averages read the per-conversation metrics, so those go first
+        refresh_conversation_metrics(conversations)
+        refresh_daily_analytics(days)
+
+        state.high_water_mark = hi
+        state.last_run_at = timezone.now()
+        state.last_run_conversations = len(conversations)
+        state.last_run_days = len(days)
+        state.save()
+
+    logger.info(f"Analytics rollup up to {hi}: {len(conversations)} conversations, {len(days)} days")
+    return state
+
+
+def _in_worker(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+def backfill(start, end, workers=4, chunk_days=1):
+    """
+    Rebuild rollups for the UTC dates [start, end] in parallel day chunks:
+    first every affected conversation's metrics, then the daily rows.
+    Leaves the high-water mark alone.
+    """
+    windows = []
+    day = start
+    while day <= end:
+        lo = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+        windows.append((lo - timedelta(microseconds=1), lo + timedelta(days=chunk_days) - timedelta(microseconds=1)))
+        day += timedelta(days=chunk_days)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        dirty = list(pool.map(lambda window: _in_worker(dirty_since, *window), windows))
+
+        conversations = sorted({cid for ids, _ in dirty for cid in ids})
+        chunks = [conversations[i:i + BATCH_SIZE] for i in range(0, len(conversations), BATCH_SIZE)]
+        list(pool.map(lambda ids: _in_worker(refresh_conversation_metrics, ids), chunks))
+
+        keys = sorted({key for _, days in dirty for key in days if start <= key[2] <= end}, key=str)
+        chunks = [keys[i:i + BATCH_SIZE] for i in range(0, len(keys), BATCH_SIZE)]
+        list(pool.map(lambda batch: _in_worker(refresh_daily_analytics, batch), chunks))
+
+    return len(conversations), len(keys)
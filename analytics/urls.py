@@ -0,0 +1,10 @@
+# analytics/urls.py
+from django.urls import path
+from . import views
+
+app_name = 'analytics'
+
+urlpatterns = [
+    path('analytics/overview/', views.analytics_overview, name='analytics-overview'),
+    path('analytics/conversations/', views.conversation_metrics_summary, name='conversation-metrics-summary'),
+]
@@ -1,3 +1,104 @@
-from django.shortcuts import render
+# analytics/views.py
+from datetime import date, timedelta
 
-# Create your views here.
+from django.db.models import Avg, Count, Sum
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from tenants.permissions import CanViewAnalytics
+from core.replicas import replica_reads
+from .models import ConversationMetrics, DailyAnalytics, RollupState
+from .rollups import STATE_NAME
+
+DAILY_COUNTERS = (
+    'total_conversations', 'new_conversations', 'resolved_conversations', 'total_messages',
+    'new_leads', 'qualified_leads', 'converted_leads', 'ai_handled_conversations', 'ai_tokens_used',
+)
+
+
+def _date_range(request):
+    """start/end query params (YYYY-MM-DD), defaulting to the last 30 days"""
+    end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else date.today()
+    start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+    return start, end
+
+
+def _as_of():
+    state = RollupState.objects.filter(name=STATE_NAME).first()
+    return state.high_water_mark if state else None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CanViewAnalytics])
+@replica_reads
+def analytics_overview(request):
+    """
+    Totals and a per-day series for a date range, read from the precomputed
+    DailyAnalytics rollup. Optional ?platform=<id> narrows to one platform.
+    """
+    try:
+        start, end = _date_range(request)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD dates'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = DailyAnalytics.objects.filter(
+        tenant=request.user.tenant,
+        analytics_date__range=(start, end)
+    )
+    if request.GET.get('platform'):
+        rows = rows.filter(platform_id=request.GET['platform'])
+
+    aggregates = {field: Sum(field) for field in DAILY_COUNTERS}
+    totals = rows.aggregate(
+        **aggregates,
+        avg_first_response_time_seconds=Avg('avg_first_response_time_seconds'),
+        avg_resolution_time_seconds=Avg('avg_resolution_time_seconds'),
+        ai_accuracy_score=Avg('ai_accuracy_score')
+    )
+    series = rows.values('analytics_date').annotate(**aggregates).order_by('analytics_date')
+
+    return Response({
+        'start': start,
+        'end': end,
+        'as_of': _as_of(),
+        'totals': {key: value or 0 for key, value in totals.items()},
+        'daily': list(series)
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CanViewAnalytics])
+@replica_reads
+def conversation_metrics_summary(request):
+    """Averages over the ConversationMetrics of conversations started in the range"""
+    try:
+        start, end = _date_range(request)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD dates'}, status=status.HTTP_400_BAD_REQUEST)
+
+    metrics = ConversationMetrics.objects.filter(
+        tenant=request.user.tenant,
+        conversation__created_at__date__range=(start, end)
+    )
+    if request.GET.get('platform'):
+        metrics = metrics.filter(conversation__platform_id=request.GET['platform'])
+
+    summary = metrics.aggregate(
+        conversations=Count('id'),
+        first_response_time_seconds=Avg('first_response_time_seconds'),
+        average_response_time_seconds=Avg('average_response_time_seconds'),
+        resolution_time_seconds=Avg('resolution_time_seconds'),
+        messages_per_conversation=Avg('total_messages'),
+        handovers=Sum('handover_count'),
+        ai_handling_percentage=Avg('ai_handling_percentage'),
+        customer_satisfaction_score=Avg('customer_satisfaction_score')
+    )
+
+    return Response({
+        'start': start,
+        'end': end,
+        'as_of': _as_of(),
+        'summary': summary
+    })
@@ -0,0 +1,404 @@
+# conversations/assignment.py
+"""
+Load-aware assignment of conversations to human agents.
+
+Each agent's live load (open assigned conversations, plus unread backlog as
+of the last rebuild) and presence are kept in a store shared by the workers:
+Redis when configured, else process memory. Per tenant, agents sit in one
+sorted pool per skill (and '*' for everyone) for each strategy:
+
+* ``least_loaded``: score = load / weight
+* ``round_robin``: score = assignments so far / weight (weighted round robin)
+
+Picking an agent reads the pool from its lowest score and reserves the first
+online, eligible agent in the same atomic step (Lua script / lock), so two
+concurrent handovers never both take the last free slot of an agent.
+"""
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('least_loaded', 'round_robin')
+AGENT_ROLES = ['agent', 'admin']
+OPEN_STATUSES = ['active', 'pending']
+ALL_AGENTS = '*'
+
+
+def _score(agent: dict, strategy: str) -> float:
+    weight = agent['weight'] or 1
+    return (agent['assigned'] if strategy == 'round_robin' else agent['load']) / weight
+
+
+class InMemoryAgentLoadBackend:
+    """Process-local load store, for development and single-process deployments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents = {}   # tenant_id -> {agent_id: {load, assigned, weight, skills, version}}
+        self._seen = {}     # tenant_id -> {agent_id: timestamp}
+        self._pools = {}    # (tenant_id, pool, strategy) -> heap of (score, seq, agent_id, version)
+        self._seq = itertools.count()
+
+    def has_tenant(self, tenant_id) -> bool:
+        return tenant_id in self._agents
+
+    def load_tenant(self, tenant_id, agents: Dict[str, dict]):
+        with self._lock:
+            previous = self._agents.get(tenant_id, {})
+            self._agents[tenant_id] = {
+                agent_id: {
+                    'load': profile['load'],
+                    # Keep the round-robin position across rebuilds
+                    'assigned': previous.get(agent_id, {}).get('assigned', 0),
+                    'weight': profile['weight'],
+                    'skills': set(profile['skills']),
+                    'version': 0,
+                }
+                for agent_id, profile in agents.items()
+            }
+            for key in [key for key in self._pools if key[0] == tenant_id]:
+                del self._pools[key]
+            for agent_id in agents:
+                self._push(tenant_id, agent_id)
+
+    def touch(self, tenant_id, agent_id, timestamp: float):
+        with self._lock:
+            self._seen.setdefault(tenant_id, {})[agent_id] = timestamp
+
+    def adjust(self, tenant_id, agent_id, delta: int):
+        with self._lock:
+            agent = self._agents.get(tenant_id, {}).get(agent_id)
+            if agent:
+                agent['load'] = max(0, agent['load'] + delta)
+                self._push(tenant_id, agent_id)
+
+    def reserve(self, tenant_id, pool, strategy, cutoff, max_load, skills=(), allowed=None) -> Optional[str]:
+        with self._lock:
+            agents = self._agents.get(tenant_id, {})
+            seen = self._seen.get(tenant_id, {})
+            heap = self._pools.get((tenant_id, pool, strategy), [])
+            passed = []
+            chosen = None
+
+            while heap:
+                entry = heapq.heappop(heap)
+                agent = agents.get(entry[2])
+                if not agent or agent['version'] != entry[3]:
+                    continue  # superseded by a later score
+                passed.append(entry)
+                if (seen.get(entry[2], 0) >= cutoff and agent['load'] < max_load
+                        and set(skills) <= agent['skills'] and (allowed is None or entry[2] in allowed)):
+                    chosen = entry[2]
+                    break
+
+            for entry in passed:
+                heapq.heappush(heap, entry)
+
+            if chosen:
+                agents[chosen]['load'] += 1
+                agents[chosen]['assigned'] += 1
+                self._push(tenant_id, chosen)
+            return chosen
+
+    def _push(self, tenant_id, agent_id):
+        agent = self._agents[tenant_id][agent_id]
+        agent['version'] += 1
+        for pool in [ALL_AGENTS, *agent['skills']]:
+            for strategy in STRATEGIES:
+                heap = self._pools.setdefault((tenant_id, pool, strategy), [])
+                heapq.heappush(heap, (_score(agent, strategy), next(self._seq), agent_id, agent['version']))
+                # Drop superseded entries once they pile up
+                if len(heap) > 8 * len(self._agents[tenant_id]) + 64:
+                    live = self._agents[tenant_id]
+                    heap[:] = [e for e in heap if e[2] in live and live[e[2]]['version'] == e[3]]
+                    heapq.heapify(heap)
+
+
+# Recomputes an agent's score in each of its pools
+_LUA_UPDATE_AGENT = """
+local function update_agent(prefix, agent)
+    local profile = redis.call('HGET', prefix .. ':agents', agent)
+    if not profile then return end
+    profile = cjson.decode(profile)
+    local weight = tonumber(profile.weight) or 1
+    local load = tonumber(redis.call('HGET', prefix .. ':load', agent) or '0')
+    local assigned = tonumber(redis.call('HGET', prefix .. ':assigned', agent) or '0')
+    local pools = {'*'}
+    for _, skill in ipairs(profile.skills) do table.insert(pools, skill) end
+    for _, pool in ipairs(pools) do
+        redis.call('ZADD', prefix .. ':pool:' .. pool .. ':least_loaded', load / weight, agent)
+        redis.call('ZADD', prefix .. ':pool:' .. pool .. ':round_robin', assigned / weight, agent)
+        redis.call('SADD', prefix .. ':pools', prefix .. ':pool:' .. pool .. ':least_loaded',
+                   prefix .. ':pool:' .. pool .. ':round_robin')
+    end
+end
+"""
+
+_LUA_ADJUST = _LUA_UPDATE_AGENT + """
+local prefix, agent, delta = ARGV[1], ARGV[2], tonumber(ARGV[3])
+if redis.call('HEXISTS', prefix .. ':agents', agent) == 0 then return end
+if tonumber(redis.call('HINCRBY', prefix .. ':load', agent, delta)) < 0 then
+    redis.call('HSET', prefix .. ':load', agent, 0)
+end
+update_agent(prefix, agent)
+"""
+
+_LUA_RESERVE = _LUA_UPDATE_AGENT + """
+local prefix, pool, strategy = ARGV[1], ARGV[2], ARGV[3]
+local cutoff, max_load = tonumber(ARGV[4]), tonumber(ARGV[5])
+local required = cjson.decode(ARGV[6])
+local allowed = cjson.decode(ARGV[7])
+local allowed_set = nil
+if #allowed > 0 then
+    allowed_set = {}
+    for _, id in ipairs(allowed) do allowed_set[id] = true end
+end
+
+local key = prefix .. ':pool:' .. pool .. ':' .. strategy
+local offset = 0
+while true do
+    local batch = redis.call('ZRANGE', key, offset, offset + 49)
+    if #batch == 0 then return false end
+    for _, agent in ipairs(batch) do
+        local ok = allowed_set == nil or allowed_set[agent]
+        if ok then
+            ok = tonumber(redis.call('ZSCORE', prefix .. ':seen', agent) or '0') >= cutoff
+        end
+        if ok then
+            ok = tonumber(redis.call('HGET', prefix .. ':load', agent) or '0') < max_load
+        end
+        if ok and #required > 0 then
+            local have = {}
+            for _, skill in ipairs(cjson.decode(redis.call('HGET', prefix .. ':agents', agent)).skills) do
+                have[skill] = true
+            end
+            for _, skill in ipairs(required) do
+                if not have[skill] then ok = false end
+            end
+        end
+        if ok then
+            redis.call('HINCRBY', prefix .. ':load', agent, 1)
+            redis.call('HINCRBY', prefix .. ':assigned', agent, 1)
+            update_agent(prefix, agent)
+            return agent
+        end
+    end
+    offset = offset + 50
+end
+"""
+
+
+class RedisAgentLoadBackend:
+    """Load store shared by every process through Redis; picks run as Lua scripts"""
+
+    def __init__(self, url: str, prefix: str = 'assignment'):
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._adjust = self._redis.register_script(_LUA_ADJUST)
+        self._reserve = self._redis.register_script(_LUA_RESERVE)
+
+    def _key(self, tenant_id) -> str:
+        # Hash tag keeps a tenant's keys in one cluster slot for the scripts
+        return f'{self._prefix}:{{{tenant_id}}}'
+
+    def has_tenant(self, tenant_id) -> bool:
+        return bool(self._redis.exists(f'{self._key(tenant_id)}:agents'))
+
+    def load_tenant(self, tenant_id, agents: Dict[str, dict]):
+        prefix = self._key(tenant_id)
+        assigned = {aid: int(n) for aid, n in self._redis.hgetall(f'{prefix}:assigned').items()}
+        stale_pools = self._redis.smembers(f'{prefix}:pools')
+
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(f'{prefix}:agents', f'{prefix}:load', f'{prefix}:pools', *stale_pools)
+        for agent_id, profile in agents.items():
+            pipe.hset(f'{prefix}:agents', agent_id, json.dumps({
+                'weight': profile['weight'], 'skills': list(profile['skills'])
+            }))
+            pipe.hset(f'{prefix}:load', agent_id, profile['load'])
+            state = {'load': profile['load'], 'assigned': assigned.get(agent_id, 0), 'weight': profile['weight']}
+            for pool in [ALL_AGENTS, *profile['skills']]:
+                for strategy in STRATEGIES:
+                    pool_key = f'{prefix}:pool:{pool}:{strategy}'
+                    pipe.zadd(pool_key, {agent_id: _score(state, strategy)})
+                    pipe.sadd(f'{prefix}:pools', pool_key)
+        pipe.execute()
+
+    def touch(self, tenant_id, agent_id, timestamp: float):
+        self._redis.zadd(f'{self._key(tenant_id)}:seen', {agent_id: timestamp})
+
+    def adjust(self, tenant_id, agent_id, delta: int):
+        self._adjust(args=[self._key(tenant_id), agent_id, delta])
+
+    def reserve(self, tenant_id, pool, strategy, cutoff, max_load, skills=(), allowed=None) -> Optional[str]:
+        return self._reserve(args=[
+            self._key(tenant_id), pool, strategy, cutoff, max_load,
+            json.dumps(list(skills)), json.dumps(sorted(allowed or []))
+        ]) or None
+
+
+class AgentAssignmentEngine:
+    """
+    Picks the agent for a handover and keeps agent load current.
+
+    Load is changed by events: a reservation when an agent is picked, and
+    conversation saves that open, close or move an assignment. ``rebuild``
+    resets a tenant from the database (run it periodically with
+    rebuild_agent_load); it also folds in each agent's unread backlog.
+    Routing rules come from the conversation's lead category
+    (``LeadCategory.auto_assignment_rules``)::
+
+        {"skills": ["billing"], "strategy": "round_robin",
+         "agent_ids": ["..."], "max_load": 10}
+
+    Agents' skills and weight live in ``TenantUser.permissions``
+    (``skills``, ``assignment_weight``).
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    url = getattr(settings, 'AGENT_ASSIGNMENT_REDIS_URL', None)
+                    self._backend = RedisAgentLoadBackend(url) if url else InMemoryAgentLoadBackend()
+        return self._backend
+
+    @property
+    def online_window(self) -> int:
+        return getattr(settings, 'AGENT_ONLINE_WINDOW_SECONDS', 300)
+
+    def touch(self, user):
+        """Record agent activity; agents not seen within the online window are skipped"""
+        try:
+            self.backend.touch(str(user.tenant_id), str(user.id), time.time())
+        except Exception as e:
+            logger.error(f"Failed to record presence for agent {user.id}: {e}")
+
+    def rebuild(self, tenant_id) -> int:
+        """Reload a tenant's agents and their load from the database"""
+        from tenants.models import TenantUser
+        from .models import Conversation, UnreadCounter
+
+        agents = {
+            str(agent['id']): {
+                'weight': float((agent['permissions'] or {}).get('assignment_weight', 1)) or 1,
+                'skills': sorted((agent['permissions'] or {}).get('skills', [])),
+                'load': 0,
+            }
+            for agent in TenantUser.objects.filter(
+                tenant_id=tenant_id, role__in=AGENT_ROLES, is_active=True
+            ).values('id', 'permissions')
+        }
+
+        open_conversations = Conversation.objects.filter(
+            tenant_id=tenant_id, status__in=OPEN_STATUSES, assigned_user__isnull=False
+        ).values('assigned_user_id').annotate(total=Count('id'))
+        for row in open_conversations:
+            if str(row['assigned_user_id']) in agents:
+                agents[str(row['assigned_user_id'])]['load'] += row['total']
+
+        backlog_per_conversation = getattr(settings, 'AGENT_BACKLOG_PER_CONVERSATION', 10)
+        backlog = UnreadCounter.objects.filter(
+            tenant_id=tenant_id,
+            unread_count__gt=0,
+            conversation__status__in=OPEN_STATUSES,
+            conversation__assigned_user_id=F('user_id')
+        ).values('user_id').annotate(total=Sum('unread_count'))
+        for row in backlog:
+            if str(row['user_id']) in agents:
+                agents[str(row['user_id'])]['load'] += row['total'] // backlog_per_conversation
+
+        self.backend.load_tenant(str(tenant_id), agents)
+        return len(agents)
+
+    def assign(self, conversation) -> Optional[str]:
+        """
+        Reserve an agent for the conversation and return its id. Online
+        agents are preferred; when none is online the least busy agent is
+        reserved anyway, so a handover always lands in someone's queue.
+        """
+        tenant_id = str(conversation.tenant_id)
+        rules = self._routing_rules(conversation)
+        skills = [str(skill) for skill in rules.get('skills') or []]
+        strategy = rules.get('strategy') or getattr(settings, 'AGENT_ASSIGNMENT_STRATEGY', 'least_loaded')
+        if strategy not in STRATEGIES:
+            strategy = 'least_loaded'
+        allowed = {str(aid) for aid in rules.get('agent_ids') or []} or None
+        max_load = rules.get('max_load') or getattr(settings, 'AGENT_MAX_OPEN_CONVERSATIONS', 20)
+
+        try:
+            if not self.backend.has_tenant(tenant_id):
+                self.rebuild(tenant_id)
+
+            pool = skills[0] if skills else ALL_AGENTS
+            online_since = time.time() - self.online_window
+            for cutoff, limit in ((online_since, max_load), (0, float('inf'))):
+                agent_id = self.backend.reserve(tenant_id, pool, strategy, cutoff, limit, skills, allowed)
+                if agent_id:
+                    return agent_id
+        except Exception as e:
+            logger.error(f"Agent assignment failed for conversation {conversation.id}: {e}")
+        return None
+
+    def release(self, tenant_id, agent_id):
+        """Give back a reservation that did not end up assigned"""
+        self._adjust(tenant_id, agent_id, -1)
+
+    def conversation_saved(self, conversation):
+        """
+        Apply the load change of a saved conversation: an open assignment
+        that appeared, ended or moved to another agent. The agent reserved
+        through ``assign`` was already counted.
+        """
+        old_agent, old_status = getattr(conversation, '_loaded_assignment', (None, None))
+        new_agent, new_status = conversation.assigned_user_id, conversation.status
+        reserved = getattr(conversation, '_reserved_agent', None)
+        conversation._loaded_assignment = (new_agent, new_status)
+        conversation._reserved_agent = None
+
+        was = str(old_agent) if old_agent and old_status in OPEN_STATUSES else None
+        now = str(new_agent) if new_agent and new_status in OPEN_STATUSES else None
+        if was == now:
+            # Already counted before this save, so the reservation is surplus
+            if reserved:
+                self.release(conversation.tenant_id, reserved)
+            return
+
+        tenant_id = conversation.tenant_id
+        if was:
+            self._adjust(tenant_id, was, -1)
+        if now and now != reserved:
+            self._adjust(tenant_id, now, 1)
+        if reserved and reserved != now:
+            self.release(tenant_id, reserved)
+
+    def _adjust(self, tenant_id, agent_id, delta):
+        try:
+            self.backend.adjust(str(tenant_id), str(agent_id), delta)
+        except Exception as e:
+            logger.error(f"Failed to update load of agent {agent_id}: {e}")
+
+    @staticmethod
+    def _routing_rules(conversation) -> dict:
+        lead = conversation.lead
+        category = lead.lead_category if lead else None
+        rules = category.auto_assignment_rules if category and category.is_active else None
+        return rules if isinstance(rules, dict) else {}
+
+
+agent_assignment = AgentAssignmentEngine()
@@ -0,0 +1,174 @@
+# conversations/dispatcher.py
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterable, List, Optional, Tuple
+
+from asgiref.local import Local
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.db import new_worker_loop, worker_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+# A builder returns the (group, event) pairs to deliver. It runs on the
+# dispatcher's worker, so it may query the database without blocking writers.
+EventBuilder = Callable[..., Iterable[Tuple[str, dict]]]
+
+
+class _PendingNotification:
+    __slots__ = ('builder', 'args', 'coalesce_key')
+
+    def __init__(self, builder: EventBuilder, args: tuple, coalesce_key: Optional[Hashable]):
+        self.builder = builder
+        self.args = args
+        self.coalesce_key = coalesce_key
+
+
+def _static_events(group: str, event: dict):
+    return [(group, event)]
+
+
+class NotificationDispatcher:
+    """
+    Collects channel-layer notifications raised while writing and delivers
+    them after the surrounding transaction commits.
+
+    Notifications raised inside a transaction are held until ``on_commit`` (and
+    dropped on rollback). Inside a ``batch()`` scope they are held until the
+    scope exits. Delivery happens on a dedicated event loop thread, so callers
+    never wait on the channel layer. Notifications sharing a coalesce key within
+    one delivery batch are collapsed to the most recent one.
+    """
+
+    def __init__(self):
+        self._local = Local()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+
+    @property
+    def window(self) -> float:
+        return getattr(settings, 'NOTIFICATION_DISPATCH_WINDOW_MS', 25) / 1000
+
+    def send(self, group: str, event: dict, coalesce_key: Optional[Hashable] = None):
+        """Queue a prebuilt event for a single group"""
+        self.publish(_static_events, group, event, coalesce_key=coalesce_key)
+
+    def publish(self, builder: EventBuilder, *args, coalesce_key: Optional[Hashable] = None):
+        """Queue a builder whose events are resolved and sent on the worker"""
+        pending = _PendingNotification(builder, args, coalesce_key)
+
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._stage(pending))
+        else:
+            self._stage(pending)
+
+    @contextmanager
+    def batch(self):
+        """Hold every notification staged in this scope and submit them together"""
+        if getattr(self._local, 'scope', None) is not None:
+            yield
+            return
+
+        self._local.scope = []
+        try:
+            yield
+        finally:
+            pending = self._local.scope
+            self._local.scope = None
+            if pending:
+                self._submit(pending)
+
+    def _stage(self, pending: _PendingNotification):
+        scope = getattr(self._local, 'scope', None)
+        if scope is not None:
+            scope.append(pending)
+        else:
+            self._submit([pending])
+
+    def _submit(self, pending: List[_PendingNotification]):
+        loop = self._ensure_worker()
+        loop.call_soon_threadsafe(self._queue.put_nowait, pending)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(ready,),
+                    name='notification-dispatcher',
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_worker(self, ready: threading.Event):
+        loop = new_worker_loop('notification-dispatcher', 1)
+        self._queue = asyncio.Queue()
+        self._loop = loop
+        ready.set()
+        loop.run_until_complete(self._consume())
+
+    async def _consume(self):
+        channel_layer = get_channel_layer()
+
+        while True:
+            pending = await self._queue.get()
+
+            # Give the rest of the save chain a moment to land in the same batch
+            if self.window:
+                await asyncio.sleep(self.window)
+            while not self._queue.empty():
+                pending.extend(self._queue.get_nowait())
+
+            try:
+                await self._deliver(channel_layer, self._coalesce(pending))
+            except Exception as e:
+                logger.error(f"Notification batch delivery failed: {e}")
+
+    @staticmethod
+    def _coalesce(pending: List[_PendingNotification]) -> List[_PendingNotification]:
+        """Keep the latest notification per coalesce key, at its first position"""
+        ordered = []
+        positions = {}
+
+        for item in pending:
+            if item.coalesce_key is None:
+                ordered.append(item)
+            elif item.coalesce_key in positions:
+                ordered[positions[item.coalesce_key]] = item
+            else:
+                positions[item.coalesce_key] = len(ordered)
+                ordered.append(item)
+
+        return ordered
+
+    async def _deliver(self, channel_layer, pending: List[_PendingNotification]):
+        events = await worker_sync_to_async(self._build_events)(pending)
+
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, event) for group, event in events),
+            return_exceptions=True
+        )
+        for (group, event), result in zip(events, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to deliver {event.get('type')} to {group}: {result}")
+
+    @staticmethod
+    def _build_events(pending: List[_PendingNotification]) -> List[Tuple[str, dict]]:
+        events = []
+        for item in pending:
+            try:
+                events.extend(item.builder(*item.args) or [])
+            except Exception as e:
+                logger.error(f"Failed to build notification with {item.builder.__name__}: {e}")
+        return events
+
+
+notifications = NotificationDispatcher()
@@ -0,0 +1,306 @@
+# conversations/management/commands/benchmark_queries.py
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from conversations.models import Conversation, Message, UnreadCounter
+from conversations.read_state import UNREAD_FILTERS, read_cursor_subquery, unread_q
+from conversations.search import search_contacts, search_conversations, search_messages
+from core.pagination import KeysetPagination
+from customers.models import Customer
+from platforms.models import SocialPlatform, TenantPlatformAccount
+from tenants.models import Tenant, TenantUser
+
+BENCH_EMAIL_DOMAIN = 'benchmark.invalid'
+
+# Indexes added for the hot queries; dropped (inside a rolled back transaction) for the baseline
+BENCHMARKED_INDEXES = [
+    'conversations_tenant_feed_idx',
+    'conversations_status_feed_idx',
+    'conversations_open_feed_idx',
+    'conversations_overdue_idx',
+    'conversations_assignee_idx',
+    'conversations_customer_idx',
+    'messages_conv_created_id_idx',
+    'messages_conv_unread_idx',
+    'messages_tenant_customer_idx',
+    'customers_tenant_feed_idx',
+    'customers_username_trgm_idx',
+    'customers_display_trgm_idx',
+    'conversations_subject_trgm_idx',
+    'messages_content_fts_idx',
+]
+
+
+def _insert_select_sql(model, overrides, count):
+    """
+    INSERT ... SELECT over generate_series(1, count) AS g. ``overrides`` maps
+    attnames to a SQL expression or an (expression, params) pair; other columns
+    get NULL, their Python default, or NOW().
+    """
+    columns, expressions, params = [], [], []
+    for field in model._meta.concrete_fields:
+        columns.append(connection.ops.quote_name(field.column))
+        if field.attname in overrides:
+            expression = overrides[field.attname]
+            if isinstance(expression, tuple):
+                expression, expression_params = expression
+                params.extend(expression_params)
+            expressions.append(expression)
+        elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            expressions.append('NOW()')
+        elif field.null:
+            expressions.append('NULL')
+        elif field.has_default():
+            expressions.append('%s')
+            params.append(field.get_db_prep_save(field.get_default(), connection))
+        else:
+            expressions.append("''")
+    sql = (
+        f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({', '.join(columns)}) "
+        f"SELECT {', '.join(expressions)} FROM generate_series(1, %s) AS g"
+    )
+    return sql, params + [count]
+
+
+class Command(BaseCommand):
+    help = 'Seed a benchmark tenant and report EXPLAIN ANALYZE timings for the hot conversation queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Create a new benchmark tenant first')
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--conversations', type=int, default=200000)
+        parser.add_argument('--messages', type=int, default=2000000)
+        parser.add_argument('--tenant', help='Benchmark an existing tenant instead of the latest benchmark tenant')
+        parser.add_argument('--runs', type=int, default=5, help='Executions per query; the median is reported')
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Also time every query with the benchmarked indexes dropped (rolled back afterwards; '
+                 'takes exclusive locks, do not use on production)'
+        )
+        parser.add_argument('--cleanup', action='store_true', help='Delete all benchmark tenants and exit')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark requires PostgreSQL')
+
+        if options['cleanup']:
+            deleted, _ = Tenant.objects.filter(business_email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+            self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} benchmark rows'))
+            return
+
+        if options['seed']:
+            tenant = self.seed(options['customers'], options['conversations'], options['messages'])
+        elif options['tenant']:
+            tenant = Tenant.objects.filter(id=options['tenant']).first()
+        else:
+            tenant = Tenant.objects.filter(
+                business_email__endswith=f'@{BENCH_EMAIL_DOMAIN}'
+            ).order_by('-created_at').first()
+        if tenant is None:
+            raise CommandError('No benchmark tenant found; run with --seed first')
+
+        queries = self.build_queries(tenant)
+        after = {name: self.explain(qs, options['runs']) for name, qs in queries}
+
+        before = {}
+        if options['compare']:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in BENCHMARKED_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(index)}')
+                before = {name: self.explain(qs, options['runs']) for name, qs in queries}
+                transaction.set_rollback(True)
+
+        self.report(queries, before, after)
+
+    def seed(self, customers, conversations, messages):
+        """Bulk-generate rows with generate_series; millions of rows take minutes, not hours"""
+        started = time.monotonic()
+        token = uuid.uuid4().hex[:8]
+
+        tenant = Tenant.objects.create(
+            business_name=f'Benchmark {token}',
+            business_email=f'{token}@{BENCH_EMAIL_DOMAIN}',
+            business_phone='',
+            subscription_tier='benchmark',
+            encryption_key_hash='',
+            status='active'
+        )
+        platform, _ = SocialPlatform.objects.get_or_create(
+            name='benchmark',
+            defaults={'display_name': 'Benchmark', 'api_version': 'v1'}
+        )
+        account = TenantPlatformAccount.objects.create(
+            tenant=tenant,
+            platform=platform,
+            account_name='Benchmark',
+            platform_account_id=token,
+            access_token_encrypted='',
+            connection_status='connected'
+        )
+        agents = [
+            TenantUser.objects.create(
+                tenant=tenant,
+                email=f'agent{i}-{token}@{BENCH_EMAIL_DOMAIN}',
+                first_name='Agent',
+                last_name=str(i)
+            )
+            for i in range(5)
+        ]
+        agent_ids = '{' + ','.join(str(agent.id) for agent in agents) + '}'
+
+        with connection.cursor() as cursor:
+            cursor.execute(*_insert_select_sql(Customer, {
+                'id': 'gen_random_uuid()',
+                'tenant_id': ('%s', [str(tenant.id)]),
+                'platform_id': ('%s', [str(platform.id)]),
+                'platform_account_id': ('%s', [str(account.id)]),
+                'external_id': "'c' || g",
+                'platform_username': "'user' || g",
+                'last_contact_at': "NOW() - random() * INTERVAL '90 days'",
+            }, customers))
+            self.stdout.write(f'  customers: {customers}')
+
+            cursor.execute(
+                'CREATE TEMP TABLE bench_customers AS '
+                'SELECT row_number() OVER () AS n, id FROM customers WHERE tenant_id = %s',
+                [str(tenant.id)]
+            )
+            cursor.execute('ALTER TABLE bench_customers ADD PRIMARY KEY (n)')
+            cursor.execute(*_insert_select_sql(Conversation, {
+                'id': 'gen_random_uuid()',
+                'tenant_id': ('%s', [str(tenant.id)]),
+                'customer_id': ('(SELECT id FROM bench_customers WHERE n = 1 + g %% %s)', [customers]),
+                'platform_id': ('%s', [str(platform.id)]),
+                'platform_account_id': ('%s', [str(account.id)]),
+                'external_conversation_id': "'conv' || g",
+                'conversation_type': "'direct'",
+                'current_handler_type': "CASE WHEN g %% 3 = 0 THEN 'human' ELSE 'ai' END",
+                'assigned_user_id': ('CASE WHEN g %% 3 = 0 THEN (%s::uuid[])[1 + g %% 5] END', [agent_ids]),
+                'status': "(ARRAY['active','pending','resolved','closed','archived'])[1 + g %% 5]",
+                'priority': "(ARRAY['low','normal','high'])[1 + g %% 3]",
+                'last_message_at': "NOW() - random() * INTERVAL '90 days'",
+                'response_due_at': "NOW() + (random() - 0.5) * INTERVAL '2 days'",
+            }, conversations))
+            self.stdout.write(f'  conversations: {conversations}')
+
+            cursor.execute(
+                'CREATE TEMP TABLE bench_conversations AS '
+                'SELECT row_number() OVER () AS n, id FROM conversations WHERE tenant_id = %s',
+                [str(tenant.id)]
+            )
+            cursor.execute('ALTER TABLE bench_conversations ADD PRIMARY KEY (n)')
+            cursor.execute(*_insert_select_sql(Message, {
+                'id': 'gen_random_uuid()',
+                'tenant_id': ('%s', [str(tenant.id)]),
+                'conversation_id': ('(SELECT id FROM bench_conversations WHERE n = 1 + g %% %s)', [conversations]),
+                'external_message_id': "'m' || g",
+                'message_type': "'text'",
+                'direction': "CASE WHEN g %% 2 = 0 THEN 'inbound' ELSE 'outbound' END",
+                'sender_type': "(ARRAY['customer','ai','agent'])[1 + g %% 3]",
+                'content_encrypted': 'md5(g::text)',
+                'content_hash': 'md5(g::text)',
+                'is_deleted': 'g %% 100 = 0',
+                'created_at': "NOW() - random() * INTERVAL '90 days'",
+            }, messages))
+            cursor.execute('DROP TABLE bench_customers, bench_conversations')
+            self.stdout.write(f'  messages: {messages}')
+
+            for table in ('customers', 'conversations', 'messages'):
+                cursor.execute(f'ANALYZE {table}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Seeded tenant {tenant.id} in {time.monotonic() - started:.1f}s'
+        ))
+        return tenant
+
+    def build_queries(self, tenant):
+        """The statements behind the hot endpoints, built with the same ORM code paths"""
+        agent = TenantUser.objects.filter(tenant=tenant).first()
+        agent_id = agent.id if agent else uuid.uuid4()
+        busiest = Message.objects.filter(tenant=tenant).values('conversation_id').annotate(
+            n=Count('id')
+        ).order_by('-n').values_list('conversation_id', flat=True).first()
+
+        messages = Message.objects.filter(tenant=tenant, conversation_id=busiest, is_deleted=False)
+        conversations = Conversation.objects.filter(tenant=tenant)
+        contacts = Customer.objects.filter(tenant=tenant, is_archived=False)
+
+        def first_page(ordering, queryset, limit=20):
+            pagination = KeysetPagination(ordering, limit)
+            return pagination.order(queryset)[:limit + 1]
+
+        return [
+            ('conversation_messages (keyset page)', first_page(('-created_at', '-id'), messages, 50)),
+            ('conversation_messages (offset 5000)', messages.order_by('-created_at')[5000:5050]),
+            ('dashboard_conversations (keyset page)', first_page(('-last_message_at', '-id'), conversations)),
+            ('conversation_list status=active', conversations.filter(status='active').order_by('-last_message_at')[:50]),
+            ('open inbox (active/pending)', conversations.filter(status__in=['active', 'pending']).order_by('-last_message_at')[:50]),
+            ('overdue conversations', conversations.filter(
+                status__in=['active', 'pending'], response_due_at__lt=timezone.now()
+            ).order_by('response_due_at')[:50]),
+            ('assigned to agent', conversations.filter(assigned_user_id=agent_id, status='active')[:50]),
+            ('unread count (conversation)', Message.objects.filter(
+                conversation_id=busiest, **UNREAD_FILTERS
+            ).alias(read_until=read_cursor_subquery(agent_id)).filter(unread_q()).values('id')),
+            ('tenant inbound volume (7 days)', Message.objects.filter(
+                tenant=tenant, sender_type='customer', is_deleted=False,
+                created_at__gte=timezone.now() - timedelta(days=7)
+            ).values('id')),
+            ('contacts_list (keyset page)', first_page(('-last_contact_at', '-id'), contacts, 50)),
+            ('latest conversation per contact', Conversation.objects.filter(
+                customer_id__in=contacts.values('id')[:50]
+            ).order_by('customer_id', '-last_message_at').distinct('customer_id')),
+            ('unread counters (agent)', UnreadCounter.objects.filter(
+                tenant=tenant, user_id=agent_id, unread_count__gt=0
+            )),
+            ('search contacts "user12"', search_contacts(tenant.id, 'user12')),
+            ('search conversations "user12"', search_conversations(tenant.id, 'user12')),
+            ('search messages "c4ca" (prefix)', search_messages(tenant.id, 'c4ca')),
+        ]
+
+    def explain(self, queryset, runs):
+        """Median execution time and the indexes the plan touched"""
+        sql, params = queryset.query.sql_with_params()
+        timings, plan = [], None
+        with connection.cursor() as cursor:
+            for _ in range(max(runs, 1)):
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params)
+                result = cursor.fetchone()[0]
+                result = json.loads(result) if isinstance(result, str) else result
+                plan = result[0]
+                timings.append(plan['Execution Time'])
+        timings.sort()
+        return {
+            'ms': timings[len(timings) // 2],
+            'planning_ms': plan['Planning Time'],
+            'indexes': sorted(self._plan_indexes(plan['Plan'])),
+        }
+
+    def _plan_indexes(self, node):
+        found = set()
+        if 'Index Name' in node:
+            found.add(node['Index Name'])
+        for child in node.get('Plans', []):
+            found |= self._plan_indexes(child)
+        return found
+
+    def report(self, queries, before, after):
+        self.stdout.write('')
+        for name, _ in queries:
+            result = after[name]
+            line = f'{name:<42} {result["ms"]:>10.2f} ms'
+            if name in before:
+                baseline = before[name]['ms']
+                speedup = baseline / result['ms'] if result['ms'] else float('inf')
+                line += f'   (without indexes {baseline:>10.2f} ms, x{speedup:.1f})'
+            self.stdout.write(line)
+            self.stdout.write(f'    indexes: {", ".join(result["indexes"]) or "none (sequential scan)"}')
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark complete'))
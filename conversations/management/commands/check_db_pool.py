@@ -0,0 +1,66 @@
+# conversations/management/commands/check_db_pool.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core.db import pool_stats, server_connection_count
+
+
+class Command(BaseCommand):
+    help = 'Show connection pool metrics and check that server connections stay flat under load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--concurrency', default='10,50,200',
+                            help='Comma-separated numbers of concurrent workers to test')
+        parser.add_argument('--requests', type=int, default=20, help='Requests per worker')
+        parser.add_argument('--query-ms', type=int, default=5, help='Duration of each simulated query')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        self.stdout.write(f"Pooling: {'on' if settings.DB_POOL else 'off'}, PgBouncer mode: "
+                          f"{'on' if settings.DB_PGBOUNCER else 'off'}")
+
+        for level in [int(n) for n in options['concurrency'].split(',') if n]:
+            peak = self.run_load(alias, level, options['requests'], options['query_ms'])
+            self.stdout.write(f'{level:>5} workers: peak {peak} server connections')
+
+        stats = pool_stats(alias)
+        if stats is None:
+            self.stdout.write('No pool for this alias')
+            return
+        for key in ('pool_size', 'pool_available', 'requests_num', 'requests_queued',
+                    'requests_waiting', 'requests_errors', 'avg_wait_ms', 'connections_num'):
+            self.stdout.write(f'  {key}: {stats.get(key, 0)}')
+        self.stdout.write(self.style.SUCCESS('✓ Pool metrics collected'))
+
+    def run_load(self, alias, workers, requests, query_ms):
+        """Simulate ``workers`` concurrent request handlers; returns the peak connection count"""
+        done = threading.Event()
+        peak = [server_connection_count(alias)]
+        connection.close()
+
+        def sample():
+            while not done.is_set():
+                peak[0] = max(peak[0], server_connection_count(alias))
+                connections[alias].close()
+                time.sleep(0.05)
+
+        def handle_requests(_):
+            for _ in range(requests):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(%s)', [query_ms / 1000])
+                # What Django does at the end of every request and async hop
+                connections[alias].close()
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(handle_requests, range(workers)))
+        done.set()
+        sampler.join()
+        return peak[0]
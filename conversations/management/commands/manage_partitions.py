@@ -0,0 +1,213 @@
+# conversations/management/commands/manage_partitions.py
+import gzip
+import json
+import os
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from conversations.models import Conversation, Message
+from core.partitioning import (
+    PARTITIONED_TABLES, add_months, ensure_partitions, is_partitioned, list_partitions, month_start
+)
+
+ARCHIVABLE_STATUSES = ['resolved', 'closed', 'archived']
+LOG_TABLES = [table for table in PARTITIONED_TABLES if table != 'messages']
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly partitions and archive cold messages and logs to compressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.PARTITION_MONTHS_AHEAD,
+                            help='Months of future partitions to keep ready')
+        parser.add_argument('--archive', action='store_true',
+                            help='Archive messages of closed conversations and expired log partitions')
+        parser.add_argument('--months', type=int, default=settings.MESSAGE_ARCHIVE_AFTER_MONTHS,
+                            help='Archive closed conversations idle for this many months')
+        parser.add_argument('--log-months', type=int, default=settings.LOG_RETENTION_MONTHS,
+                            help='Keep this many months of retrieval/usage logs online')
+        parser.add_argument('--archive-dir', default=settings.ARCHIVE_DIR)
+        parser.add_argument('--batch-size', type=int, default=500, help='Conversations per archive file')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--verify-pruning', action='store_true',
+                            help='Check with EXPLAIN that a one-month query only scans that month')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            missing = [table for table in PARTITIONED_TABLES if not is_partitioned(cursor, table)]
+            if missing:
+                raise CommandError(f"Not partitioned yet (run migrate): {', '.join(missing)}")
+
+            for table in PARTITIONED_TABLES:
+                created = [] if options['dry_run'] else ensure_partitions(cursor, table, options['ahead'])
+                for name in created:
+                    self.stdout.write(self.style.SUCCESS(f'✓ Created partition {name}'))
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table + "_default")}')
+                stray = cursor.fetchone()[0]
+                if stray:
+                    self.stdout.write(self.style.WARNING(
+                        f'! {stray} rows of {table} are in the default partition; increase --ahead'
+                    ))
+
+        if options['archive']:
+            self.archive_messages(options)
+            self.archive_logs(options)
+
+        if options['verify_pruning']:
+            self.verify_pruning()
+
+    def archive_messages(self, options):
+        """Move messages of closed, idle conversations to gzip CSV files, then delete them"""
+        cutoff = add_months(month_start(date.today()), -options['months'])
+        directory = os.path.join(options['archive_dir'], 'messages', timezone.now().strftime('%Y%m%d-%H%M%S'))
+
+        conversation_ids = list(Conversation.objects.filter(
+            status__in=ARCHIVABLE_STATUSES,
+            last_message_at__lt=cutoff
+        ).values_list('id', flat=True))
+        if not conversation_ids:
+            self.stdout.write('No conversations to archive')
+            return
+
+        self.stdout.write(f'Archiving messages of {len(conversation_ids)} conversations idle since before {cutoff}')
+        if options['dry_run']:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        total = 0
+        size = options['batch_size']
+        for start in range(0, len(conversation_ids), size):
+            batch = [str(cid) for cid in conversation_ids[start:start + size]]
+            path = os.path.join(directory, f'batch-{start // size:05d}.csv.gz')
+            # Prune to the archived months as well
+            condition = 'conversation_id = ANY(%s::uuid[]) AND created_at < %s'
+            params = [batch, cutoff]
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                with gzip.open(path, 'wb') as archive:
+                    self._copy_out(
+                        cursor,
+                        f'COPY (SELECT * FROM messages WHERE {condition}) TO STDOUT WITH (FORMAT csv, HEADER)',
+                        archive,
+                        params
+                    )
+                # Foreign keys to messages are not enforced by the database, clean up by hand
+                cursor.execute(
+                    f'DELETE FROM message_read_status WHERE message_id IN (SELECT id FROM messages WHERE {condition})',
+                    params
+                )
+                cursor.execute(
+                    'UPDATE conversation_read_cursors SET last_read_message_id = NULL '
+                    f'WHERE last_read_message_id IN (SELECT id FROM messages WHERE {condition})',
+                    params
+                )
+                # Logs go with their message, as on_delete=CASCADE says; they are
+                # usually past LOG_RETENTION_MONTHS and archived already
+                for table in LOG_TABLES:
+                    cursor.execute(
+                        f'DELETE FROM {connection.ops.quote_name(table)} '
+                        f'WHERE message_id IN (SELECT id FROM messages WHERE {condition})',
+                        params
+                    )
+                # Keep the key so a late redelivery is still recognised as a duplicate
+                cursor.execute(
+                    'UPDATE external_message_keys SET message_id = NULL '
+                    f'WHERE message_id IN (SELECT id FROM messages WHERE {condition})',
+                    params
+                )
+                cursor.execute(
+                    f'''
+                    UPDATE conversation_summaries AS s SET recent_messages = COALESCE((
+                        SELECT jsonb_agg(e.entry ORDER BY e.position)
+                        FROM jsonb_array_elements(s.recent_messages) WITH ORDINALITY AS e(entry, position)
+                        WHERE e.entry->>'id' NOT IN (SELECT id::text FROM messages WHERE {condition})
+                    ), '[]'::jsonb)
+                    WHERE s.conversation_id = ANY(%s::uuid[])
+                    ''',
+                    params + [batch]
+                )
+                cursor.execute(f'DELETE FROM messages WHERE {condition}', params)
+                total += cursor.rowcount
+
+        self._write_manifest(directory, {
+            'table': 'messages',
+            'cutoff': cutoff.isoformat(),
+            'conversations': len(conversation_ids),
+            'rows': total
+        })
+        self.stdout.write(self.style.SUCCESS(f'✓ Archived {total} messages to {directory}'))
+
+        # Old months that are now empty no longer need a partition
+        with connection.cursor() as cursor:
+            for name, _, upper in list_partitions(cursor, 'messages'):
+                if upper > cutoff:
+                    continue
+                cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {connection.ops.quote_name(name)})')
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
+                    self.stdout.write(self.style.SUCCESS(f'✓ Dropped empty partition {name}'))
+
+    def archive_logs(self, options):
+        """Dump whole log partitions past retention to gzip CSV and drop them"""
+        cutoff = add_months(month_start(date.today()), -options['log_months'])
+        directory = os.path.join(options['archive_dir'], 'logs')
+
+        with connection.cursor() as cursor:
+            for table in LOG_TABLES:
+                for name, lower, upper in list_partitions(cursor, table):
+                    if upper > cutoff:
+                        continue
+                    self.stdout.write(f'Archiving {name} ({lower} - {upper})')
+                    if options['dry_run']:
+                        continue
+
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'{name}.csv.gz')
+                    quoted = connection.ops.quote_name(name)
+                    with transaction.atomic():
+                        cursor.execute(f'ALTER TABLE {connection.ops.quote_name(table)} DETACH PARTITION {quoted}')
+                        with gzip.open(path, 'wb') as archive:
+                            self._copy_out(cursor, f'COPY {quoted} TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+                        cursor.execute(f'DROP TABLE {quoted}')
+                    self.stdout.write(self.style.SUCCESS(f'✓ Archived {name} to {path}'))
+
+    def verify_pruning(self):
+        """A created_at-bounded query must only touch the matching month"""
+        month = month_start(date.today())
+        queryset = Message.objects.filter(
+            created_at__gte=month,
+            created_at__lt=add_months(month, 1)
+        ).values('id')
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+
+        scanned = sorted(self._relations(plan[0]['Plan']))
+        expected = f'messages_p{month:%Y%m}'
+        if scanned != [expected]:
+            raise CommandError(f'Partition pruning failed: expected only {expected}, plan scans {scanned}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Partition pruning works ({expected} only)'))
+
+    @staticmethod
+    def _copy_out(cursor, statement, archive, params=None):
+        """Stream a COPY ... TO STDOUT into a file (parameters are bound client-side)"""
+        with cursor.cursor.copy(statement, params) as copy:
+            for data in copy:
+                archive.write(data)
+
+    def _relations(self, node):
+        found = {node['Relation Name']} if 'Relation Name' in node else set()
+        for child in node.get('Plans', []):
+            found |= self._relations(child)
+        return found
+
+    def _write_manifest(self, directory, data):
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump(data, f, indent=2)
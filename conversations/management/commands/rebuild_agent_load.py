@@ -0,0 +1,20 @@
+# conversations/management/commands/rebuild_agent_load.py
+from django.core.management.base import BaseCommand
+
+from conversations.assignment import agent_assignment
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Reload agent load and skills for handover assignment from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only rebuild this tenant id')
+
+    def handle(self, *args, **options):
+        tenant_ids = [options['tenant']] if options.get('tenant') else Tenant.objects.values_list('id', flat=True)
+
+        agents = 0
+        for tenant_id in tenant_ids:
+            agents += agent_assignment.rebuild(tenant_id)
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt load for {agents} agents'))
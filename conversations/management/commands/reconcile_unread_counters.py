@@ -0,0 +1,15 @@
+# conversations/management/commands/reconcile_unread_counters.py
+from django.core.management.base import BaseCommand
+
+from conversations.unread_counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute materialized unread counters from messages and read cursors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help='Only reconcile this tenant id')
+
+    def handle(self, *args, **options):
+        repaired = reconcile(options.get('tenant'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Repaired {repaired} unread counters'))
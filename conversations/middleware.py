@@ -0,0 +1,29 @@
+# conversations/middleware.py
+from .assignment import AGENT_ROLES, agent_assignment
+from .dispatcher import notifications
+
+
+class NotificationBatchMiddleware:
+    """Deliver all real-time notifications raised by a request as one batch"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with notifications.batch():
+            return self.get_response(request)
+
+
+class AgentPresenceMiddleware:
+    """Agents making authenticated requests count as online for assignment"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the authenticated user onto the underlying request
+        user = getattr(request, 'user', None)
+        if getattr(user, 'role', None) in AGENT_ROLES and getattr(user, 'tenant_id', None):
+            agent_assignment.touch(user)
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0001_initial'),
+        ('tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at'], name='messages_conv_created_idx'),
+        ),
+        migrations.CreateModel(
+            name='ConversationReadCursor',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('last_read_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='conversations.conversation')),
+                ('last_read_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='conversations.message')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_cursors', to='tenants.tenant')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'conversation_read_cursors',
+                'indexes': [models.Index(fields=['tenant', 'user'], name='read_cursors_tenant_user_idx')],
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        # One cursor per (conversation, user) at the newest message they had a
+        # receipt for. Earlier messages without a receipt count as read from now on.
+        # DISTINCT ON keeps the rows unique; the unique constraint only exists
+        # once the deferred SQL of this migration has run.
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO conversation_read_cursors
+                    (id, tenant_id, conversation_id, user_id, last_read_at, last_read_message_id, updated_at)
+                SELECT DISTINCT ON (m.conversation_id, rs.user_id)
+                    gen_random_uuid(), rs.tenant_id, m.conversation_id, rs.user_id,
+                    m.created_at, m.id, NOW()
+                FROM message_read_status rs
+                JOIN messages m ON m.id = rs.message_id
+                ORDER BY m.conversation_id, rs.user_id, m.created_at DESC, m.id DESC;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
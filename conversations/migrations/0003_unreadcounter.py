@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0002_conversationreadcursor'),
+        ('tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('unread_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to='conversations.conversation')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to='tenants.tenant')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'unread_counters',
+                'indexes': [models.Index(condition=models.Q(('unread_count__gt', 0)), fields=['tenant', 'user'], name='unread_counters_nonzero_idx')],
+                'unique_together': {('user', 'conversation')},
+            },
+        ),
+        # Seed counters from messages and read cursors
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO unread_counters (id, tenant_id, user_id, conversation_id, unread_count, updated_at)
+                SELECT gen_random_uuid(), c.tenant_id, u.id, c.id, COUNT(m.id), NOW()
+                FROM conversations c
+                JOIN tenant_users u ON u.tenant_id = c.tenant_id AND u.is_active
+                LEFT JOIN conversation_read_cursors rc
+                    ON rc.conversation_id = c.id AND rc.user_id = u.id
+                JOIN messages m
+                    ON m.conversation_id = c.id
+                    AND m.sender_type = 'customer'
+                    AND NOT m.is_deleted
+                    AND (rc.last_read_at IS NULL OR m.created_at > rc.last_read_at)
+                GROUP BY c.tenant_id, u.id, c.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0003_unreadcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='messages_conv_created_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='messages_conv_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['tenant', 'last_message_at', 'id'], name='conversations_tenant_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:30
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Built concurrently so large tables stay writable during the migration
+    atomic = False
+
+    dependencies = [
+        ('conversations', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(fields=['tenant', 'status', 'last_message_at'], name='conversations_status_feed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(condition=models.Q(('status__in', ['active', 'pending'])), fields=['tenant', 'last_message_at'], name='conversations_open_feed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(condition=models.Q(('status__in', ['active', 'pending'])), fields=['tenant', 'response_due_at'], name='conversations_overdue_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(fields=['tenant', 'assigned_user', 'status'], name='conversations_assignee_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(fields=['customer', 'last_message_at'], name='conversations_customer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('sender_type', 'customer')), fields=['conversation', 'created_at'], name='messages_conv_unread_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('sender_type', 'customer')), fields=['tenant', 'created_at'], name='messages_tenant_customer_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('conversations', '0005_hot_query_indexes'),
+        ('customers', '0003_search_trigram_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['subject'], name='conversations_subject_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('content_encrypted', config='simple'), name='messages_content_fts_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.partitioning import convert_to_partitioned
+
+
+def partition_messages(apps, schema_editor):
+    convert_to_partitioned(schema_editor, 'messages')
+
+
+class Migration(migrations.Migration):
+    # Rows are moved in batches, one transaction each
+    atomic = False
+
+    dependencies = [
+        ('conversations', '0006_search_indexes'),
+        # Their foreign keys to messages need the unique id of the unpartitioned table
+        ('ai', '0001_initial'),
+        ('knowledgebase', '0002_convert_to_vector_field'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='messagereadstatus',
+                    name='message',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='read_statuses', to='conversations.message'),
+                ),
+                migrations.AlterField(
+                    model_name='conversationreadcursor',
+                    name='last_read_message',
+                    field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='conversations.message'),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='message',
+                    unique_together={('tenant', 'conversation', 'external_message_id', 'created_at')},
+                ),
+            ],
+            # Rebuilds the table; the incoming foreign keys are dropped
+            database_operations=[
+                migrations.RunPython(partition_messages),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('conversations', '0007_partition_messages'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(fields=['updated_at'], name='conversations_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0008_conversations_updated_idx'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('total_messages', models.IntegerField(default=0)),
+                ('customer_messages', models.IntegerField(default=0)),
+                ('ai_messages', models.IntegerField(default=0)),
+                ('human_messages', models.IntegerField(default=0)),
+                ('recent_messages', models.JSONField(default=list)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('running_summary', models.TextField(blank=True)),
+                ('summarized_messages', models.IntegerField(default=0)),
+                ('summarized_until', models.DateTimeField(blank=True, null=True)),
+                ('summary_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='conversations.conversation')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_summaries', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'conversation_summaries',
+            },
+        ),
+        # Seed summaries of existing conversations from their messages
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO conversation_summaries (
+                    id, tenant_id, conversation_id, total_messages, customer_messages, ai_messages,
+                    human_messages, recent_messages, last_message_at, running_summary,
+                    summarized_messages, updated_at
+                )
+                SELECT gen_random_uuid(), c.tenant_id, c.id, stats.total, stats.customer, stats.ai,
+                    stats.human, COALESCE(recent.items, '[]'::jsonb), stats.last_at, '', 0, NOW()
+                FROM conversations c
+                CROSS JOIN LATERAL (
+                    SELECT COUNT(*) AS total,
+                        COUNT(*) FILTER (WHERE m.sender_type = 'customer') AS customer,
+                        COUNT(*) FILTER (WHERE m.sender_type = 'ai') AS ai,
+                        COUNT(*) FILTER (WHERE m.sender_type IN ('human', 'agent')) AS human,
+                        MAX(m.created_at) AS last_at
+                    FROM messages m
+                    WHERE m.conversation_id = c.id
+                ) stats
+                LEFT JOIN LATERAL (
+                    SELECT jsonb_agg(r.item ORDER BY r.created_at) AS items
+                    FROM (
+                        SELECT m.created_at, jsonb_build_object(
+                            'id', m.id,
+                            'sender_type', m.sender_type,
+                            'message_type', m.message_type,
+                            'content', LEFT(m.content_encrypted, 2000),
+                            'ai_intent', m.ai_intent,
+                            'ai_confidence', m.ai_confidence,
+                            'ai_sentiment', m.ai_sentiment,
+                            'created_at', m.created_at
+                        ) AS item
+                        FROM messages m
+                        WHERE m.conversation_id = c.id
+                        ORDER BY m.created_at DESC
+                        LIMIT 20
+                    ) r
+                ) recent ON TRUE;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
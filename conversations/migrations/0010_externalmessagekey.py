@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0009_conversationsummary'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalMessageKey',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('external_message_id', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_message_keys', to='conversations.conversation')),
+                ('message', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='conversations.message')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_message_keys', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'external_message_keys',
+                'unique_together': {('tenant', 'conversation', 'external_message_id')},
+            },
+        ),
+        # Keys of the inbound messages already stored. DISTINCT ON keeps the rows
+        # unique; the unique constraint only exists once the deferred SQL has run.
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO external_message_keys
+                    (id, tenant_id, conversation_id, external_message_id, message_id, created_at)
+                SELECT DISTINCT ON (m.tenant_id, m.conversation_id, m.external_message_id)
+                    gen_random_uuid(), m.tenant_id, m.conversation_id, m.external_message_id,
+                    m.id, m.created_at
+                FROM messages m
+                WHERE m.direction = 'inbound'
+                ORDER BY m.tenant_id, m.conversation_id, m.external_message_id, m.created_at;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
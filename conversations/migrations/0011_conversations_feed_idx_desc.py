@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('conversations', '0010_externalmessagekey'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='conversation',
+            name='conversations_tenant_feed_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='conversation',
+            index=models.Index(
+                models.F('tenant'), models.F('last_message_at').desc(nulls_last=True), models.F('id').desc(),
+                name='conversations_tenant_feed_idx'
+            ),
+        ),
+    ]
@@ -1,5 +1,7 @@
 # conversations/models.py
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from tenants.models import Tenant, TenantUser
 from customers.models import Customer
@@ -40,10 +42,46 @@ class Conversation(models.Model):
     class Meta:
         db_table = 'conversations'
         unique_together = ['tenant', 'platform', 'external_conversation_id']
+        indexes = [
+            # Keyset pagination of conversation feeds, in the paginator's
+            # ORDER BY last_message_at DESC NULLS LAST, id DESC
+            models.Index(
+                models.F('tenant'), models.F('last_message_at').desc(nulls_last=True), models.F('id').desc(),
+                name='conversations_tenant_feed_idx'
+            ),
+            # Status-filtered lists ordered by latest activity
+            models.Index(fields=['tenant', 'status', 'last_message_at'], name='conversations_status_feed_idx'),
+            # Open inbox: only active/pending conversations are indexed
+            models.Index(
+                fields=['tenant', 'last_message_at'],
+                condition=models.Q(status__in=['active', 'pending']),
+                name='conversations_open_feed_idx'
+            ),
+            models.Index(
+                fields=['tenant', 'response_due_at'],
+                condition=models.Q(status__in=['active', 'pending']),
+                name='conversations_overdue_idx'
+            ),
+            models.Index(fields=['tenant', 'assigned_user', 'status'], name='conversations_assignee_idx'),
+            # Latest conversation per contact
+            models.Index(fields=['customer', 'last_message_at'], name='conversations_customer_idx'),
+            GinIndex(fields=['subject'], opclasses=['gin_trgm_ops'], name='conversations_subject_trgm_idx'),
+            # Change detection for the incremental analytics rollup
+            models.Index(fields=['updated_at'], name='conversations_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer} - {self.platform.name} - {self.conversation_type}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets agent load tracking see what a save changed
+        instance._loaded_assignment = (
+            instance.__dict__.get('assigned_user_id'), instance.__dict__.get('status')
+        )
+        return instance
+
 
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -73,7 +111,28 @@ class Message(models.Model):
 
     class Meta:
         db_table = 'messages'
-        unique_together = ['tenant', 'conversation', 'external_message_id']
+        # Partitioned by month on created_at (see core.partitioning), so unique
+        # constraints must include the partition key; inbound messages are
+        # deduplicated through ExternalMessageKey instead
+        unique_together = ['tenant', 'conversation', 'external_message_id', 'created_at']
+        indexes = [
+            # Unread counts are range counts past a read cursor; the trailing id
+            # serves keyset pagination on (created_at, id)
+            models.Index(fields=['conversation', 'created_at', 'id'], name='messages_conv_created_id_idx'),
+            # Unread ranges and per-tenant inbound volume only ever read live customer messages
+            models.Index(
+                fields=['conversation', 'created_at'],
+                condition=models.Q(sender_type='customer', is_deleted=False),
+                name='messages_conv_unread_idx'
+            ),
+            models.Index(
+                fields=['tenant', 'created_at'],
+                condition=models.Q(sender_type='customer', is_deleted=False),
+                name='messages_tenant_customer_idx'
+            ),
+            # Full-text search; must match conversations.search.MESSAGE_SEARCH_VECTOR
+            GinIndex(SearchVector('content_encrypted', config='simple'), name='messages_content_fts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender_name} - {self.message_type} - {self.created_at}"
@@ -84,7 +143,8 @@ class Message(models.Model):
 class MessageReadStatus(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='message_read_statuses')
-    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='read_statuses')
+    # messages is partitioned; Postgres cannot reference its id alone
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='read_statuses', db_constraint=False)
     user = models.ForeignKey(TenantUser, on_delete=models.CASCADE, related_name='message_read_statuses')
     read_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -98,4 +158,102 @@ class MessageReadStatus(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.user.email} read message {self.message.id} at {self.read_at}"
\ No newline at end of file
+        return f"{self.user.email} read message {self.message.id} at {self.read_at}"
+
+
+class ConversationReadCursor(models.Model):
+    """Read watermark of one user in one conversation; everything up to last_read_at is read"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='conversation_read_cursors')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
+    user = models.ForeignKey(TenantUser, on_delete=models.CASCADE, related_name='conversation_read_cursors')
+    last_read_at = models.DateTimeField()
+    last_read_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_constraint=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'conversation_read_cursors'
+        unique_together = ['conversation', 'user']
+        indexes = [
+            models.Index(fields=['tenant', 'user'], name='read_cursors_tenant_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} read {self.conversation_id} up to {self.last_read_at}"
+
+
+class UnreadCounter(models.Model):
+    """Materialized count of unread customer messages per user and conversation"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='unread_counters')
+    user = models.ForeignKey(TenantUser, on_delete=models.CASCADE, related_name='unread_counters')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='unread_counters')
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'unread_counters'
+        unique_together = ['user', 'conversation']
+        indexes = [
+            models.Index(
+                fields=['tenant', 'user'],
+                condition=models.Q(unread_count__gt=0),
+                name='unread_counters_nonzero_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email}: {self.unread_count} unread in {self.conversation_id}"
+
+
+class ConversationSummary(models.Model):
+    """
+    Rolling summary of one conversation, maintained on message insert
+    (see conversations.summaries): counts by sender, the most recent
+    messages and, optionally, an LLM-written summary of the history.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='conversation_summaries')
+    conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, related_name='summary')
+    total_messages = models.IntegerField(default=0)
+    customer_messages = models.IntegerField(default=0)
+    ai_messages = models.IntegerField(default=0)
+    human_messages = models.IntegerField(default=0)
+    # Oldest first, at most CONVERSATION_SUMMARY_RECENT_MESSAGES entries
+    recent_messages = models.JSONField(default=list)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    running_summary = models.TextField(blank=True)
+    # Messages folded into running_summary, and the newest of them
+    summarized_messages = models.IntegerField(default=0)
+    summarized_until = models.DateTimeField(null=True, blank=True)
+    summary_updated_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'conversation_summaries'
+
+    def __str__(self):
+        return f"Summary of {self.conversation_id}: {self.total_messages} messages"
+
+
+class ExternalMessageKey(models.Model):
+    """
+    Platform message ids already stored, for deduplicating webhook
+    redeliveries. Kept outside the partitioned messages table, which cannot
+    enforce uniqueness without created_at.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='external_message_keys')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='external_message_keys')
+    external_message_id = models.CharField(max_length=255)
+    message = models.ForeignKey(
+        Message, on_delete=models.CASCADE, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'external_message_keys'
+        unique_together = ['tenant', 'conversation', 'external_message_id']
+
+    def __str__(self):
+        return f"{self.external_message_id} -> {self.message_id}"
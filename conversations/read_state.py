@@ -0,0 +1,150 @@
+# conversations/read_state.py
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import ConversationReadCursor, Message, UnreadCounter
+
+# Only customer messages count towards an agent's unread counter
+UNREAD_FILTERS = {'sender_type': 'customer', 'is_deleted': False}
+
+
+def read_cursor_subquery(user_id, conversation_ref='conversation_id'):
+    """last_read_at of the user's cursor for the conversation referenced by conversation_ref"""
+    return Subquery(
+        ConversationReadCursor.objects.filter(
+            conversation_id=OuterRef(conversation_ref),
+            user_id=user_id
+        ).values('last_read_at')[:1]
+    )
+
+
+def unread_q(prefix=''):
+    """Condition for messages past the aliased ``read_until`` cursor (or with no cursor)"""
+    created_at = f'{prefix}created_at'
+    return Q(read_until__isnull=True) | Q(**{f'{created_at}__gt': F('read_until')})
+
+
+def unread_messages(user_id, queryset=None):
+    """Messages the user has not read yet"""
+    queryset = Message.objects.all() if queryset is None else queryset
+    return queryset.alias(read_until=read_cursor_subquery(user_id)).filter(unread_q())
+
+
+def read_messages(user_id, queryset=None):
+    """Messages at or before the user's read cursor"""
+    queryset = Message.objects.all() if queryset is None else queryset
+    return queryset.alias(
+        read_until=read_cursor_subquery(user_id)
+    ).filter(created_at__lte=F('read_until'))
+
+
+def with_unread_counts(conversations, user_id):
+    """
+    Annotate conversations with the user's last_read_at and unread_count,
+    counting the same messages as UnreadCounter (UNREAD_FILTERS)
+    """
+    return conversations.annotate(
+        last_read_at=read_cursor_subquery(user_id, 'id')
+    ).annotate(
+        unread_count=Count(
+            'messages',
+            filter=(
+                Q(**{f'messages__{field}': value for field, value in UNREAD_FILTERS.items()})
+                & (Q(last_read_at__isnull=True) | Q(messages__created_at__gt=F('last_read_at')))
+            )
+        )
+    )
+
+
+def get_read_cursor(conversation_id, user_id):
+    return ConversationReadCursor.objects.filter(
+        conversation_id=conversation_id,
+        user_id=user_id
+    ).first()
+
+
+def unread_count(conversation_id, user_id, **filters):
+    """Single indexed range count over (conversation, created_at)"""
+    messages = Message.objects.filter(conversation_id=conversation_id, **filters)
+    cursor = get_read_cursor(conversation_id, user_id)
+    if cursor:
+        messages = messages.filter(created_at__gt=cursor.last_read_at)
+    return messages.count()
+
+
+def mark_conversation_read(conversation, user, up_to=None):
+    """
+    Move the user's read cursor forward to ``up_to`` (a message) or to the
+    latest message of the conversation. The cursor never moves backwards.
+
+    Returns the new last_read_at, or None when there was nothing to mark.
+    """
+    if up_to is None:
+        up_to = Message.objects.filter(
+            conversation_id=conversation.id
+        ).order_by('-created_at', '-id').first()
+    if up_to is None:
+        return None
+
+    cursor, created = ConversationReadCursor.objects.get_or_create(
+        conversation_id=conversation.id,
+        user_id=user.id,
+        defaults={
+            'tenant_id': conversation.tenant_id,
+            'last_read_at': up_to.created_at,
+            'last_read_message': up_to
+        }
+    )
+    if not created:
+        # Conditional update keeps concurrent readers from moving it back
+        ConversationReadCursor.objects.filter(
+            id=cursor.id,
+            last_read_at__lt=up_to.created_at
+        ).update(
+            last_read_at=up_to.created_at,
+            last_read_message=up_to,
+            updated_at=timezone.now()
+        )
+
+    refresh_unread_counter(conversation, user)
+    return up_to.created_at
+
+
+def refresh_unread_counter(conversation, user):
+    """
+    Recompute the user's materialized unread counter after the cursor moved.
+
+    The counter row is locked before counting, so a concurrent
+    increment_for_message is either already in the count or waits and adds
+    its message on top of it.
+    """
+    with transaction.atomic():
+        counter, _ = UnreadCounter.objects.select_for_update().get_or_create(
+            user_id=user.id,
+            conversation_id=conversation.id,
+            defaults={'tenant_id': conversation.tenant_id, 'unread_count': 0}
+        )
+        count = unread_count(conversation.id, user.id, **UNREAD_FILTERS)
+        UnreadCounter.objects.filter(id=counter.id).update(unread_count=count, updated_at=timezone.now())
+    return count
+
+
+def mark_messages_read(message_ids, user):
+    """
+    Advance the user's cursors past the given messages.
+
+    Returns how many of them were unread before.
+    """
+    messages = Message.objects.filter(id__in=message_ids).select_related('conversation')
+    newly_read = unread_messages(user.id, messages).count()
+
+    newest = {}
+    for message in messages:
+        current = newest.get(message.conversation_id)
+        if current is None or message.created_at > current.created_at:
+            newest[message.conversation_id] = message
+
+    for message in newest.values():
+        mark_conversation_read(message.conversation, user, up_to=message)
+    return newly_read
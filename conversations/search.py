@@ -0,0 +1,174 @@
+# conversations/search.py
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+)
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from customers.models import Customer
+from .models import Conversation, Message
+
+# Language-neutral dictionary: customers write in many languages, so no stemming
+SEARCH_CONFIG = 'simple'
+
+# Shorter queries cannot use trigram indexes; below this we only match prefixes
+TRIGRAM_MIN_LENGTH = 3
+
+# Must stay identical to the expression indexed by messages_content_fts_idx
+MESSAGE_SEARCH_VECTOR = SearchVector('content_encrypted', config=SEARCH_CONFIG)
+
+CONTACT_SEARCH_FIELDS = ('platform_username', 'platform_display_name', 'email_encrypted')
+
+
+def normalize_query(query):
+    return ' '.join((query or '').split())[:200]
+
+
+def _text_filter(fields, query, prefix=''):
+    """ILIKE (trigram-indexed) or word-similarity match on any of the fields"""
+    condition = Q()
+    for field in fields:
+        if len(query) < TRIGRAM_MIN_LENGTH:
+            condition |= Q(**{f'{prefix}{field}__istartswith': query})
+        else:
+            condition |= Q(**{f'{prefix}{field}__icontains': query})
+            condition |= Q(**{f'{prefix}{field}__trigram_word_similar': query})
+    return condition
+
+
+def _similarity(fields, query):
+    scores = [TrigramWordSimilarity(query, field) for field in fields]
+    return scores[0] if len(scores) == 1 else Greatest(*scores)
+
+
+def prefix_search_query(query):
+    """
+    tsquery matching every word, with the last one as a prefix so results
+    keep up while the user is still typing ("refund pol" -> refund & pol:*).
+    """
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def contact_search_filter(query, prefix=''):
+    """Condition for contacts whose username, display name or email matches"""
+    return _text_filter(CONTACT_SEARCH_FIELDS, normalize_query(query), prefix)
+
+
+def conversation_search_filter(tenant_id, query):
+    """
+    Conversations matching on subject, external id or their customer. The
+    customer match runs as its own indexed subquery instead of an OR across
+    the join.
+    """
+    query = normalize_query(query)
+    matching_customers = Customer.objects.filter(
+        tenant_id=tenant_id
+    ).filter(contact_search_filter(query)).values('id')
+    return (
+        _text_filter(('subject',), query) |
+        Q(external_conversation_id=query) |
+        Q(customer_id__in=matching_customers)
+    )
+
+
+def search_contacts(tenant_id, query, limit=10):
+    query = normalize_query(query)
+    return Customer.objects.filter(
+        tenant_id=tenant_id,
+        is_archived=False
+    ).filter(
+        contact_search_filter(query)
+    ).annotate(
+        rank=_similarity(CONTACT_SEARCH_FIELDS, query)
+    ).order_by('-rank', F('last_contact_at').desc(nulls_last=True))[:limit]
+
+
+def search_conversations(tenant_id, query, limit=10):
+    query = normalize_query(query)
+    return Conversation.objects.filter(
+        tenant_id=tenant_id
+    ).filter(
+        conversation_search_filter(tenant_id, query)
+    ).select_related('customer').annotate(
+        rank=Greatest(
+            _similarity(('subject',), query),
+            _similarity(tuple(f'customer__{field}' for field in CONTACT_SEARCH_FIELDS), query)
+        )
+    ).order_by('-rank', F('last_message_at').desc(nulls_last=True))[:limit]
+
+
+def search_messages(tenant_id, query, conversation_id=None, limit=20):
+    """Full-text search over message content, ranked, with highlighted snippets"""
+    search_query = prefix_search_query(normalize_query(query))
+    if search_query is None:
+        return Message.objects.none()
+
+    messages = Message.objects.filter(tenant_id=tenant_id, is_deleted=False)
+    if conversation_id:
+        messages = messages.filter(conversation_id=conversation_id)
+
+    return messages.annotate(
+        search=MESSAGE_SEARCH_VECTOR
+    ).filter(
+        search=search_query
+    ).annotate(
+        rank=SearchRank(MESSAGE_SEARCH_VECTOR, search_query),
+        snippet=SearchHeadline(
+            'content_encrypted', search_query, config=SEARCH_CONFIG,
+            start_sel='<mark>', stop_sel='</mark>', max_fragments=1
+        )
+    ).order_by('-rank', '-created_at')[:limit]
+
+
+def search_all(tenant_id, query, types=('conversations', 'contacts', 'messages'), limit=10):
+    """
+    Ranked results per type. Identical queries within SEARCH_CACHE_SECONDS
+    are answered from cache, so bursts of keystrokes that the client did not
+    debounce do not each hit the database.
+    """
+    query = normalize_query(query)
+    key = 'search:' + hashlib.md5(f'{tenant_id}:{",".join(types)}:{limit}:{query.lower()}'.encode()).hexdigest()
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    results = {}
+    if 'conversations' in types:
+        results['conversations'] = [{
+            'id': str(conv.id),
+            'subject': conv.subject,
+            'customer_name': conv.customer.display_name,
+            'status': conv.status,
+            'last_message_at': conv.last_message_at.isoformat() if conv.last_message_at else None,
+            'rank': round(conv.rank or 0, 4)
+        } for conv in search_conversations(tenant_id, query, limit)]
+    if 'contacts' in types:
+        results['contacts'] = [{
+            'id': str(contact.id),
+            'name': contact.display_name,
+            'username': contact.platform_username,
+            'avatar': contact.profile_picture_url,
+            'rank': round(contact.rank or 0, 4)
+        } for contact in search_contacts(tenant_id, query, limit)]
+    if 'messages' in types:
+        results['messages'] = [{
+            'id': str(msg.id),
+            'conversation_id': str(msg.conversation_id),
+            'sender_type': msg.sender_type,
+            'sender_name': msg.sender_name,
+            'snippet': msg.snippet,
+            'created_at': msg.created_at.isoformat(),
+            'rank': round(msg.rank or 0, 4)
+        } for msg in search_messages(tenant_id, query, limit=limit)]
+
+    cache.set(key, results, getattr(settings, 'SEARCH_CACHE_SECONDS', 5))
+    return results
@@ -1,11 +1,14 @@
 # serializers.py
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Conversation, Message, MessageReadStatus
+from .models import Conversation, ConversationReadCursor, Message, UnreadCounter
 from tenants.models import TenantUser
 from platforms.models import SocialPlatform, TenantPlatformAccount
 from customers.models import Customer
+from customers.presence import presence
 from leads.models import Lead
-from tenants.models import TenantUser
 
 
 class ConversationCreateSerializer(serializers.ModelSerializer):
@@ -199,42 +202,36 @@ class ConversationListSerializer(serializers.ModelSerializer):
     
     def get_assigned_user_name(self, obj):
         """Get assigned user's full name"""
-        if obj.assigned_user_id:
-            try:
-                user = TenantUser.objects.get(id=obj.assigned_user_id)
-                return f"{user.first_name} {user.last_name}".strip()
-            except TenantUser.DoesNotExist:
-                return None
+        if obj.assigned_user_id and obj.assigned_user:
+            return f"{obj.assigned_user.first_name} {obj.assigned_user.last_name}".strip()
         return None
     
     def get_ai_paused_by_name(self, obj):
         """Get name of user who paused AI"""
-        if obj.ai_paused_by_user_id:
-            try:
-                user = TenantUser.objects.get(id=obj.ai_paused_by_user_id)
-                return f"{user.first_name} {user.last_name}".strip()
-            except TenantUser.DoesNotExist:
-                return None
+        if obj.ai_paused_by_user_id and obj.ai_paused_by_user:
+            return f"{obj.ai_paused_by_user.first_name} {obj.ai_paused_by_user.last_name}".strip()
         return None
     
     def get_message_count(self, obj):
-        """Get total message count"""
-        return getattr(obj, 'message_count', obj.messages.count())
+        """Get total message count (annotated by annotate_conversation_list)"""
+        if hasattr(obj, 'message_count'):
+            return obj.message_count
+        return obj.messages.count()
     
     def get_unread_count(self, obj):
-        """Get unread message count for current user"""
-        # This would require implementing read status tracking
-        # For now, return 0 as placeholder
-        return 0
+        """Get unread message count for current user from the materialized counter"""
+        return getattr(obj, 'unread_count', 0) or 0
     
     def get_last_message_preview(self, obj):
         """Get preview of last message"""
-        last_message = obj.messages.order_by('-created_at').first()
-        if last_message:
-            # Assuming content is encrypted and needs decryption
-            content = getattr(last_message, 'content_decrypted', '') or ''
-            return content[:100] + '...' if len(content) > 100 else content
-        return None
+        if hasattr(obj, 'last_message_content'):
+            content = obj.last_message_content
+        else:
+            last_message = obj.messages.order_by('-created_at').first()
+            content = last_message.content_encrypted if last_message else None
+        if content is None:
+            return None
+        return content[:100] + '...' if len(content) > 100 else content
     
     def get_response_overdue(self, obj):
         """Check if response is overdue"""
@@ -284,7 +281,7 @@ class ConversationDetailSerializer(serializers.ModelSerializer):
         if obj.customer:
             return {
                 'id': obj.customer.id,
-                'name': self._get_customer_name(obj.customer),
+                'name': _customer_name(obj.customer),
                 'email': obj.customer.email_encrypted,
                 'phone': obj.customer.phone_encrypted,
                 'platform_username': obj.customer.platform_username,
@@ -292,8 +289,10 @@ class ConversationDetailSerializer(serializers.ModelSerializer):
                 'profile_picture_url': obj.customer.profile_picture_url,
                 'engagement_score': obj.customer.engagement_score,
                 'status': obj.customer.status,
-                'is_typing': obj.customer.is_typing,
-                'last_seen_at': obj.customer.last_seen_at,
+                'is_typing': str(obj.id) == presence.typing_conversations(
+                    obj.tenant_id, [obj.customer_id]
+                ).get(str(obj.customer_id)),
+                'last_seen_at': presence.last_seen([obj.customer]).get(str(obj.customer_id)),
                 'tags': obj.customer.tags,
                 'custom_fields': obj.customer.custom_fields
             }
@@ -421,13 +420,6 @@ class ConversationDetailSerializer(serializers.ModelSerializer):
             'confidence_threshold': None,  # Would come from tenant settings
             'auto_response_enabled': None  # Would come from tenant settings
         }
-    
-    def _get_customer_name(self, customer):
-        """Helper method to get customer name"""
-        first_name = getattr(customer, 'first_name_decrypted', '') or ''
-        last_name = getattr(customer, 'last_name_decrypted', '') or ''
-        full_name = f"{first_name} {last_name}".strip()
-        return full_name or customer.platform_display_name or customer.platform_username
 
 
 class ConversationTakeoverSerializer(serializers.Serializer):
@@ -475,128 +467,6 @@ class ConversationAIControlSerializer(serializers.Serializer):
 
 
 
-class MessageListSerializer(serializers.ModelSerializer):
-    """Serializer for listing messages in conversation with read status"""
-    sender_details = serializers.SerializerMethodField()
-    is_read_by_current_user = serializers.SerializerMethodField()
-    read_by_users = serializers.SerializerMethodField()
-    content_decrypted = serializers.SerializerMethodField()
-    time_since_sent = serializers.SerializerMethodField()
-    delivery_info = serializers.SerializerMethodField()
-    
-    class Meta:
-        model = Message
-        fields = [
-            'id', 'external_message_id', 'message_type', 'direction',
-            'sender_type', 'sender_id', 'sender_name', 'content_decrypted',
-            'content_hash', 'raw_content', 'attachments', 'ai_processed',
-            'ai_intent', 'ai_entities', 'ai_sentiment', 'ai_confidence',
-            'delivery_status', 'is_deleted', 'deleted_at', 'platform_timestamp',
-            'processed_at', 'sender_details', 'is_read_by_current_user',
-            'read_by_users', 'time_since_sent', 'delivery_info', 'created_at'
-        ]
-    
-    def get_sender_details(self, obj):
-        """Get detailed sender information"""
-        if obj.sender_type == 'customer' and obj.sender_id:
-            try:
-                from .models import Customer
-                customer = Customer.objects.get(id=obj.sender_id)
-                return {
-                    'type': 'customer',
-                    'id': customer.id,
-                    'name': self._get_customer_name(customer),
-                    'username': customer.platform_username,
-                    'display_name': customer.platform_display_name,
-                    'profile_picture': customer.profile_picture_url,
-                    'engagement_score': customer.engagement_score
-                }
-            except Customer.DoesNotExist:
-                pass
-        
-        elif obj.sender_type in ['agent', 'human'] and obj.sender_id:
-            try:
-                user = TenantUser.objects.get(id=obj.sender_id)
-                return {
-                    'type': 'agent',
-                    'id': user.id,
-                    'name': f"{user.first_name} {user.last_name}".strip(),
-                    'email': user.email,
-                    'role': user.role
-                }
-            except TenantUser.DoesNotExist:
-                pass
-        
-        elif obj.sender_type == 'ai':
-            return {
-                'type': 'ai',
-                'name': 'AI Assistant',
-                'confidence': obj.ai_confidence
-            }
-        
-        elif obj.sender_type == 'system':
-            return {
-                'type': 'system',
-                'name': 'System'
-            }
-        
-        # Fallback to sender_name from message
-        return {
-            'type': obj.sender_type,
-            'name': obj.sender_name or 'Unknown'
-        }
-    
-    def get_is_read_by_current_user(self, obj):
-        """Check if current user has read this message"""
-        current_user_id = self.context.get('current_user_id')
-        if current_user_id:
-            return MessageReadStatus.objects.filter(
-                message_id=obj.id,
-                user_id=current_user_id
-            ).exists()
-        return False
-    
-    def get_read_by_users(self, obj):
-        """Get list of users who have read this message"""
-        read_statuses = MessageReadStatus.objects.filter(
-            message_id=obj.id
-        ).select_related('user').order_by('read_at')
-        
-        return [{
-            'user_id': status.user_id,
-            'user_name': f"{status.user.first_name} {status.user.last_name}".strip(),
-            'read_at': status.read_at
-        } for status in read_statuses]
-    
-    def get_content_decrypted(self, obj):
-        """Get decrypted message content"""
-        # Assuming your model has a method to decrypt content
-        return getattr(obj, 'content_decrypted', '') or ''
-    
-    def get_time_since_sent(self, obj):
-        """Get time since message was sent in minutes"""
-        if obj.created_at:
-            delta = timezone.now() - obj.created_at
-            return int(delta.total_seconds() / 60)
-        return None
-    
-    def get_delivery_info(self, obj):
-        """Get message delivery information"""
-        return {
-            'status': obj.delivery_status,
-            'platform_timestamp': obj.platform_timestamp,
-            'processed_at': obj.processed_at,
-            'external_id': obj.external_message_id
-        }
-    
-    def _get_customer_name(self, customer):
-        """Helper method to get customer display name"""
-        first_name = getattr(customer, 'first_name_decrypted', '') or ''
-        last_name = getattr(customer, 'last_name_decrypted', '') or ''
-        full_name = f"{first_name} {last_name}".strip()
-        return full_name or customer.platform_display_name or customer.platform_username
-
-
 class MessageDetailSerializer(serializers.ModelSerializer):
     """Serializer for detailed message view"""
     sender_details = serializers.SerializerMethodField()
@@ -622,23 +492,19 @@ class MessageDetailSerializer(serializers.ModelSerializer):
     
     def get_sender_details(self, obj):
         """Get comprehensive sender information"""
-        # Reuse the logic from MessageListSerializer but with more detail
-        sender_info = MessageListSerializer.get_sender_details(self, obj)
+        senders = _load_senders([obj])
+        sender_info = _sender_details(obj, senders)
         
         # Add additional details for specific sender types
-        if obj.sender_type == 'customer' and obj.sender_id:
-            try:
-                from .models import Customer
-                customer = Customer.objects.get(id=obj.sender_id)
-                sender_info.update({
-                    'email': customer.email_encrypted,
-                    'phone': customer.phone_encrypted,
-                    'tags': customer.tags,
-                    'last_seen_at': customer.last_seen_at,
-                    'status': customer.status
-                })
-            except Customer.DoesNotExist:
-                pass
+        customer = senders['customers'].get(str(obj.sender_id))
+        if obj.sender_type == 'customer' and customer:
+            sender_info.update({
+                'email': customer.email_encrypted,
+                'phone': customer.phone_encrypted,
+                'tags': customer.tags,
+                'last_seen_at': customer.last_seen_at,
+                'status': customer.status
+            })
         
         return sender_info
     
@@ -656,26 +522,24 @@ class MessageDetailSerializer(serializers.ModelSerializer):
     
     def get_read_status_details(self, obj):
         """Get comprehensive read status information"""
-        read_statuses = MessageReadStatus.objects.filter(
-            message_id=obj.id
-        ).select_related('user').order_by('read_at')
+        cursors = _read_cursors_covering(obj)
         
         current_user_id = self.context.get('current_user_id')
         current_user_read = None
         
         read_by = []
-        for status in read_statuses:
+        for cursor in cursors:
             read_info = {
-                'user_id': status.user_id,
-                'user_name': f"{status.user.first_name} {status.user.last_name}".strip(),
-                'user_email': status.user.email,
-                'user_role': status.user.role,
-                'read_at': status.read_at
+                'user_id': cursor.user_id,
+                'user_name': f"{cursor.user.first_name} {cursor.user.last_name}".strip(),
+                'user_email': cursor.user.email,
+                'user_role': cursor.user.role,
+                'read_at': cursor.updated_at
             }
             read_by.append(read_info)
             
-            if status.user_id == current_user_id:
-                current_user_read = status.read_at
+            if str(cursor.user_id) == str(current_user_id):
+                current_user_read = cursor.updated_at
         
         return {
             'is_read_by_current_user': current_user_read is not None,
@@ -865,4 +729,109 @@ class MessageReadStatusSerializer(serializers.Serializer):
         if value and value > timezone.now():
             raise serializers.ValidationError("Read timestamp cannot be in the future.")
         
-        return value or timezone.now()
\ No newline at end of file
+        return value or timezone.now()
+
+
+def _read_cursors_covering(message):
+    """Read cursors of every user who has read up to (or past) the message"""
+    return ConversationReadCursor.objects.filter(
+        conversation_id=message.conversation_id,
+        last_read_at__gte=message.created_at
+    ).select_related('user').order_by('updated_at')
+
+
+def _load_senders(messages):
+    """Customers and agents referenced by sender_id, keyed by string id"""
+    customer_ids = {m.sender_id for m in messages if m.sender_type == 'customer' and m.sender_id}
+    user_ids = {m.sender_id for m in messages if m.sender_type in ['agent', 'human'] and m.sender_id}
+    customers = Customer.objects.in_bulk(customer_ids) if customer_ids else {}
+    users = TenantUser.objects.in_bulk(user_ids) if user_ids else {}
+    return {
+        'customers': {str(pk): customer for pk, customer in customers.items()},
+        'users': {str(pk): user for pk, user in users.items()}
+    }
+
+
+def _customer_name(customer):
+    """Customer display name: decrypted full name, else the platform names"""
+    first_name = getattr(customer, 'first_name_decrypted', '') or ''
+    last_name = getattr(customer, 'last_name_decrypted', '') or ''
+    full_name = f"{first_name} {last_name}".strip()
+    return full_name or customer.platform_display_name or customer.platform_username
+
+
+def _sender_details(message, senders):
+    """Who sent a message, from the senders loaded by _load_senders"""
+    if message.sender_type == 'customer' and message.sender_id:
+        customer = senders['customers'].get(str(message.sender_id))
+        if customer:
+            return {
+                'type': 'customer',
+                'id': customer.id,
+                'name': _customer_name(customer),
+                'username': customer.platform_username,
+                'display_name': customer.platform_display_name,
+                'profile_picture': customer.profile_picture_url,
+                'engagement_score': customer.engagement_score
+            }
+    
+    elif message.sender_type in ['agent', 'human'] and message.sender_id:
+        user = senders['users'].get(str(message.sender_id))
+        if user:
+            return {
+                'type': 'agent',
+                'id': user.id,
+                'name': f"{user.first_name} {user.last_name}".strip(),
+                'email': user.email,
+                'role': user.role
+            }
+    
+    elif message.sender_type == 'ai':
+        return {
+            'type': 'ai',
+            'name': 'AI Assistant',
+            'confidence': message.ai_confidence
+        }
+    
+    elif message.sender_type == 'system':
+        return {
+            'type': 'system',
+            'name': 'System'
+        }
+    
+    # Fallback to sender_name from message
+    return {
+        'type': message.sender_type,
+        'name': message.sender_name or 'Unknown'
+    }
+
+
+def annotate_conversation_list(conversations, current_user_id=None):
+    """
+    Annotate everything ConversationListSerializer reads per row: message
+    count, last message content and the user's unread counter.
+    """
+    last_message = Message.objects.filter(
+        conversation_id=OuterRef('pk')
+    ).order_by('-created_at', '-id')
+
+    conversations = conversations.select_related(
+        'assigned_user', 'ai_paused_by_user'
+    ).annotate(
+        message_count=Count('messages'),
+        last_message_content=Subquery(last_message.values('content_encrypted')[:1])
+    )
+    if current_user_id:
+        conversations = conversations.annotate(
+            unread_count=Coalesce(
+                Subquery(
+                    UnreadCounter.objects.filter(
+                        conversation_id=OuterRef('pk'),
+                        user_id=current_user_id
+                    ).values('unread_count')[:1]
+                ),
+                Value(0),
+                output_field=IntegerField()
+            )
+        )
+    return conversations
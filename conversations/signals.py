@@ -1,13 +1,15 @@
 # conversations/signals.py
 from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.utils import timezone
 
 from .models import Message, Conversation, MessageReadStatus
+from .assignment import agent_assignment
+from .dispatcher import notifications
+from .summaries import record_message
+from .unread_counters import increment_for_message
 
-channel_layer = get_channel_layer()
 
 @receiver(post_save, sender=Message)
 def handle_new_message(sender, instance, created, **kwargs):
@@ -16,12 +18,80 @@ def handle_new_message(sender, instance, created, **kwargs):
     """
     if not created:
         return
-    
+
     message = instance
+    record_message(message)
+
+    # Payload is resolved by the dispatcher after commit
+    notifications.publish(
+        build_new_message_events,
+        message.id,
+        coalesce_key=('new_message', message.id)
+    )
+
+    # If customer message, update conversation stats
+    if message.sender_type == 'customer':
+        increment_for_message(message)
+        _update_conversation_for_customer_message(message.conversation)
+
+
+@receiver(post_save, sender=Conversation)
+def handle_conversation_update(sender, instance, created, **kwargs):
+    """
+    Handle conversation updates - notify dashboard of status changes
+    """
+    conversation = instance
+
+    if created:
+        notifications.publish(
+            build_conversation_created_events,
+            conversation.id,
+            coalesce_key=('conversation_created', conversation.id)
+        )
+    else:
+        # Repeated saves within one batch collapse into a single update
+        notifications.publish(
+            build_conversation_updated_events,
+            conversation.id,
+            coalesce_key=('conversation_updated', conversation.id)
+        )
+
+
+@receiver(post_save, sender=Conversation)
+def track_agent_load(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep agent load in step with assignments and status changes
+    """
+    if update_fields is not None and not {'assigned_user', 'assigned_user_id', 'status'} & set(update_fields):
+        return
+    # Applied only if the save commits; a rolled back save changes nothing
+    transaction.on_commit(lambda: agent_assignment.conversation_saved(instance))
+
+
+@receiver(post_save, sender=MessageReadStatus)
+def handle_message_read(sender, instance, created, **kwargs):
+    """
+    Handle message read status changes
+    """
+    if not created:
+        return
+
+    notifications.publish(
+        build_message_read_events,
+        instance.id,
+        coalesce_key=('message_read', instance.id)
+    )
+
+
+def build_new_message_events(message_id):
+    """Build dashboard and conversation events for a new message"""
+    message = Message.objects.select_related(
+        'conversation__customer', 'conversation__platform'
+    ).filter(id=message_id).first()
+    if not message:
+        return []
+
     conversation = message.conversation
-    tenant = message.tenant
-    
-    # Prepare message data for broadcast
     message_data = {
         'id': str(message.id),
         'conversation_id': str(conversation.id),
@@ -33,44 +103,81 @@ def handle_new_message(sender, instance, created, **kwargs):
         'customer_name': conversation.customer.display_name,
         'platform': conversation.platform.display_name,
         'conversation_status': conversation.status,
+        'priority': conversation.priority,
         'is_new_conversation': _is_first_message_in_conversation(message)
     }
-    
-    # Broadcast to dashboard (all agents in tenant)
-    async_to_sync(channel_layer.group_send)(
-        f"dashboard_{tenant.id}",
-        {
+
+    return [
+        # Broadcast to dashboard (all agents in tenant)
+        (f"dashboard_{message.tenant_id}", {
             'type': 'new_message_notification',
             'conversation_id': str(conversation.id),
             'message': message_data,
             'timestamp': timezone.now().isoformat()
-        }
-    )
-    
-    # Broadcast to conversation monitors
-    async_to_sync(channel_layer.group_send)(
-        f"conversation_{conversation.id}",
-        {
+        }),
+        # Broadcast to conversation monitors
+        (f"conversation_{conversation.id}", {
             'type': 'new_message',
             'message': message_data
-        }
-    )
-    
-    # If customer message, update conversation stats
-    if message.sender_type == 'customer':
-        _update_conversation_for_customer_message(conversation)
+        }),
+    ]
 
 
-@receiver(post_save, sender=Conversation)
-def handle_conversation_update(sender, instance, created, **kwargs):
-    """
-    Handle conversation updates - notify dashboard of status changes
-    """
-    conversation = instance
-    tenant = conversation.tenant
-    
-    # Prepare conversation update data
-    update_data = {
+def build_conversation_created_events(conversation_id):
+    """Build the dashboard event for a newly created conversation"""
+    conversation = _get_conversation_for_event(conversation_id)
+    if not conversation:
+        return []
+
+    return [(f"dashboard_{conversation.tenant_id}", {
+        'type': 'conversation_created',
+        'conversation': _conversation_update_data(conversation),
+        'customer_name': conversation.customer.display_name,
+        'platform': conversation.platform.display_name,
+        'timestamp': timezone.now().isoformat()
+    })]
+
+
+def build_conversation_updated_events(conversation_id):
+    """Build the dashboard event for an updated conversation"""
+    conversation = _get_conversation_for_event(conversation_id)
+    if not conversation:
+        return []
+
+    return [(f"dashboard_{conversation.tenant_id}", {
+        'type': 'conversation_updated',
+        'conversation_id': str(conversation.id),
+        'updates': _conversation_update_data(conversation),
+        'timestamp': timezone.now().isoformat()
+    })]
+
+
+def build_message_read_events(read_status_id):
+    """Build the dashboard event for a single message read receipt"""
+    read_status = MessageReadStatus.objects.select_related(
+        'message', 'user'
+    ).filter(id=read_status_id).first()
+    if not read_status:
+        return []
+
+    # Broadcast read status update to other agents
+    return [(f"dashboard_{read_status.tenant_id}", {
+        'type': 'messages_read_update',
+        'conversation_id': str(read_status.message.conversation_id),
+        'message_ids': [str(read_status.message_id)],
+        'read_by_user': read_status.user.email,
+        'read_at': read_status.read_at.isoformat()
+    })]
+
+
+def _get_conversation_for_event(conversation_id):
+    return Conversation.objects.select_related(
+        'customer', 'platform', 'assigned_user'
+    ).filter(id=conversation_id).first()
+
+
+def _conversation_update_data(conversation):
+    return {
         'id': str(conversation.id),
         'status': conversation.status,
         'current_handler_type': conversation.current_handler_type,
@@ -79,63 +186,12 @@ def handle_conversation_update(sender, instance, created, **kwargs):
         'assigned_user': conversation.assigned_user.email if conversation.assigned_user else None,
         'updated_at': conversation.updated_at.isoformat()
     }
-    
-    if created:
-        # New conversation created
-        async_to_sync(channel_layer.group_send)(
-            f"dashboard_{tenant.id}",
-            {
-                'type': 'conversation_created',
-                'conversation': update_data,
-                'customer_name': conversation.customer.display_name,
-                'platform': conversation.platform.display_name,
-                'timestamp': timezone.now().isoformat()
-            }
-        )
-    else:
-        # Existing conversation updated
-        async_to_sync(channel_layer.group_send)(
-            f"dashboard_{tenant.id}",
-            {
-                'type': 'conversation_updated',
-                'conversation_id': str(conversation.id),
-                'updates': update_data,
-                'timestamp': timezone.now().isoformat()
-            }
-        )
-
-
-@receiver(post_save, sender=MessageReadStatus)
-def handle_message_read(sender, instance, created, **kwargs):
-    """
-    Handle message read status changes
-    """
-    if not created:
-        return
-    
-    read_status = instance
-    message = read_status.message
-    conversation = message.conversation
-    tenant = read_status.tenant
-    user = read_status.user
-    
-    # Broadcast read status update to other agents
-    async_to_sync(channel_layer.group_send)(
-        f"dashboard_{tenant.id}",
-        {
-            'type': 'messages_read_update',
-            'conversation_id': str(conversation.id),
-            'message_ids': [str(message.id)],
-            'read_by_user': user.email,
-            'read_at': read_status.read_at.isoformat()
-        }
-    )
 
 
 def _is_first_message_in_conversation(message):
     """Check if this is the first message in the conversation"""
     return not Message.objects.filter(
-        conversation=message.conversation,
+        conversation_id=message.conversation_id,
         created_at__lt=message.created_at
     ).exists()
 
@@ -144,9 +200,9 @@ def _update_conversation_for_customer_message(conversation):
     """Update conversation metadata when customer sends message"""
     # Update last message timestamp
     conversation.last_message_at = timezone.now()
-    
+
     # If AI is enabled and no human assigned, ensure AI handling
     if conversation.ai_enabled and not conversation.assigned_user_id:
         conversation.current_handler_type = 'ai'
-    
-    conversation.save(update_fields=['last_message_at', 'current_handler_type'])
\ No newline at end of file
+
+    conversation.save(update_fields=['last_message_at', 'current_handler_type'])
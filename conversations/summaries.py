@@ -0,0 +1,256 @@
+# conversations/summaries.py
+"""
+Rolling per-conversation summaries (ConversationSummary).
+
+Every stored message updates its conversation's summary row in one upsert:
+sender counters and a bounded ring of the most recent messages. Handover
+context and the AI's conversation history read that row instead of the
+message history. When CONVERSATION_SUMMARY_EVERY_MESSAGES is set, an LLM
+folds each batch of that many new messages into a running summary, so long
+conversations are summarized rather than cut off.
+"""
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.db import new_worker_loop, worker_sync_to_async
+
+from .models import ConversationSummary, Message
+
+logger = logging.getLogger(__name__)
+
+HUMAN_SENDERS = ('human', 'agent')
+CONTENT_LIMIT = 2000  # characters of a message kept in the ring
+
+_RECORD_SQL = """
+    INSERT INTO conversation_summaries AS s (
+        id, tenant_id, conversation_id, total_messages, customer_messages, ai_messages,
+        human_messages, recent_messages, last_message_at, running_summary,
+        summarized_messages, updated_at
+    )
+    VALUES (gen_random_uuid(), %(tenant)s, %(conversation)s, 1, %(customer)s, %(ai)s,
+            %(human)s, jsonb_build_array(%(item)s::jsonb), %(created_at)s, '', 0, NOW())
+    ON CONFLICT (conversation_id) DO UPDATE SET
+        total_messages = s.total_messages + 1,
+        customer_messages = s.customer_messages + EXCLUDED.customer_messages,
+        ai_messages = s.ai_messages + EXCLUDED.ai_messages,
+        human_messages = s.human_messages + EXCLUDED.human_messages,
+        -- Ring buffer: drop the oldest entry once full
+        recent_messages = CASE
+            WHEN jsonb_array_length(s.recent_messages) >= %(ring_size)s
+            THEN (s.recent_messages - 0) || EXCLUDED.recent_messages
+            ELSE s.recent_messages || EXCLUDED.recent_messages
+        END,
+        last_message_at = GREATEST(s.last_message_at, EXCLUDED.last_message_at),
+        updated_at = NOW()
+    RETURNING s.total_messages - s.summarized_messages
+"""
+
+
+def _ring_size() -> int:
+    return getattr(settings, 'CONVERSATION_SUMMARY_RECENT_MESSAGES', 20)
+
+
+def _refresh_every() -> int:
+    return getattr(settings, 'CONVERSATION_SUMMARY_EVERY_MESSAGES', 0)
+
+
+def _ring_entry(message: Message) -> Dict:
+    def number(value):
+        return float(value) if value is not None else None
+
+    return {
+        'id': str(message.id),
+        'sender_type': message.sender_type,
+        'message_type': message.message_type,
+        'content': (message.content_encrypted or '')[:CONTENT_LIMIT],
+        'ai_intent': message.ai_intent,
+        'ai_confidence': number(message.ai_confidence),
+        'ai_sentiment': number(message.ai_sentiment),
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+def record_message(message: Message):
+    """Fold a newly stored message into its conversation's summary"""
+    with connection.cursor() as cursor:
+        cursor.execute(_RECORD_SQL, {
+            'tenant': message.tenant_id,
+            'conversation': message.conversation_id,
+            'customer': int(message.sender_type == 'customer'),
+            'ai': int(message.sender_type == 'ai'),
+            'human': int(message.sender_type in HUMAN_SENDERS),
+            'item': json.dumps(_ring_entry(message)),
+            'created_at': message.created_at,
+            'ring_size': _ring_size(),
+        })
+        unsummarized = cursor.fetchone()[0]
+
+    every = _refresh_every()
+    if every and unsummarized >= every:
+        conversation_id = message.conversation_id
+        transaction.on_commit(lambda: summary_refresher.schedule(conversation_id))
+
+
+def get_summary(conversation_id) -> Optional[ConversationSummary]:
+    return ConversationSummary.objects.filter(conversation_id=conversation_id).first()
+
+
+def history_pairs(summary: Optional[ConversationSummary], limit: int = 10) -> List[Dict]:
+    """Customer questions directly answered by the AI, from the recent messages"""
+    if not summary:
+        return []
+
+    messages = [m for m in summary.recent_messages if m.get('message_type') == 'text']
+    history = []
+    i = 0
+    while i < len(messages) - 1:
+        if messages[i]['sender_type'] == 'customer' and messages[i + 1]['sender_type'] == 'ai':
+            history.append({'question': messages[i]['content'], 'answer': messages[i + 1]['content']})
+            i += 2
+        else:
+            i += 1
+    return history[-limit:]
+
+
+class SummaryRefresher:
+    """
+    Folds new messages into ConversationSummary.running_summary with an LLM.
+
+    Conversations are queued after the commit that made a refresh due and
+    summarized on a dedicated event loop thread, one batch of unsummarized
+    messages at a time. A conversation already waiting is not queued twice.
+    The queue lives in process memory; a conversation dropped while it is
+    full, or still queued when the process exits, is queued again by its
+    next message.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._waiting = set()
+        self.dropped = 0
+
+    @property
+    def batch_size(self) -> int:
+        return max(_refresh_every(), 1) * 4
+
+    def schedule(self, conversation_id):
+        """Queue a conversation for a summary refresh; safe to call from any thread"""
+        loop = self._ensure_worker()
+        loop.call_soon_threadsafe(self._enqueue, str(conversation_id))
+
+    def _enqueue(self, conversation_id: str):
+        if conversation_id in self._waiting:
+            return
+        try:
+            self._queue.put_nowait(conversation_id)
+            self._waiting.add(conversation_id)
+        except asyncio.QueueFull:
+            # Picked up again by the next message that makes a refresh due
+            self.dropped += 1
+            logger.warning(f"Summary queue full, skipping conversation {conversation_id} for now")
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(ready,),
+                    name='summary-refresher',
+                    daemon=True
+                )
+                thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run_worker(self, ready: threading.Event):
+        loop = new_worker_loop('summary-refresher', 2)
+        self._queue = asyncio.Queue(maxsize=getattr(settings, 'CONVERSATION_SUMMARY_QUEUE_SIZE', 1000))
+        self._loop = loop
+        ready.set()
+        loop.run_until_complete(self._consume())
+
+    async def _consume(self):
+        while True:
+            conversation_id = await self._queue.get()
+            self._waiting.discard(conversation_id)
+            try:
+                await self.refresh(conversation_id)
+            except Exception as e:
+                logger.error(f"Failed to summarize conversation {conversation_id}: {e}")
+
+    async def refresh(self, conversation_id):
+        """Summarize the next batch of unsummarized messages of a conversation"""
+        summary, messages = await self._load(conversation_id)
+        if not summary or not messages:
+            return
+
+        running_summary = await self._summarize(summary.running_summary, messages)
+        saved = await self._save(summary, running_summary, messages)
+
+        # Catch up on long backlogs one batch at a time
+        if saved and summary.total_messages - summary.summarized_messages - len(messages) >= _refresh_every():
+            self._enqueue(str(conversation_id))
+
+    @worker_sync_to_async
+    def _load(self, conversation_id):
+        summary = get_summary(conversation_id)
+        if not summary:
+            return None, []
+
+        messages = Message.objects.filter(conversation_id=conversation_id)
+        if summary.summarized_until:
+            messages = messages.filter(created_at__gt=summary.summarized_until)
+        messages = messages.order_by('created_at').only(
+            'sender_type', 'content_encrypted', 'created_at'
+        )[:self.batch_size]
+        return summary, list(messages)
+
+    async def _summarize(self, previous: str, messages: List[Message]) -> str:
+        from ai.llm import complete
+        from ai.rate_limits import BULK
+
+        transcript = '\n'.join(
+            f"{m.sender_type}: {(m.content_encrypted or '')[:CONTENT_LIMIT]}" for m in messages
+        )
+        prompt = (
+            f"Summary of the conversation so far:\n{previous or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            "Write the updated summary in at most 200 words. Keep the customer's needs, "
+            "facts they gave, answers already provided and anything still unresolved."
+        )
+        response = await complete(
+            model=getattr(settings, 'CONVERSATION_SUMMARY_MODEL', None) or settings.LLM_MODEL,
+            priority=BULK,
+            messages=[
+                {"role": "system", "content": "You summarize customer support conversations for the agents handling them."},
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.choices[0].message.content.strip()
+
+    @worker_sync_to_async
+    def _save(self, summary: ConversationSummary, running_summary: str, messages: List[Message]) -> bool:
+        # Only applies on top of the state it was computed from
+        return ConversationSummary.objects.filter(
+            id=summary.id,
+            summarized_messages=summary.summarized_messages
+        ).update(
+            running_summary=running_summary,
+            summarized_messages=F('summarized_messages') + len(messages),
+            summarized_until=messages[-1].created_at,
+            summary_updated_at=timezone.now()
+        ) > 0
+
+
+summary_refresher = SummaryRefresher()
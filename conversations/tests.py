@@ -1,3 +1,363 @@
-from django.test import TestCase
+import asyncio
+import sys
+import uuid
+from datetime import date, datetime, time, timezone as dt_timezone
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import channel_layers, get_channel_layer
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from ai.models import TenantAISetting
+from core.partitioning import add_months, is_partitioned, month_start, partition_name
+from customers.models import Customer
+from platforms.models import SocialPlatform, TenantPlatformAccount
+from tenants.models import Tenant, TenantUser
+
+from . import views
+from .models import Conversation, ConversationReadCursor, Message
+from .utils import ConversationContextManager, HandoverManager
+
+
+def create_tenant_setup(agents=1):
+    """A tenant with a connected platform account and its agents"""
+    tenant = Tenant.objects.create(
+        business_name='Acme',
+        business_email=f'{uuid.uuid4().hex}@example.com',
+        business_phone='+10000000000',
+        subscription_tier='pro',
+        encryption_key_hash='test',
+        status='active'
+    )
+    platform, _ = SocialPlatform.objects.get_or_create(
+        name='facebook', defaults={'display_name': 'Facebook', 'api_version': 'v18.0'}
+    )
+    account = TenantPlatformAccount.objects.create(
+        tenant=tenant,
+        platform=platform,
+        account_name='Acme Page',
+        platform_account_id=uuid.uuid4().hex,
+        access_token_encrypted='token',
+        connection_status='active'
+    )
+    users = [
+        TenantUser.objects.create_user(
+            f'agent{index}-{uuid.uuid4().hex[:8]}@example.com', tenant,
+            first_name='Agent', last_name=str(index), role='agent'
+        )
+        for index in range(agents)
+    ]
+    return tenant, account, users
+
+
+def create_conversation(tenant, account, messages=2):
+    """A customer with an active conversation and ``messages`` customer messages"""
+    customer = Customer.objects.create(
+        tenant=tenant,
+        external_id=uuid.uuid4().hex,
+        platform=account.platform,
+        platform_account=account,
+        platform_username='customer'
+    )
+    conversation = Conversation.objects.create(
+        tenant=tenant,
+        customer=customer,
+        platform=account.platform,
+        platform_account=account,
+        external_conversation_id=uuid.uuid4().hex,
+        conversation_type='direct_message',
+        current_handler_type='ai',
+        status='active',
+        priority='normal'
+    )
+    for index in range(messages):
+        Message.objects.create(
+            tenant=tenant,
+            conversation=conversation,
+            external_message_id=uuid.uuid4().hex,
+            message_type='text',
+            direction='inbound',
+            sender_type='customer',
+            sender_id=customer.id,
+            sender_name='customer',
+            content_encrypted=f'Message {index}',
+            content_hash=uuid.uuid4().hex
+        )
+    return conversation
+
+
+class ChannelLayerTests(SimpleTestCase):
+    """
+    Group delivery through the configured channel layer: channels_redis with
+    REDIS_URL, else the in-memory layer.
+    """
+
+    async def _join(self, layer, group, members=3):
+        channels = [await layer.new_channel() for _ in range(members)]
+        for channel in channels:
+            await layer.group_add(group, channel)
+        return channels
+
+    async def test_group_send_reaches_every_member_in_order(self):
+        layer = get_channel_layer()
+        group = f'layer_test_{uuid.uuid4().hex}'
+        channels = await self._join(layer, group)
+        try:
+            for index in range(20):
+                await layer.group_send(group, {'type': 'layer.check', 'index': index})
+
+            for channel in channels:
+                received = []
+                for _ in range(20):
+                    event = await asyncio.wait_for(layer.receive(channel), 5)
+                    received.append(event['index'])
+                self.assertEqual(received, list(range(20)))
+        finally:
+            for channel in channels:
+                await layer.group_discard(group, channel)
+
+    async def test_discarded_channel_receives_nothing(self):
+        layer = get_channel_layer()
+        group = f'layer_test_{uuid.uuid4().hex}'
+        left, *staying = await self._join(layer, group)
+        try:
+            await layer.group_discard(group, left)
+            await layer.group_send(group, {'type': 'layer.check', 'index': 0})
+
+            for channel in staying:
+                event = await asyncio.wait_for(layer.receive(channel), 5)
+                self.assertEqual(event['index'], 0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(left), 0.2)
+        finally:
+            for channel in staying:
+                await layer.group_discard(group, channel)
+
+
+# Another app process: its own Django setup and channel layer
+SEND_FROM_ANOTHER_PROCESS = """
+import asyncio, sys, django
+django.setup()
+from channels.layers import get_channel_layer
+asyncio.run(get_channel_layer().group_send(sys.argv[1], {'type': 'layer.check', 'index': 7}))
+"""
+
+
+@skipUnless(settings.REDIS_URL, 'REDIS_URL is not set')
+class RedisChannelLayerTests(SimpleTestCase):
+    """
+    Delivery between app processes through channels_redis, which the
+    in-memory layer of ChannelLayerTests cannot show.
+    """
+
+    async def _receive_from(self, send):
+        receiver = channel_layers.make_backend('default')
+        group = f'layer_test_{uuid.uuid4().hex}'
+        channel = await receiver.new_channel()
+        await receiver.group_add(group, channel)
+        try:
+            await send(group)
+            return await asyncio.wait_for(receiver.receive(channel), 5)
+        finally:
+            await receiver.group_discard(group, channel)
+
+    async def test_group_send_from_another_layer_instance(self):
+        sender = channel_layers.make_backend('default')
+
+        event = await self._receive_from(
+            lambda group: sender.group_send(group, {'type': 'layer.check', 'index': 3})
+        )
+
+        self.assertEqual(event['index'], 3)
+
+    async def test_group_send_from_another_process(self):
+        async def send(group):
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', SEND_FROM_ANOTHER_PROCESS, group, cwd=settings.BASE_DIR
+            )
+            self.assertEqual(await asyncio.wait_for(process.wait(), 60), 0)
+
+        event = await self._receive_from(send)
+
+        self.assertEqual(event['index'], 7)
+
+
+class ConversationQueryCountTests(TestCase):
+    """
+    The conversation and message endpoints run a fixed number of queries,
+    however many rows they return.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, cls.account, cls.users = create_tenant_setup(agents=4)
+        cls.factory = APIRequestFactory()
+
+    def _get(self, view, user, *args):
+        request = self.factory.get('/')
+        # What TenantJWTAuthentication and the tenant middleware provide
+        request.tenant = self.tenant
+        request.tenant_id = self.tenant.id
+        request.user_id = user.id
+        force_authenticate(request, user=user)
+        response = view(request, *args)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _queries(self, view, user, *args):
+        with CaptureQueriesContext(connection) as queries:
+            self._get(view, user, *args)
+        return len(queries)
+
+    def test_conversation_list(self):
+        create_conversation(self.tenant, self.account)
+        expected = self._queries(views.conversation_list, self.users[0])
+
+        for _ in range(5):
+            create_conversation(self.tenant, self.account, messages=3)
+        with self.assertNumQueries(expected):
+            response = self._get(views.conversation_list, self.users[0])
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_conversation_messages(self):
+        conversation = create_conversation(self.tenant, self.account)
+        # Both requests mark every message on the page read for a new reader
+        expected = self._queries(views.conversation_messages, self.users[0], conversation.id)
+
+        for _ in range(8):
+            Message.objects.create(
+                tenant=self.tenant,
+                conversation=conversation,
+                external_message_id=uuid.uuid4().hex,
+                message_type='text',
+                direction='inbound',
+                sender_type='customer',
+                sender_id=conversation.customer_id,
+                sender_name='customer',
+                content_encrypted='More',
+                content_hash=uuid.uuid4().hex
+            )
+        with self.assertNumQueries(expected):
+            response = self._get(views.conversation_messages, self.users[1], conversation.id)
+        self.assertEqual(len(response.data['results']['messages']), 10)
+
+    def test_message_detail(self):
+        conversation = create_conversation(self.tenant, self.account)
+        message = conversation.messages.order_by('created_at').first()
+        reader = self.users[0]
+        # Creates the reader's own cursor, so both measured requests only move it
+        self._get(views.message_detail, reader, message.id)
+        expected = self._queries(views.message_detail, reader, message.id)
+
+        for user in self.users[1:]:
+            ConversationReadCursor.objects.create(
+                tenant=self.tenant,
+                conversation=conversation,
+                user=user,
+                last_read_at=message.created_at,
+                last_read_message=message
+            )
+        with self.assertNumQueries(expected):
+            response = self._get(views.message_detail, reader, message.id)
+        self.assertEqual(response.data['read_status_details']['total_readers'], 4)
+
+
+class MessagePartitionTests(TestCase):
+    """messages is range-partitioned by month on created_at"""
+
+    @staticmethod
+    def _month_bounds(month):
+        return (
+            datetime.combine(month, time.min, tzinfo=dt_timezone.utc),
+            datetime.combine(add_months(month, 1), time.min, tzinfo=dt_timezone.utc)
+        )
+
+    def test_messages_table_is_partitioned(self):
+        with connection.cursor() as cursor:
+            self.assertTrue(is_partitioned(cursor, 'messages'))
+
+    def test_created_at_range_is_pruned_to_its_month(self):
+        month = month_start(date.today())
+        start, end = self._month_bounds(month)
+
+        plan = Message.objects.filter(created_at__gte=start, created_at__lt=end).explain()
+
+        self.assertIn(partition_name('messages', month), plan)
+        self.assertNotIn(partition_name('messages', add_months(month, 1)), plan)
+        self.assertNotIn('messages_default', plan)
+
+    def test_conversation_history_in_one_month_is_pruned(self):
+        tenant, account, _ = create_tenant_setup()
+        conversation = create_conversation(tenant, account)
+        month = add_months(month_start(date.today()), 1)
+        start, end = self._month_bounds(month)
+
+        plan = conversation.messages.filter(
+            created_at__gte=start, created_at__lt=end
+        ).order_by('-created_at').explain()
+
+        self.assertIn(partition_name('messages', month), plan)
+        self.assertNotIn(partition_name('messages', month_start(date.today())), plan)
+
+
+class HandoverTests(TestCase):
+    """Handover checks run on inbound webhook messages before an AI reply is queued"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, cls.account, (cls.agent,) = create_tenant_setup()
+        cls.conversation = create_conversation(cls.tenant, cls.account)
+        cls.ai_settings = TenantAISetting.objects.create(
+            tenant=cls.tenant,
+            platform=cls.account.platform,
+            escalation_keywords=['refund'],
+            blocked_topics=['lawsuit']
+        )
+
+    async def test_keywords_trigger_a_handover(self):
+        for text, reason in (
+            ('I want a REFUND for my order', 'Escalation keyword detected: refund'),
+            ('We are considering a lawsuit over this', 'Blocked topic detected: lawsuit'),
+            ('Can I speak to someone about my order', 'Customer requested human agent'),
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(
+                    await HandoverManager.should_trigger_handover(self.conversation, text),
+                    (True, reason)
+                )
+
+    async def test_ordinary_question_stays_with_the_ai(self):
+        handover, _ = await HandoverManager.should_trigger_handover(
+            self.conversation, 'What are your opening hours on Sunday?', ai_settings=self.ai_settings
+        )
+        self.assertFalse(handover)
+
+    async def test_tenant_without_ai_settings_never_hands_over(self):
+        tenant, account, _ = await sync_to_async(create_tenant_setup)()
+        conversation = await sync_to_async(create_conversation)(tenant, account)
+
+        handover, _ = await HandoverManager.should_trigger_handover(conversation, 'I want a refund')
+
+        self.assertFalse(handover)
+
+    async def test_handover_assigns_an_agent(self):
+        conversation = await Conversation.objects.aget(id=self.conversation.id)
+
+        self.assertTrue(await HandoverManager.initiate_handover(conversation, 'Customer requested human agent'))
+
+        conversation = await Conversation.objects.aget(id=conversation.id)
+        self.assertEqual(conversation.current_handler_type, 'human')
+        self.assertFalse(conversation.ai_enabled)
+        self.assertEqual(conversation.assigned_user_id, self.agent.id)
+
+    async def test_context_summary_comes_from_the_conversation_summary(self):
+        context = await ConversationContextManager.prepare_context_summary(self.conversation)
+
+        self.assertEqual(context['message_stats']['total_messages'], 2)
+        self.assertEqual(context['message_stats']['customer_messages'], 2)
+        self.assertEqual([m['content'] for m in context['recent_messages']], ['Message 0', 'Message 1'])
+        self.assertEqual(context['customer']['total_conversations'], 1)
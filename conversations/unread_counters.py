@@ -0,0 +1,105 @@
+# conversations/unread_counters.py
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .models import UnreadCounter
+
+_INCREMENT_SQL = """
+    INSERT INTO unread_counters (id, tenant_id, user_id, conversation_id, unread_count, updated_at)
+    SELECT gen_random_uuid(), u.tenant_id, u.id, %s, 1, NOW()
+    FROM tenant_users u
+    WHERE u.tenant_id = %s AND u.is_active
+    ON CONFLICT (user_id, conversation_id)
+    DO UPDATE SET unread_count = unread_counters.unread_count + 1, updated_at = NOW()
+"""
+
+_RECONCILE_SQL = """
+    WITH actual AS (
+        SELECT c.tenant_id, u.id AS user_id, c.id AS conversation_id, COUNT(m.id) AS unread_count
+        FROM conversations c
+        JOIN tenant_users u ON u.tenant_id = c.tenant_id AND u.is_active
+        LEFT JOIN conversation_read_cursors rc
+            ON rc.conversation_id = c.id AND rc.user_id = u.id
+        JOIN messages m
+            ON m.conversation_id = c.id
+            AND m.sender_type = 'customer'
+            AND NOT m.is_deleted
+            AND (rc.last_read_at IS NULL OR m.created_at > rc.last_read_at)
+        WHERE {tenant_filter}
+        GROUP BY c.tenant_id, u.id, c.id
+    ),
+    cleared AS (
+        UPDATE unread_counters uc
+        SET unread_count = 0, updated_at = NOW()
+        WHERE uc.unread_count > 0
+            AND {counter_filter}
+            AND NOT EXISTS (
+                SELECT 1 FROM actual a
+                WHERE a.user_id = uc.user_id AND a.conversation_id = uc.conversation_id
+            )
+        RETURNING 1
+    ),
+    repaired AS (
+        INSERT INTO unread_counters (id, tenant_id, user_id, conversation_id, unread_count, updated_at)
+        SELECT gen_random_uuid(), tenant_id, user_id, conversation_id, unread_count, NOW()
+        FROM actual
+        ON CONFLICT (user_id, conversation_id)
+        DO UPDATE SET unread_count = EXCLUDED.unread_count, updated_at = NOW()
+        WHERE unread_counters.unread_count <> EXCLUDED.unread_count
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM cleared) + (SELECT COUNT(*) FROM repaired)
+"""
+
+
+def increment_for_message(message):
+    """Count a new customer message as unread for every active agent of the tenant"""
+    if message.sender_type != 'customer':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(_INCREMENT_SQL, [message.conversation_id, message.tenant_id])
+
+
+def reconcile(tenant_id=None):
+    """
+    Recompute every counter from messages and read cursors, repairing drift
+    (deleted messages, new agents, missed increments). Returns rows changed.
+    """
+    if tenant_id:
+        sql = _RECONCILE_SQL.format(tenant_filter='c.tenant_id = %s', counter_filter='uc.tenant_id = %s')
+        params = [tenant_id, tenant_id]
+    else:
+        sql = _RECONCILE_SQL.format(tenant_filter='TRUE', counter_filter='TRUE')
+        params = []
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+
+def unread_counters(tenant_id, user_id):
+    """Counters with unread messages for the user"""
+    return UnreadCounter.objects.filter(
+        tenant_id=tenant_id,
+        user_id=user_id,
+        unread_count__gt=0
+    )
+
+
+def unread_totals(tenant_id, user_id, **conversation_filters):
+    """Conversations with unread messages and total unread messages"""
+    counters = unread_counters(tenant_id, user_id)
+    if conversation_filters:
+        counters = counters.filter(**{f'conversation__{k}': v for k, v in conversation_filters.items()})
+
+    totals = counters.aggregate(
+        conversations=Count('id'),
+        messages=Sum('unread_count'),
+        contacts=Count('conversation__customer_id', distinct=True)
+    )
+    return {
+        'conversations_with_unread': totals['conversations'] or 0,
+        'total_unread_messages': totals['messages'] or 0,
+        'contacts_with_unread': totals['contacts'] or 0
+    }
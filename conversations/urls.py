@@ -17,4 +17,5 @@ urlpatterns = [
     path('<uuid:conversation_id>/typing/', views.update_typing_status, name='update_typing_status'),
     path('<uuid:conversation_id>/assign/', views.assign_conversation, name='assign_conversation'),
     path('unread-counts/', views.unread_counts, name='unread_counts'),
+    path('search/', views.search, name='search'),
 ]
\ No newline at end of file
@@ -2,22 +2,34 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Count, Q, Prefetch
+from django.db.models import Count, Max, OuterRef, Subquery, Case, When, IntegerField
+from django.db.models.functions import JSONObject
 from .models import Conversation, Message, MessageReadStatus
+from .dispatcher import notifications
+from .notification_utils import DashboardNotifier
+from .read_state import get_read_cursor, mark_conversation_read, with_unread_counts
+from .read_state import mark_messages_read as mark_read_state
+from .search import conversation_search_filter, normalize_query, search_all
+from .unread_counters import unread_counters, unread_totals
 from tenants.models import Tenant
 from .serializers import (
     ConversationListSerializer, ConversationDetailSerializer,
     ConversationTakeoverSerializer, ConversationAIControlSerializer,     
-    MessageListSerializer, MessageDetailSerializer,
-    MessageCreateSerializer, MessageReadStatusSerializer
+    MessageDetailSerializer, MessageReadStatusSerializer,
+    annotate_conversation_list
 )
-import hashlib
 from rest_framework.decorators import api_view, permission_classes
 from .serializers import ConversationCreateSerializer, ConversationResponseSerializer
+from core.pagination import InvalidCursor, KeysetPagination, cached_count, wants_offset_pagination, wants_total
+from core.replicas import replica_reads
 from core.utils import get_tenant_from_user
+from core.transactions import run_serializable
+from customers.presence import presence
 from rest_framework.permissions import IsAuthenticated
 
 @api_view(['POST'])
@@ -207,6 +219,7 @@ def conversation_list(request):
     GET /api/conversations - List conversations
     """
     tenant_id = getattr(request, 'tenant_id', None)
+    current_user_id = getattr(request, 'user_id', None)
     
     # Build base queryset with optimizations
     conversations = Conversation.objects.filter(
@@ -214,10 +227,6 @@ def conversation_list(request):
     ).select_related(
         'customer', 'platform', 'platform_account', 'lead',
         'lead__lead_stage', 'lead__lead_category'
-    ).prefetch_related(
-        Prefetch('messages', queryset=Message.objects.order_by('-created_at')[:1])
-    ).annotate(
-        message_count=Count('messages')
     )
     
     # Apply filters based on query parameters
@@ -249,12 +258,7 @@ def conversation_list(request):
     # Handle search query
     search = request.GET.get('search')
     if search:
-        conversations = conversations.filter(
-            Q(subject__icontains=search) |
-            Q(customer__platform_username__icontains=search) |
-            Q(customer__platform_display_name__icontains=search) |
-            Q(external_conversation_id__icontains=search)
-        )
+        conversations = conversations.filter(conversation_search_filter(tenant_id, search))
     
     # Handle overdue filter
     overdue = request.GET.get('overdue')
@@ -279,7 +283,10 @@ def conversation_list(request):
     else:
         conversations = conversations.order_by('-last_message_at')
     
-    serializer = ConversationListSerializer(conversations, many=True)
+    serializer = ConversationListSerializer(
+        annotate_conversation_list(conversations, current_user_id),
+        many=True
+    )
     
     # Add metadata about the result set
     response_data = {
@@ -333,83 +340,89 @@ def conversation_takeover(request, conversation_id):
     tenant_id = getattr(request, 'tenant_id', None)
     current_user_id = getattr(request, 'user_id', None)  # Assuming middleware sets this
     
-    conversation = get_object_or_404(
-        Conversation,
-        id=conversation_id,
-        tenant_id=tenant_id
-    )
-    
-    # Validate current state
-    if conversation.current_handler_type == 'human':
-        return Response(
-            {
-                'error': 'Conversation is already being handled by a human agent.',
-                'current_handler': conversation.current_handler_type,
-                'assigned_user_id': conversation.assigned_user_id
-            },
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    if conversation.status in ['resolved', 'closed']:
-        return Response(
-            {
-                'error': f'Cannot take over a {conversation.status} conversation.',
-                'status': conversation.status
-            },
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
     serializer = ConversationTakeoverSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    if serializer.is_valid():
-        reason = serializer.validated_data.get('reason', 'Manual takeover by agent')
-        pause_ai = serializer.validated_data.get('pause_ai', True)
-        assign_to_me = serializer.validated_data.get('assign_to_me', True)
+    reason = serializer.validated_data.get('reason', 'Manual takeover by agent')
+    pause_ai = serializer.validated_data.get('pause_ai', True)
+    assign_to_me = serializer.validated_data.get('assign_to_me', True)
+    
+    def take_over():
+        # Check and update in one serializable transaction, so two agents
+        # taking over at once cannot both succeed
+        conversation = get_object_or_404(
+            Conversation,
+            id=conversation_id,
+            tenant_id=tenant_id
+        )
         
-        with transaction.atomic():
-            # Update conversation
-            conversation.current_handler_type = 'human'
-            conversation.handover_reason = reason
-            conversation.last_human_response_at = timezone.now()
-            
-            if pause_ai:
-                conversation.ai_enabled = False
-                conversation.ai_paused_at = timezone.now()
-                conversation.ai_paused_by_user_id = current_user_id
-                conversation.ai_pause_reason = reason
-                conversation.can_ai_resume = True
-            
-            if assign_to_me and current_user_id:
-                conversation.assigned_user_id = current_user_id
-            
-            # Update status if needed
-            if conversation.status == 'ai_handling':
-                conversation.status = 'active'
-            
-            conversation.save(update_fields=[
-                'current_handler_type', 'handover_reason', 'last_human_response_at',
-                'ai_enabled', 'ai_paused_at', 'ai_paused_by_user_id', 'ai_pause_reason',
-                'can_ai_resume', 'assigned_user_id', 'status', 'updated_at'
-            ])
-            
-            # Log the takeover event (you might have an audit log system)
-            # AuditLog.objects.create(
-            #     tenant_id=tenant_id,
-            #     user_id=current_user_id,
-            #     action_type='conversation_takeover',
-            #     resource_type='conversation',
-            #     resource_id=conversation.id,
-            #     new_values={'reason': reason, 'pause_ai': pause_ai}
-            # )
+        # Validate current state
+        if conversation.current_handler_type == 'human':
+            return conversation, Response(
+                {
+                    'error': 'Conversation is already being handled by a human agent.',
+                    'current_handler': conversation.current_handler_type,
+                    'assigned_user_id': conversation.assigned_user_id
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Return updated conversation details
-        detail_serializer = ConversationDetailSerializer(conversation)
-        return Response({
-            'message': 'Conversation successfully taken over from AI.',
-            'conversation': detail_serializer.data
-        })
-    
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if conversation.status in ['resolved', 'closed']:
+            return conversation, Response(
+                {
+                    'error': f'Cannot take over a {conversation.status} conversation.',
+                    'status': conversation.status
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Update conversation
+        conversation.current_handler_type = 'human'
+        conversation.handover_reason = reason
+        conversation.last_human_response_at = timezone.now()
+        
+        if pause_ai:
+            conversation.ai_enabled = False
+            conversation.ai_paused_at = timezone.now()
+            conversation.ai_paused_by_user_id = current_user_id
+            conversation.ai_pause_reason = reason
+            conversation.can_ai_resume = True
+        
+        if assign_to_me and current_user_id:
+            conversation.assigned_user_id = current_user_id
+        
+        # Update status if needed
+        if conversation.status == 'ai_handling':
+            conversation.status = 'active'
+        
+        conversation.save(update_fields=[
+            'current_handler_type', 'handover_reason', 'last_human_response_at',
+            'ai_enabled', 'ai_paused_at', 'ai_paused_by_user_id', 'ai_pause_reason',
+            'can_ai_resume', 'assigned_user_id', 'status', 'updated_at'
+        ])
+        
+        # Log the takeover event (you might have an audit log system)
+        # AuditLog.objects.create(
+        #     tenant_id=tenant_id,
+        #     user_id=current_user_id,
+        #     action_type='conversation_takeover',
+        #     resource_type='conversation',
+        #     resource_id=conversation.id,
+        #     new_values={'reason': reason, 'pause_ai': pause_ai}
+        # )
+        return conversation, None
+    
+    conversation, error = run_serializable(take_over)
+    if error:
+        return error
+    
+    # Return updated conversation details
+    detail_serializer = ConversationDetailSerializer(conversation)
+    return Response({
+        'message': 'Conversation successfully taken over from AI.',
+        'conversation': detail_serializer.data
+    })
 
 
 @api_view(['PUT'])
@@ -514,241 +527,6 @@ def conversation_ai_control(request, conversation_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-
-
-@api_view(['GET', 'POST'])
-def conversation_messages(request, conversation_id):
-    """
-    GET /api/conversations/{conversation_id}/messages - Get messages in conversation with read status
-    POST /api/conversations/{conversation_id}/messages - Send new message
-    """
-    tenant_id = getattr(request, 'tenant_id', None)
-    current_user_id = getattr(request, 'user_id', None)
-    
-    # Verify conversation exists and belongs to tenant
-    conversation = get_object_or_404(
-        Conversation,
-        id=conversation_id,
-        tenant_id=tenant_id
-    )
-    
-    if request.method == 'GET':
-        # Build messages queryset with optimizations
-        messages = Message.objects.filter(
-            conversation_id=conversation_id,
-            tenant_id=tenant_id,
-            is_deleted=False
-        ).select_related(
-            'conversation'
-        ).prefetch_related(
-            Prefetch(
-                'messagereadstatus_set',
-                queryset=MessageReadStatus.objects.select_related('user')
-            )
-        )
-        
-        # Apply filters
-        sender_type = request.GET.get('sender_type')
-        if sender_type:
-            messages = messages.filter(sender_type=sender_type)
-        
-        message_type = request.GET.get('message_type')
-        if message_type:
-            messages = messages.filter(message_type=message_type)
-        
-        # Filter by read status
-        read_status = request.GET.get('read_status')
-        if read_status == 'unread' and current_user_id:
-            # Get messages not read by current user
-            read_message_ids = MessageReadStatus.objects.filter(
-                user_id=current_user_id,
-                message__conversation_id=conversation_id
-            ).values_list('message_id', flat=True)
-            messages = messages.exclude(id__in=read_message_ids)
-        elif read_status == 'read' and current_user_id:
-            # Get messages read by current user
-            read_message_ids = MessageReadStatus.objects.filter(
-                user_id=current_user_id,
-                message__conversation_id=conversation_id
-            ).values_list('message_id', flat=True)
-            messages = messages.filter(id__in=read_message_ids)
-        
-        # Date range filtering
-        from_date = request.GET.get('from_date')
-        to_date = request.GET.get('to_date')
-        if from_date:
-            try:
-                from django.utils.dateparse import parse_datetime
-                from_datetime = parse_datetime(from_date)
-                if from_datetime:
-                    messages = messages.filter(created_at__gte=from_datetime)
-            except ValueError:
-                pass
-        
-        if to_date:
-            try:
-                from django.utils.dateparse import parse_datetime
-                to_datetime = parse_datetime(to_date)
-                if to_datetime:
-                    messages = messages.filter(created_at__lte=to_datetime)
-            except ValueError:
-                pass
-        
-        # Search in message content
-        search = request.GET.get('search')
-        if search:
-            # This would need to be adapted based on your encryption implementation
-            messages = messages.filter(
-                Q(sender_name__icontains=search) |
-                Q(ai_intent__icontains=search)
-                # Add content search if you have full-text search capability
-            )
-        
-        # Pagination parameters
-        limit = min(int(request.GET.get('limit', 50)), 100)  # Max 100 messages
-        offset = int(request.GET.get('offset', 0))
-        
-        # Apply ordering and pagination
-        messages = messages.order_by('-created_at')[offset:offset + limit]
-        
-        # Serialize messages
-        serializer = MessageListSerializer(
-            messages, 
-            many=True,
-            context={'current_user_id': current_user_id}
-        )
-        
-        # Get total count for pagination info
-        total_count = Message.objects.filter(
-            conversation_id=conversation_id,
-            tenant_id=tenant_id,
-            is_deleted=False
-        ).count()
-        
-        # Get unread count for current user
-        unread_count = 0
-        if current_user_id:
-            read_message_ids = MessageReadStatus.objects.filter(
-                user_id=current_user_id,
-                message__conversation_id=conversation_id
-            ).values_list('message_id', flat=True)
-            unread_count = Message.objects.filter(
-                conversation_id=conversation_id,
-                tenant_id=tenant_id,
-                is_deleted=False
-            ).exclude(id__in=read_message_ids).count()
-        
-        response_data = {
-            'results': serializer.data,
-            'pagination': {
-                'total_count': total_count,
-                'limit': limit,
-                'offset': offset,
-                'has_more': (offset + limit) < total_count
-            },
-            'unread_count': unread_count,
-            'conversation': {
-                'id': conversation.id,
-                'subject': conversation.subject,
-                'status': conversation.status
-            }
-        }
-        
-        return Response(response_data)
-    
-    elif request.method == 'POST':
-        # Validate conversation state
-        if conversation.status in ['resolved', 'closed']:
-            return Response(
-                {
-                    'error': f'Cannot send messages to a {conversation.status} conversation.',
-                    'conversation_status': conversation.status
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        serializer = MessageCreateSerializer(data=request.data)
-        
-        if serializer.is_valid():
-            content = serializer.validated_data['content']
-            message_type = serializer.validated_data['message_type']
-            attachments = serializer.validated_data['attachments']
-            
-            with transaction.atomic():
-                # Create content hash for deduplication
-                content_hash = hashlib.sha256(
-                    (content + str(current_user_id) + str(timezone.now().timestamp())).encode()
-                ).hexdigest()
-                
-                # Get current user details
-                current_user = None
-                if current_user_id:
-                    try:
-                        current_user = TenantUser.objects.get(id=current_user_id)
-                    except TenantUser.DoesNotExist:
-                        return Response(
-                            {'error': 'Current user not found.'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                
-                # Create the message
-                message = Message.objects.create(
-                    tenant_id=tenant_id,
-                    conversation_id=conversation_id,
-                    message_type=message_type,
-                    direction='outbound',
-                    sender_type='agent',
-                    sender_id=current_user_id,
-                    sender_name=f"{current_user.first_name} {current_user.last_name}".strip() if current_user else 'Agent',
-                    content_encrypted=self._encrypt_content(content),  # Implement encryption
-                    content_hash=content_hash,
-                    attachments=attachments,
-                    delivery_status='sent',
-                    platform_timestamp=timezone.now(),
-                    processed_at=timezone.now()
-                )
-                
-                # Update conversation
-                conversation.last_message_at = timezone.now()
-                conversation.last_human_response_at = timezone.now()
-                
-                # If AI was handling and human sends message, take over
-                if conversation.current_handler_type == 'ai':
-                    conversation.current_handler_type = 'human'
-                    conversation.handover_reason = 'Agent sent message'
-                
-                # Update conversation status if needed
-                if conversation.status == 'pending':
-                    conversation.status = 'active'
-                
-                conversation.save(update_fields=[
-                    'last_message_at', 'last_human_response_at', 
-                    'current_handler_type', 'handover_reason', 'status', 'updated_at'
-                ])
-                
-                # Mark message as read by sender
-                MessageReadStatus.objects.create(
-                    tenant_id=tenant_id,
-                    message_id=message.id,
-                    user_id=current_user_id,
-                    read_at=timezone.now()
-                )
-                
-                # Here you would typically:
-                # 1. Send message to external platform
-                # 2. Trigger AI processing if needed
-                # 3. Send real-time notifications
-                
-            # Return created message details
-            detail_serializer = MessageDetailSerializer(
-                message,
-                context={'current_user_id': current_user_id}
-            )
-            return Response(detail_serializer.data, status=status.HTTP_201_CREATED)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
 @api_view(['GET'])
 def message_detail(request, message_id):
     """
@@ -760,8 +538,6 @@ def message_detail(request, message_id):
     message = get_object_or_404(
         Message.objects.select_related(
             'conversation'
-        ).prefetch_related(
-            'messagereadstatus_set__user'
         ),
         id=message_id,
         tenant_id=tenant_id,
@@ -770,12 +546,7 @@ def message_detail(request, message_id):
     
     # Auto-mark as read for current user if not already read
     if current_user_id:
-        MessageReadStatus.objects.get_or_create(
-            tenant_id=tenant_id,
-            message_id=message.id,
-            user_id=current_user_id,
-            defaults={'read_at': timezone.now()}
-        )
+        mark_conversation_read(message.conversation, request.user, up_to=message)
     
     serializer = MessageDetailSerializer(
         message,
@@ -825,6 +596,9 @@ def message_mark_read(request, message_id):
                 read_status.read_at = read_at
                 read_status.save(update_fields=['read_at'])
         
+        # The explicit receipt is kept for the UI; unread counts use the cursor
+        mark_conversation_read(message.conversation, request.user, up_to=message)
+        
         # Get updated message details
         message_serializer = MessageDetailSerializer(
             message,
@@ -843,39 +617,37 @@ def message_mark_read(request, message_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-def _encrypt_content(content):
-    """
-    Helper function to encrypt message content
-    This is a placeholder - implement actual encryption based on your requirements
-    """
-    # Implement your encryption logic here
-    # For now, just return the content as-is
-    return content
-
-
-from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count, Max, Exists, OuterRef, Case, When, IntegerField
-from django.utils import timezone
-from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
-from .models import Conversation, Message, MessageReadStatus
-
-channel_layer = get_channel_layer()
-
 class ConversationPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+def _page_size(request, pagination_class):
+    try:
+        size = int(request.GET.get(pagination_class.page_size_query_param, pagination_class.page_size))
+    except ValueError:
+        size = pagination_class.page_size
+    return max(1, min(size, pagination_class.max_page_size))
+
+
+def _keyset_response(request, results, next_cursor, count_queryset):
+    """Same envelope as PageNumberPagination; count only when with_total is requested"""
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+    return Response({
+        'count': cached_count(count_queryset) if wants_total(request) else None,
+        'next': next_url,
+        'previous': None,
+        'next_cursor': next_cursor,
+        'results': results
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def dashboard_conversations(request):
     """
     Get conversations for agent dashboard with real-time message indicators
@@ -885,8 +657,9 @@ def dashboard_conversations(request):
     user = request.user
     
     # Get conversations with unread message counts and latest message info
-    conversations = Conversation.objects.filter(
-        tenant=tenant
+    conversations = with_unread_counts(
+        Conversation.objects.filter(tenant=tenant),
+        user.id
     ).select_related(
         'customer', 'platform', 'assigned_user'
     ).annotate(
@@ -896,40 +669,51 @@ def dashboard_conversations(request):
         # Get latest message timestamp
         latest_message_at=Max('messages__created_at'),
         
-        # Count unread messages for this user
-        unread_count=Count(
-            'messages',
-            filter=Q(
-                messages__created_at__gt=OuterRef('last_read_at')
-            ) | Q(last_read_at__isnull=True)
-        ),
-        
-        # Check if user has read any messages in this conversation
-        last_read_at=Max(
-            'messages__read_statuses__read_at',
-            filter=Q(messages__read_statuses__user=user)
+        # Get latest message content (the newest row, not per-column maxima)
+        latest_message=Subquery(
+            Message.objects.filter(
+                conversation_id=OuterRef('pk')
+            ).order_by('-created_at', '-id').values(
+                data=JSONObject(
+                    content='content_encrypted',
+                    sender_name='sender_name',
+                    sender_type='sender_type'
+                )
+            )[:1]
         ),
         
-        # Get latest message content
-        latest_message_content=Max('messages__content_encrypted'),
-        latest_message_sender=Max('messages__sender_name'),
-        latest_message_type=Max('messages__sender_type'),
-        
         # Mark as new conversation if user never read any messages
         is_new_conversation=Case(
             When(last_read_at__isnull=True, then=1),
             default=0,
             output_field=IntegerField()
         )
-    ).order_by('-latest_message_at', '-updated_at')
+    )
+    
+    # Apply pagination: keyset on (last_message_at, id) unless the client asks for pages
+    paginator = None
+    next_cursor = None
+    keyset = KeysetPagination(
+        ('-last_message_at', '-id'),
+        limit=_page_size(request, ConversationPagination)
+    )
+    if wants_offset_pagination(request):
+        # Same order as the keyset pages
+        paginator = ConversationPagination()
+        page = paginator.paginate_queryset(keyset.order(conversations), request)
+    else:
+        try:
+            page, next_cursor = keyset.paginate(conversations, request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Apply pagination
-    paginator = ConversationPagination()
-    page = paginator.paginate_queryset(conversations, request)
+    # Typing indicators live in the presence store, not on the customer row
+    typing = presence.typing_conversations(tenant.id, [conv.customer_id for conv in page])
     
     # Serialize the data
     conversation_data = []
     for conv in page:
+        latest_message = conv.latest_message or {}
         data = {
             'id': str(conv.id),
             'customer': {
@@ -938,8 +722,7 @@ def dashboard_conversations(request):
                 'avatar': conv.customer.profile_picture_url,
                 'status': conv.customer.status,
                 'platform': conv.platform.display_name,
-                'is_typing': conv.customer.is_typing and 
-                           conv.customer.typing_in_conversation_id == conv.id
+                'is_typing': typing.get(str(conv.customer_id)) == str(conv.id)
             },
             'conversation': {
                 'status': conv.status,
@@ -950,9 +733,9 @@ def dashboard_conversations(request):
                 'sentiment_score': float(conv.sentiment_score) if conv.sentiment_score else None
             },
             'latest_message': {
-                'content': conv.latest_message_content or '',
-                'sender_name': conv.latest_message_sender or '',
-                'sender_type': conv.latest_message_type or '',
+                'content': latest_message.get('content') or '',
+                'sender_name': latest_message.get('sender_name') or '',
+                'sender_type': latest_message.get('sender_type') or '',
                 'timestamp': conv.latest_message_at.isoformat() if conv.latest_message_at else None
             },
             'message_stats': {
@@ -969,7 +752,12 @@ def dashboard_conversations(request):
         }
         conversation_data.append(data)
     
-    return paginator.get_paginated_response(conversation_data)
+    if paginator:
+        return paginator.get_paginated_response(conversation_data)
+    return _keyset_response(
+        request, conversation_data, next_cursor,
+        Conversation.objects.filter(tenant=tenant)
+    )
 
 
 @api_view(['GET'])
@@ -993,19 +781,27 @@ def conversation_messages(request, conversation_id):
         conversation=conversation,
         tenant=tenant,
         is_deleted=False
-    ).select_related('conversation').annotate(
-        # Check if this message is read by current user
-        is_read_by_user=Exists(
-            MessageReadStatus.objects.filter(
-                message=OuterRef('pk'),
-                user=user
-            )
+    ).select_related('conversation')
+    
+    # Everything up to the cursor is read by the current user
+    cursor = get_read_cursor(conversation.id, user.id)
+    read_until = cursor.last_read_at if cursor else None
+    
+    # Apply pagination: keyset on (created_at, id) unless the client asks for pages
+    paginator = None
+    next_cursor = None
+    if wants_offset_pagination(request):
+        paginator = ConversationPagination()
+        page = paginator.paginate_queryset(messages.order_by('-created_at'), request)
+    else:
+        keyset = KeysetPagination(
+            ('-created_at', '-id'),
+            limit=_page_size(request, ConversationPagination)
         )
-    ).order_by('-created_at')  # Newest first
-    
-    # Apply pagination
-    paginator = ConversationPagination()
-    page = paginator.paginate_queryset(messages, request)
+        try:
+            page, next_cursor = keyset.paginate(messages, request.GET.get('cursor'))
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     # Serialize messages
     message_data = []
@@ -1024,22 +820,22 @@ def conversation_messages(request, conversation_id):
             'ai_intent': msg.ai_intent,
             'ai_sentiment': float(msg.ai_sentiment) if msg.ai_sentiment else None,
             'attachments': msg.attachments,
-            'is_read': msg.is_read_by_user,
+            'is_read': read_until is not None and msg.created_at <= read_until,
             'created_at': msg.created_at.isoformat(),
             'platform_timestamp': msg.platform_timestamp.isoformat() if msg.platform_timestamp else None
         }
         message_data.append(data)
         
         # Collect unread message IDs for batch marking as read
-        if not msg.is_read_by_user:
+        if not data['is_read']:
             unread_message_ids.append(msg.id)
     
-    # Mark unread messages as read (batch operation)
+    # Move the read cursor past the newest unread message on this page
     if unread_message_ids:
         mark_messages_as_read(unread_message_ids, user, tenant)
         
         # Notify other agents about read status update
-        async_to_sync(channel_layer.group_send)(
+        notifications.send(
             f"conversation_{conversation_id}",
             {
                 'type': 'messages_read',
@@ -1061,12 +857,15 @@ def conversation_messages(request, conversation_id):
         'messages': message_data,
         'pagination': {
             'total_unread': len(unread_message_ids),
-            'has_next': paginator.page.has_next() if hasattr(paginator, 'page') else False,
-            'has_previous': paginator.page.has_previous() if hasattr(paginator, 'page') else False
+            'has_next': paginator.page.has_next() if hasattr(paginator, 'page') else next_cursor is not None,
+            'has_previous': paginator.page.has_previous() if hasattr(paginator, 'page') else bool(request.GET.get('cursor')),
+            'next_cursor': next_cursor
         }
     }
     
-    return paginator.get_paginated_response(response_data)
+    if paginator:
+        return paginator.get_paginated_response(response_data)
+    return _keyset_response(request, response_data, next_cursor, messages)
 
 
 @api_view(['POST'])
@@ -1102,7 +901,7 @@ def mark_messages_read(request, conversation_id):
     read_count = mark_messages_as_read(list(valid_messages), user, tenant)
     
     # Notify other agents
-    async_to_sync(channel_layer.group_send)(
+    notifications.send(
         f"conversation_{conversation_id}",
         {
             'type': 'messages_read',
@@ -1121,6 +920,7 @@ def mark_messages_read(request, conversation_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def dashboard_stats(request):
     """
     Get dashboard statistics for agent overview
@@ -1131,38 +931,17 @@ def dashboard_stats(request):
     # Get overall stats
     total_conversations = Conversation.objects.filter(tenant=tenant).count()
     
-    # Count conversations with unread messages for this user
-    conversations_with_unread = Conversation.objects.filter(
-        tenant=tenant,
-        messages__isnull=False
-    ).annotate(
-        unread_count=Count(
-            'messages',
-            filter=~Exists(
-                MessageReadStatus.objects.filter(
-                    message=OuterRef('messages'),
-                    user=user
-                )
-            )
-        )
-    ).filter(unread_count__gt=0).count()
+    # Unread totals come from the materialized counters
+    unread = unread_totals(tenant.id, user.id)
     
     # Count new conversations (never read by user)
     new_conversations = Conversation.objects.filter(
         tenant=tenant,
         messages__isnull=False
     ).exclude(
-        messages__read_statuses__user=user
+        read_cursors__user=user
     ).distinct().count()
     
-    # Count total unread messages
-    total_unread_messages = Message.objects.filter(
-        tenant=tenant,
-        is_deleted=False
-    ).exclude(
-        read_statuses__user=user
-    ).count()
-    
     # Count conversations by status
     status_counts = Conversation.objects.filter(
         tenant=tenant
@@ -1186,9 +965,9 @@ def dashboard_stats(request):
     return Response({
         'overview': {
             'total_conversations': total_conversations,
-            'conversations_with_unread': conversations_with_unread,
+            'conversations_with_unread': unread['conversations_with_unread'],
             'new_conversations': new_conversations,
-            'total_unread_messages': total_unread_messages,
+            'total_unread_messages': unread['total_unread_messages'],
             'assigned_to_me': assigned_to_user
         },
         'status_breakdown': {item['status']: item['count'] for item in status_counts},
@@ -1199,41 +978,15 @@ def dashboard_stats(request):
 
 def mark_messages_as_read(message_ids, user, tenant):
     """
-    Helper function to mark messages as read (batch operation)
+    Helper function to mark messages as read (moves the read cursor)
     """
     if not message_ids:
         return 0
     
-    # Get messages that aren't already read by this user
-    unread_messages = Message.objects.filter(
-        id__in=message_ids,
-        tenant=tenant
-    ).exclude(
-        read_statuses__user=user
+    return mark_read_state(
+        Message.objects.filter(id__in=message_ids, tenant=tenant).values('id'),
+        user
     )
-    
-    # Create read status records
-    read_statuses = []
-    read_time = timezone.now()
-    
-    for message in unread_messages:
-        read_statuses.append(
-            MessageReadStatus(
-                tenant=tenant,
-                message=message,
-                user=user,
-                read_at=read_time
-            )
-        )
-    
-    # Batch create
-    if read_statuses:
-        MessageReadStatus.objects.bulk_create(
-            read_statuses,
-            ignore_conflicts=True  # Handle race conditions
-        )
-    
-    return len(read_statuses)
 
 
 @api_view(['POST'])
@@ -1320,21 +1073,8 @@ def unread_counts(request):
     user = request.user
     
     # Get conversations with unread counts
-    conversations_with_unread = Conversation.objects.filter(
-        tenant=tenant,
-        messages__isnull=False
-    ).annotate(
-        unread_count=Count(
-            'messages',
-            filter=~Exists(
-                MessageReadStatus.objects.filter(
-                    message=OuterRef('messages'),
-                    user=user
-                )
-            )
-        )
-    ).filter(unread_count__gt=0).values(
-        'id', 'unread_count'
+    conversations_with_unread = unread_counters(tenant.id, user.id).values(
+        'conversation_id', 'unread_count'
     )
     
     # Format response
@@ -1342,7 +1082,7 @@ def unread_counts(request):
     total_unread = 0
     
     for conv in conversations_with_unread:
-        conversation_id = str(conv['id'])
+        conversation_id = str(conv['conversation_id'])
         unread_count = conv['unread_count']
         unread_data[conversation_id] = unread_count
         total_unread += unread_count
@@ -1354,3 +1094,26 @@ def unread_counts(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search(request):
+    """
+    Ranked search across conversations, contacts and message content.
+    Meant for search-as-you-type: the last word is matched as a prefix.
+    """
+    tenant = request.tenant
+    query = normalize_query(request.GET.get('q'))
+    if len(query) < 2:
+        return Response({'query': query, 'results': {}})
+    
+    valid_types = ('conversations', 'contacts', 'messages')
+    types = tuple(t for t in request.GET.get('types', ','.join(valid_types)).split(',') if t in valid_types)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+    except ValueError:
+        limit = 10
+    
+    return Response({
+        'query': query,
+        'results': search_all(tenant.id, query, types=types or valid_types, limit=limit)
+    })
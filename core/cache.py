@@ -0,0 +1,20 @@
+# core/cache.py
+from django.conf import settings
+from django.core.cache import caches
+
+# Backends that keep entries in the current process only
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache(alias='default'):
+    """Whether entries written by one worker are seen by the others"""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', LOCAL_CACHE_BACKENDS[0])
+    return backend not in LOCAL_CACHE_BACKENDS
+
+
+def shared_cache(alias='default'):
+    """The cache when it is shared between processes, else None"""
+    return caches[alias] if is_shared_cache(alias) else None
@@ -0,0 +1,54 @@
+# core/db.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import database_sync_to_async
+from django.db import connections
+
+
+def pool_stats(alias='default'):
+    """
+    Counters of this process's psycopg pool for ``alias``, or None when the
+    alias is not pooled. ``avg_wait_ms`` is the mean time a request waited
+    for a free connection since the pool started.
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    requests = stats.get('requests_num', 0)
+    stats['avg_wait_ms'] = round(stats.get('requests_wait_ms', 0) / requests, 2) if requests else 0
+    return stats
+
+
+def server_connection_count(alias='default'):
+    """Backends currently connected to this database as this role"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT COUNT(*) FROM pg_stat_activity '
+            'WHERE datname = current_database() AND usename = current_user'
+        )
+        return cursor.fetchone()[0]
+
+
+def new_worker_loop(name, db_threads):
+    """
+    Event loop for a background worker thread (RAG service, log writer,
+    notification dispatcher, summary refresher), with its own pool of
+    ``db_threads`` threads for worker_sync_to_async calls.
+    """
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix=f'{name}-db'))
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def worker_sync_to_async(func):
+    """
+    database_sync_to_async for code on a worker loop. Thread-sensitive calls
+    made outside a request all queue on asgiref's one process-wide thread;
+    these run on the calling loop's executor, so a worker's database calls
+    proceed in parallel and never wait behind another worker's.
+    """
+    return database_sync_to_async(func, thread_sensitive=False)
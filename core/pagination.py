@@ -0,0 +1,145 @@
+# core/pagination.py
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+COUNT_CACHE_TIMEOUT = 30
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without the millisecond rounding, so cursor equality holds"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for the sort key of the last row of a page"""
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+class KeysetPagination:
+    """
+    Cursor pagination over an ordering such as ('-created_at', '-id').
+
+    Each page continues strictly after the sort key of the previous page's last
+    row, so the cost of a page does not grow with its depth the way OFFSET does.
+    The last ordering field must be unique (normally the primary key). NULLs
+    sort last in both directions.
+    """
+
+    def __init__(self, ordering, limit=50):
+        self.ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.limit = limit
+
+    def order(self, queryset):
+        return queryset.order_by(*[
+            self._order_by(queryset.model, name, descending) for name, descending in self.ordering
+        ])
+
+    @staticmethod
+    def _order_by(model, name, descending):
+        # NULLS LAST only where NULLs can occur; a plain DESC on a NOT NULL
+        # column still matches a backward scan of an ascending index
+        try:
+            nullable = model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            nullable = True
+        if not nullable:
+            return F(name).desc() if descending else F(name).asc()
+        return F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+
+    def paginate(self, queryset, cursor=None):
+        """Returns (rows, next_cursor); next_cursor is None on the last page"""
+        queryset = self.order(queryset)
+        if cursor:
+            queryset = queryset.filter(self._after(queryset.model, decode_cursor(cursor)))
+
+        rows = list(queryset[:self.limit + 1])
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor([getattr(rows[-1], name) for name, _ in self.ordering])
+        return rows, next_cursor
+
+    def _after(self, model, values):
+        if len(values) != len(self.ordering):
+            raise InvalidCursor('Cursor does not match the requested ordering')
+        values = [self._to_python(model, name, value) for (name, _), value in zip(self.ordering, values)]
+
+        # (a, b, c) after (x, y, z)  <=>  a > x  OR  (a = x AND b > y)  OR  ...
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            condition |= equal & self._strictly_after(name, descending, value)
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+        # Redundant range on the leading column lets the planner use the index
+        name, descending = self.ordering[0]
+        if values[0] is not None:
+            bound = Q(**{f"{name}__{'lte' if descending else 'gte'}": values[0]}) | Q(**{f'{name}__isnull': True})
+            condition = bound & condition
+        return condition
+
+    @staticmethod
+    def _strictly_after(name, descending, value):
+        if value is None:
+            # Nothing sorts after NULL
+            return Q(pk__in=[])
+        return Q(**{f"{name}__{'lt' if descending else 'gt'}": value}) | Q(**{f'{name}__isnull': True})
+
+    @staticmethod
+    def _to_python(model, name, value):
+        if value is None:
+            return None
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            return value
+        except ValidationError:
+            raise InvalidCursor('Invalid cursor')
+
+
+def wants_offset_pagination(request):
+    """Legacy clients keep getting offset/page based results"""
+    return 'cursor' not in request.GET and ('offset' in request.GET or 'page' in request.GET)
+
+
+def wants_total(request):
+    return request.GET.get('with_total', '').lower() in ('true', '1', 'yes')
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """Exact count, cached briefly per query so scrolling does not recount every page"""
+    key = 'count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
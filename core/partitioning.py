@@ -0,0 +1,240 @@
+# core/partitioning.py
+"""
+Monthly range partitioning on created_at for the append-heavy tables.
+
+Partitions are named ``<table>_pYYYYMM`` and every partitioned table also has a
+``<table>_default`` partition so an insert never fails when the next month has
+not been created yet; ``ensure_partitions`` moves such rows out of the default
+partition when it creates their month.
+"""
+import logging
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ['messages', 'knowledge_retrieval_logs', 'ai_usage_logs']
+PARTITION_COLUMN = 'created_at'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+        'WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace',
+        [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """[(name, lower_bound, upper_bound)] of the monthly partitions, oldest first"""
+    cursor.execute(
+        """
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = %s AND parent.relnamespace = current_schema()::regnamespace
+        """,
+        [table]
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = re.search(r"FROM \('([^']+)'\) TO \('([^']+)'\)", bound or '')
+        if match:
+            partitions.append((name, date.fromisoformat(match.group(1)[:10]), date.fromisoformat(match.group(2)[:10])))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partition(cursor, table, month, column=PARTITION_COLUMN):
+    """
+    Create the partition for ``month``. Rows for that month that landed in the
+    default partition are moved into it, as Postgres requires.
+    """
+    name = partition_name(table, month)
+    lower, upper = month, add_months(month, 1)
+    default = f'{table}_default'
+
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    if cursor.fetchone()[0]:
+        return False
+
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [default])
+    has_default = cursor.fetchone()[0]
+    stray = False
+    if has_default:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {_qn(default)} WHERE {_qn(column)} >= %s AND {_qn(column)} < %s)',
+            [lower, upper]
+        )
+        stray = cursor.fetchone()[0]
+
+    if not stray:
+        cursor.execute(
+            f'CREATE TABLE {_qn(name)} PARTITION OF {_qn(table)} FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper]
+        )
+        return True
+
+    with transaction.atomic():
+        cursor.execute(f'CREATE TABLE {_qn(name)} (LIKE {_qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {_qn(default)} WHERE {_qn(column)} >= %s AND {_qn(column)} < %s RETURNING *) '
+            f'INSERT INTO {_qn(name)} SELECT * FROM moved',
+            [lower, upper]
+        )
+        cursor.execute(
+            f'ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(name)} FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper]
+        )
+    logger.warning(f'Moved rows for {month:%Y-%m} out of {default} into {name}')
+    return True
+
+
+def ensure_partitions(cursor, table, months_ahead=3, start=None):
+    """Create monthly partitions from ``start`` (default: this month) to months_ahead; returns new names"""
+    first = month_start(start or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    created = []
+    month = first
+    while month <= last:
+        if create_partition(cursor, table, month):
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def convert_to_partitioned(schema_editor, table, column=PARTITION_COLUMN, months_ahead=3, batch_size=10000):
+    """
+    Rebuild an existing table as a range-partitioned table of the same name.
+
+    Primary key and unique constraints get the partition column appended (a
+    partitioned table cannot enforce uniqueness without it), indexes and
+    outgoing foreign keys are recreated on the parent, and existing rows are
+    moved into monthly partitions. Incoming foreign keys are dropped; the
+    referencing models declare them with db_constraint=False.
+
+    Rows are moved ``batch_size`` at a time, each batch in its own
+    transaction, so run it from a non-atomic migration. An interrupted run
+    picks up where it stopped: the old table is kept as ``<table>_unpartitioned``
+    until it is empty.
+    """
+    legacy = f'{table}_unpartitioned'
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [legacy])
+        resuming = cursor.fetchone()[0]
+        if not resuming:
+            if is_partitioned(cursor, table):
+                return
+            with transaction.atomic(using=connection.alias):
+                _create_partitioned_copy(cursor, table, legacy, column, months_ahead)
+
+        # Move the rows over in batches, keyed on the old primary key
+        while True:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(
+                    f'WITH moved AS ('
+                    f'DELETE FROM {_qn(legacy)} WHERE id IN '
+                    f'(SELECT id FROM {_qn(legacy)} ORDER BY id LIMIT %s) RETURNING *) '
+                    f'INSERT INTO {_qn(table)} SELECT * FROM moved',
+                    [batch_size]
+                )
+                if cursor.rowcount < batch_size:
+                    break
+
+        with transaction.atomic(using=connection.alias):
+            # Added after the copy so they are validated once instead of queued per row
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [legacy]
+            )
+            for name, definition in cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {definition}')
+            cursor.execute(f'DROP TABLE {_qn(legacy)}')
+        cursor.execute(f'ANALYZE {_qn(table)}')
+
+
+def _create_partitioned_copy(cursor, table, legacy, column, months_ahead):
+    """Rename ``table`` to ``legacy`` and create the empty partitioned table in its place"""
+    # Deferred FK checks would leave pending trigger events that block ALTER TABLE
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    cursor.execute(f'ALTER TABLE {_qn(table)} RENAME TO {_qn(legacy)}')
+
+    cursor.execute(
+        """
+        SELECT conname, contype,
+               ARRAY(SELECT a.attname FROM unnest(conkey) k JOIN pg_attribute a
+                     ON a.attrelid = conrelid AND a.attnum = k)
+        FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+        """,
+        [legacy]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = %s AND schemaname = current_schema()
+          AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)
+        """,
+        [legacy, legacy]
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE confrelid = %s::regclass AND contype = 'f' AND conrelid <> confrelid",
+        [legacy]
+    )
+    incoming = cursor.fetchall()
+
+    # Rows are deleted from the old table as they are moved
+    for referencing, name in incoming:
+        cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT {_qn(name)}')
+
+    # Free the names for the new table
+    for name, _ in indexes:
+        cursor.execute(f'ALTER INDEX {_qn(name)} RENAME TO {_qn(name[:55] + "_legacy")}')
+    for name, _, _ in constraints:
+        cursor.execute(f'ALTER TABLE {_qn(legacy)} RENAME CONSTRAINT {_qn(name)} TO {_qn(name[:55] + "_legacy")}')
+
+    cursor.execute(
+        f'CREATE TABLE {_qn(table)} (LIKE {_qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+        f'PARTITION BY RANGE ({_qn(column)})'
+    )
+    for name, contype, columns in constraints:
+        if column not in columns:
+            columns = list(columns) + [column]
+        kind = 'PRIMARY KEY' if contype == 'p' else 'UNIQUE'
+        cursor.execute(
+            f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {kind} ({", ".join(_qn(c) for c in columns)})'
+        )
+
+    cursor.execute(f'SELECT MIN({_qn(column)}) FROM {_qn(legacy)}')
+    oldest = cursor.fetchone()[0]
+    ensure_partitions(cursor, table, months_ahead, start=oldest.date() if oldest else None)
+    cursor.execute(f'CREATE TABLE {_qn(table + "_default")} PARTITION OF {_qn(table)} DEFAULT')
+
+    # Created up front so an interrupted copy can be resumed without them
+    legacy_ref = re.compile(rf' ON (\S+\.)?"?{re.escape(legacy)}"? ')
+    for _, definition in indexes:
+        cursor.execute(legacy_ref.sub(f' ON {_qn(table)} ', definition, count=1))
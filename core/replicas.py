@@ -0,0 +1,156 @@
+# core/replicas.py
+"""
+Read-replica routing.
+
+Everything uses the primary unless code explicitly opts in with
+``use_replica()`` or the ``@replica_reads`` view decorator. Even then reads
+fall back to the primary when no replica is configured, inside a transaction,
+while the current user is sticky after a write, or when the replica lags
+more than REPLICA_MAX_LAG_SECONDS. Stickiness is kept in the shared cache;
+without one, signed-in users always read from the primary.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LAG_CHECK_INTERVAL = 5  # seconds between lag probes per process
+
+_reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+_lag_lock = threading.Lock()
+_lag = {'checked_at': 0.0, 'healthy': False}
+
+
+def _sticky_key(user_id):
+    return f'db:sticky:{user_id}'
+
+
+def mark_sticky(user_id):
+    """Keep this user's reads on the primary until the replica has caught up"""
+    cache = shared_cache()
+    if cache is not None:
+        cache.set(_sticky_key(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def is_sticky(user_id):
+    if not user_id:
+        return False
+    cache = shared_cache()
+    # Another worker's mark would not be seen, so signed-in users stay on the primary
+    if cache is None:
+        return True
+    return cache.get(_sticky_key(user_id), False)
+
+
+def replica_lag():
+    """Seconds the replica is behind, or None when it cannot be reached"""
+    try:
+        with connections[REPLICA_ALIAS].cursor() as cursor:
+            # An idle replica that has replayed everything is not lagging
+            cursor.execute(
+                """
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+                """
+            )
+            return float(cursor.fetchone()[0])
+    except Exception as e:
+        logger.warning(f"Replica lag check failed: {e}")
+        return None
+
+
+def replica_available():
+    """Replica configured and within REPLICA_MAX_LAG_SECONDS; probed at most every few seconds"""
+    if REPLICA_ALIAS not in settings.DATABASES:
+        return False
+
+    now = time.monotonic()
+    if now - _lag['checked_at'] < LAG_CHECK_INTERVAL:
+        return _lag['healthy']
+
+    with _lag_lock:
+        if now - _lag['checked_at'] >= LAG_CHECK_INTERVAL:
+            lag = replica_lag()
+            _lag['healthy'] = lag is not None and lag <= getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2)
+            _lag['checked_at'] = now
+            if not _lag['healthy']:
+                logger.warning(f"Replica unavailable or lagging ({lag}s), reading from primary")
+    return _lag['healthy']
+
+
+@contextmanager
+def use_replica():
+    """Route reads in this scope to the replica when it is safe to"""
+    token = _reading_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _reading_from_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    Serve a view's safe-method requests from the replica. Apply below
+    @api_view so the user is already authenticated.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user_id = getattr(request.user, 'id', None)
+        if request.method not in SAFE_METHODS or is_sticky(user_id):
+            return view(request, *args, **kwargs)
+        with use_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Writes, migrations and un-scoped reads go to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _reading_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_ALIAS if replica_available() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaStickinessMiddleware:
+    """Users who just wrote read their own writes from the primary for a few seconds"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            # DRF copies the authenticated user onto the underlying request
+            user_id = getattr(getattr(request, 'user', None), 'id', None)
+            if user_id:
+                mark_sticky(user_id)
+        return response
@@ -0,0 +1,58 @@
+# core/transactions.py
+"""
+Per-operation transaction isolation.
+
+Connections run at Postgres' default READ COMMITTED. Operations whose
+invariants depend on what they read (check-then-write) run through
+``run_serializable``, which opens a SERIALIZABLE transaction and retries it
+when Postgres aborts it with a serialization failure or deadlock.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.transaction import TransactionManagementError
+
+logger = logging.getLogger(__name__)
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+
+def is_retryable(error):
+    return getattr(error.__cause__, 'sqlstate', None) in RETRYABLE_SQLSTATES
+
+
+def run_serializable(func, *args, retries=5, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Call ``func`` inside a SERIALIZABLE transaction, retrying it with jittered
+    backoff on serialization failures. ``func`` may run more than once, so it
+    must not have side effects outside the database (use on_commit for those).
+    """
+    if connections[using].in_atomic_block:
+        # The isolation level can only be set as a transaction's first statement
+        raise TransactionManagementError('run_serializable() must start its own transaction')
+
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using):
+                with connections[using].cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL SERIALIZABLE')
+                return func(*args, **kwargs)
+        except DatabaseError as e:
+            if not is_retryable(e) or attempt == retries:
+                raise
+            logger.info(f"Retrying {getattr(func, '__name__', func)} after serialization failure ({attempt + 1})")
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+
+def serializable(func=None, *, retries=5, using=DEFAULT_DB_ALIAS):
+    """Decorator form of run_serializable"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            return run_serializable(f, *args, retries=retries, using=using, **kwargs)
+        return wrapper
+    return decorator(func) if func else decorator
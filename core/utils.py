@@ -67,6 +67,10 @@ def get_user_id_from_request(request):
     if not request.user.is_authenticated:
         return None
     
+    # The authenticated user already is the TenantUser
+    if isinstance(request.user, TenantUser):
+        return request.user.id
+
     # Try to get TenantUser ID
     try:
         tenant_user = TenantUser.objects.get(
@@ -0,0 +1,12 @@
+# customers/management/commands/flush_presence.py
+from django.core.management.base import BaseCommand
+
+from customers.presence import presence
+
+
+class Command(BaseCommand):
+    help = 'Write buffered customer last_seen_at values from the presence store'
+
+    def handle(self, *args, **options):
+        flushed = presence.flush()
+        self.stdout.write(self.style.SUCCESS(f'✓ Flushed last_seen_at for {flushed} customers'))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['tenant', 'last_contact_at', 'id'], name='customers_tenant_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('customers', '0002_customers_tenant_feed_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['platform_username'], name='customers_username_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['platform_display_name'], name='customers_display_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
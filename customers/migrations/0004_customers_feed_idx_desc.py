@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('customers', '0003_search_trigram_indexes'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='customer',
+            name='customers_tenant_feed_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='customer',
+            index=models.Index(
+                models.F('tenant'), models.F('last_contact_at').desc(nulls_last=True), models.F('id').desc(),
+                name='customers_tenant_feed_idx'
+            ),
+        ),
+    ]
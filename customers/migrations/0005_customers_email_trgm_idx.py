@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-19 20:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('customers', '0004_customers_feed_idx_desc'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='customer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email_encrypted'], name='customers_email_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -2,6 +2,7 @@
 import uuid
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from tenants.models import Tenant, TenantUser
 from platforms.models import SocialPlatform, TenantPlatformAccount
 
@@ -61,7 +62,16 @@ class Customer(models.Model):
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['tenant', 'engagement_score']),
             models.Index(fields=['tenant', 'last_contact_at']),
+            # Keyset pagination in the paginator's ORDER BY last_contact_at DESC NULLS LAST, id DESC
+            models.Index(
+                models.F('tenant'), models.F('last_contact_at').desc(nulls_last=True), models.F('id').desc(),
+                name='customers_tenant_feed_idx'
+            ),
             models.Index(fields=['pin_order'], condition=models.Q(is_pinned=True), name='customers_pinned_order_idx'),
+            # Trigram indexes serve ILIKE '%term%' and similarity search
+            GinIndex(fields=['platform_username'], opclasses=['gin_trgm_ops'], name='customers_username_trgm_idx'),
+            GinIndex(fields=['platform_display_name'], opclasses=['gin_trgm_ops'], name='customers_display_trgm_idx'),
+            GinIndex(fields=['email_encrypted'], opclasses=['gin_trgm_ops'], name='customers_email_trgm_idx'),
         ]
 
     def __str__(self):
@@ -117,10 +127,14 @@ class Customer(models.Model):
             self.save(update_fields=['status', 'last_seen_at'])
 
     def set_typing(self, conversation_id=None, is_typing=True):
-        """Set customer typing status"""
-        self.is_typing = is_typing
-        self.typing_in_conversation_id = conversation_id if is_typing else None
-        self.save(update_fields=['is_typing', 'typing_in_conversation_id'])
+        """Set customer typing status in the presence store (no row update)"""
+        from .presence import presence
+        presence.set_typing(self, conversation_id=conversation_id, is_typing=is_typing)
+
+    def touch(self):
+        """Record customer activity; last_seen_at is flushed in bulk later"""
+        from .presence import presence
+        presence.touch(self)
 
 
 class ContactLabel(models.Model):
@@ -0,0 +1,284 @@
+# customers/presence.py
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Optional, Set
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ONLINE_WINDOW = timedelta(minutes=5)
+AWAY_WINDOW = timedelta(hours=1)
+
+
+class InMemoryPresenceBackend:
+    """Process-local presence store, for development and single-process deployments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}      # tenant_id -> {customer_id: timestamp}
+        self._typing = {}    # tenant_id -> {customer_id: (conversation_id, expires_at)}
+        self._dirty = {}     # customer_id -> timestamp
+
+    def touch(self, tenant_id, customer_id, timestamp: float):
+        with self._lock:
+            self._seen.setdefault(tenant_id, {})[customer_id] = timestamp
+            self._dirty[customer_id] = timestamp
+
+    def set_typing(self, tenant_id, customer_id, conversation_id, ttl: int):
+        with self._lock:
+            typing = self._typing.setdefault(tenant_id, {})
+            if conversation_id:
+                typing[customer_id] = (conversation_id, time.time() + ttl)
+            else:
+                typing.pop(customer_id, None)
+
+    def seen(self, tenant_id, customer_ids) -> Dict[str, float]:
+        with self._lock:
+            seen = self._seen.get(tenant_id, {})
+            return {cid: seen[cid] for cid in customer_ids if cid in seen}
+
+    def typing(self, tenant_id, customer_ids=None) -> Dict[str, str]:
+        now = time.time()
+        with self._lock:
+            typing = self._typing.get(tenant_id, {})
+            for cid in [cid for cid, (_, expires_at) in typing.items() if expires_at <= now]:
+                del typing[cid]
+            if customer_ids is None:
+                return {cid: conv for cid, (conv, _) in typing.items()}
+            return {cid: typing[cid][0] for cid in customer_ids if cid in typing}
+
+    def seen_since(self, tenant_id, since: float) -> Set[str]:
+        with self._lock:
+            return {cid for cid, ts in self._seen.get(tenant_id, {}).items() if ts >= since}
+
+    def pop_dirty(self) -> Dict[str, float]:
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return dirty
+
+
+class RedisPresenceBackend:
+    """Presence store shared by every process through Redis"""
+
+    def __init__(self, url: str, prefix: str = 'presence'):
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return ':'.join([self._prefix, *[str(p) for p in parts]])
+
+    def touch(self, tenant_id, customer_id, timestamp: float):
+        pipe = self._redis.pipeline(transaction=False)
+        seen_key = self._key(tenant_id, 'seen')
+        pipe.zadd(seen_key, {customer_id: timestamp})
+        # Entries older than the away window no longer affect any status
+        pipe.zremrangebyscore(seen_key, '-inf', timestamp - AWAY_WINDOW.total_seconds())
+        pipe.expire(seen_key, int(AWAY_WINDOW.total_seconds()))
+        pipe.hset(self._key('dirty'), customer_id, timestamp)
+        pipe.execute()
+
+    def set_typing(self, tenant_id, customer_id, conversation_id, ttl: int):
+        typing_key = self._key(tenant_id, 'typing')
+        conversations_key = self._key(tenant_id, 'typing_conversation')
+        pipe = self._redis.pipeline(transaction=False)
+        if conversation_id:
+            pipe.zadd(typing_key, {customer_id: time.time() + ttl})
+            pipe.hset(conversations_key, customer_id, conversation_id)
+            pipe.expire(typing_key, ttl)
+            pipe.expire(conversations_key, ttl)
+        else:
+            pipe.zrem(typing_key, customer_id)
+            pipe.hdel(conversations_key, customer_id)
+        pipe.execute()
+
+    def seen(self, tenant_id, customer_ids) -> Dict[str, float]:
+        customer_ids = list(customer_ids)
+        if not customer_ids:
+            return {}
+        scores = self._redis.zmscore(self._key(tenant_id, 'seen'), customer_ids)
+        return {cid: score for cid, score in zip(customer_ids, scores) if score is not None}
+
+    def typing(self, tenant_id, customer_ids=None) -> Dict[str, str]:
+        typing_key = self._key(tenant_id, 'typing')
+        self._redis.zremrangebyscore(typing_key, '-inf', time.time())
+        active = set(self._redis.zrange(typing_key, 0, -1))
+        if customer_ids is not None:
+            active &= set(customer_ids)
+        if not active:
+            return {}
+        active = list(active)
+        conversations = self._redis.hmget(self._key(tenant_id, 'typing_conversation'), active)
+        return {cid: conv for cid, conv in zip(active, conversations) if conv}
+
+    def seen_since(self, tenant_id, since: float) -> Set[str]:
+        return set(self._redis.zrangebyscore(self._key(tenant_id, 'seen'), since, '+inf'))
+
+    def pop_dirty(self) -> Dict[str, float]:
+        dirty_key = self._key('dirty')
+        flushing_key = self._key('dirty', 'flushing')
+        # Rename is atomic, so touches racing the flush land in a fresh hash
+        try:
+            self._redis.rename(dirty_key, flushing_key)
+        except Exception:
+            return {}
+        dirty = self._redis.hgetall(flushing_key)
+        self._redis.delete(flushing_key)
+        return {cid: float(ts) for cid, ts in dirty.items()}
+
+
+class PresenceTracker:
+    """
+    Ephemeral online/typing state for customers.
+
+    Typing and last-seen updates only touch the presence store; ``last_seen_at``
+    is written to the customers table in bulk at most every
+    ``PRESENCE_FLUSH_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    url = getattr(settings, 'PRESENCE_REDIS_URL', None)
+                    self._backend = RedisPresenceBackend(url) if url else InMemoryPresenceBackend()
+        return self._backend
+
+    @property
+    def typing_ttl(self) -> int:
+        return getattr(settings, 'PRESENCE_TYPING_TTL', 10)
+
+    @property
+    def flush_interval(self) -> int:
+        return getattr(settings, 'PRESENCE_FLUSH_INTERVAL', 60)
+
+    def touch(self, customer):
+        """Record customer activity"""
+        try:
+            self.backend.touch(str(customer.tenant_id), str(customer.id), time.time())
+        except Exception as e:
+            logger.error(f"Failed to record presence for customer {customer.id}: {e}")
+        self.flush_if_due()
+
+    def set_typing(self, customer, conversation_id=None, is_typing=True):
+        """Start or stop the typing indicator; it expires on its own after the TTL"""
+        try:
+            self.backend.set_typing(
+                str(customer.tenant_id),
+                str(customer.id),
+                str(conversation_id) if is_typing and conversation_id else None,
+                self.typing_ttl
+            )
+        except Exception as e:
+            logger.error(f"Failed to record typing for customer {customer.id}: {e}")
+
+    def typing_conversations(self, tenant_id, customer_ids: Optional[Iterable] = None) -> Dict[str, str]:
+        """Map of customer id -> conversation id the customer is typing in"""
+        ids = None if customer_ids is None else [str(cid) for cid in customer_ids]
+        try:
+            return self.backend.typing(str(tenant_id), ids)
+        except Exception as e:
+            logger.error(f"Failed to read typing state: {e}")
+            return {}
+
+    def typing_customer_ids(self, tenant_id) -> Set[str]:
+        return set(self.typing_conversations(tenant_id))
+
+    def online_customer_ids(self, tenant_id) -> Set[str]:
+        """Customers seen within the online window"""
+        since = (timezone.now() - ONLINE_WINDOW).timestamp()
+        try:
+            return self.backend.seen_since(str(tenant_id), since)
+        except Exception as e:
+            logger.error(f"Failed to read online customers: {e}")
+            return set()
+
+    def last_seen(self, customers) -> Dict[str, Optional[datetime]]:
+        """Latest activity per customer, falling back to the flushed column"""
+        customers = list(customers)
+        if not customers:
+            return {}
+
+        try:
+            seen = self.backend.seen(str(customers[0].tenant_id), [str(c.id) for c in customers])
+        except Exception as e:
+            logger.error(f"Failed to read presence: {e}")
+            seen = {}
+
+        result = {}
+        for customer in customers:
+            ts = seen.get(str(customer.id))
+            live = datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts else None
+            stored = customer.last_seen_at
+            result[str(customer.id)] = max(filter(None, [live, stored]), default=None)
+        return result
+
+    def statuses(self, customers) -> Dict[str, str]:
+        """typing/online/away/offline/unknown per customer id"""
+        customers = list(customers)
+        if not customers:
+            return {}
+
+        typing = self.typing_conversations(customers[0].tenant_id, [c.id for c in customers])
+        last_seen = self.last_seen(customers)
+        now = timezone.now()
+
+        result = {}
+        for customer in customers:
+            cid = str(customer.id)
+            seen_at = last_seen.get(cid)
+            if cid in typing:
+                result[cid] = 'typing'
+            elif not seen_at:
+                result[cid] = 'unknown'
+            elif now - seen_at <= ONLINE_WINDOW:
+                result[cid] = 'online'
+            elif now - seen_at <= AWAY_WINDOW:
+                result[cid] = 'away'
+            else:
+                result[cid] = 'offline'
+        return result
+
+    def get_status(self, customer) -> str:
+        return self.statuses([customer]).get(str(customer.id), 'unknown')
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write buffered last_seen_at values to the customers table"""
+        from .models import Customer
+
+        self._last_flush = time.monotonic()
+        try:
+            dirty = self.backend.pop_dirty()
+        except Exception as e:
+            logger.error(f"Failed to read pending presence updates: {e}")
+            return 0
+        if not dirty:
+            return 0
+
+        customers = [
+            Customer(id=cid, last_seen_at=datetime.fromtimestamp(ts, tz=dt_timezone.utc))
+            for cid, ts in dirty.items()
+        ]
+        try:
+            Customer.objects.bulk_update(customers, ['last_seen_at'], batch_size=500)
+        except Exception as e:
+            logger.error(f"Failed to flush last_seen_at for {len(customers)} customers: {e}")
+            return 0
+        return len(customers)
+
+
+presence = PresenceTracker()
@@ -3,11 +3,11 @@ from rest_framework import serializers
 from .models import Customer, ContactInsight
 from platforms.models import SocialPlatform, TenantPlatformAccount
 from .models import  ContactLabel, CustomerLabel
-from conversations.models import Message, Conversation
-from conversations.models import Conversation, Message, MessageReadStatus
-from django.db.models import Count, Q, Max
-from django.utils import timezone
-from datetime import timedelta
+from .presence import presence
+from conversations.models import Conversation, ConversationReadCursor, Message, UnreadCounter
+from conversations.read_state import unread_messages
+from django.db.models import Count, Q, Max, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce, JSONObject
 
 class CustomerListSerializer(serializers.ModelSerializer):
     """Serializer for listing customers with basic info"""
@@ -44,6 +44,8 @@ class CustomerDetailSerializer(serializers.ModelSerializer):
     platform_name = serializers.CharField(source='platform.display_name', read_only=True)
     account_name = serializers.CharField(source='platform_account.account_name', read_only=True)
     contact_insights = ContactInsightsSerializer(read_only=True)
+    is_typing = serializers.SerializerMethodField()
+    typing_in_conversation_id = serializers.SerializerMethodField()
     
     class Meta:
         model = Customer
@@ -58,6 +60,13 @@ class CustomerDetailSerializer(serializers.ModelSerializer):
             'engagement_score', 'platform_name', 'account_name',
             'contact_insights', 'created_at', 'updated_at'
         ]
+    
+    def get_is_typing(self, obj):
+        return self.get_typing_in_conversation_id(obj) is not None
+    
+    def get_typing_in_conversation_id(self, obj):
+        """Live typing state from the presence store; the columns are no longer written"""
+        return presence.typing_conversations(obj.tenant_id, [obj.id]).get(str(obj.id))
 
 
 class CustomerCreateUpdateSerializer(serializers.ModelSerializer):
@@ -172,9 +181,10 @@ class ContactListSerializer(serializers.ModelSerializer):
     platform = serializers.CharField(source='platform.name', read_only=True)
     platform_name = serializers.CharField(source='platform.display_name', read_only=True)
     status = serializers.SerializerMethodField()
+    is_typing = serializers.SerializerMethodField()
     labels = serializers.SerializerMethodField()
     last_conversation = serializers.SerializerMethodField()
-    last_seen = serializers.DateTimeField(source='last_seen_at', read_only=True)
+    last_seen = serializers.SerializerMethodField()
     
     class Meta:
         model = Customer
@@ -201,80 +211,60 @@ class ContactListSerializer(serializers.ModelSerializer):
             return "Unknown Contact"
     
     def get_status(self, obj):
-        """Determine contact status based on last activity"""
-        if obj.is_typing:
-            return "typing"
-        elif obj.last_seen_at:
-            time_diff = timezone.now() - obj.last_seen_at
-            if time_diff <= timedelta(minutes=5):
-                return "online"
-            elif time_diff <= timedelta(hours=1):
-                return "away"
-            else:
-                return "offline"
-        else:
-            return "unknown"
+        """Determine contact status from the presence store"""
+        statuses = self.context.get('presence_statuses')
+        if statuses is not None:
+            return statuses.get(str(obj.id), 'unknown')
+        return presence.get_status(obj)
+    
+    def get_is_typing(self, obj):
+        return self.get_status(obj) == 'typing'
+    
+    def get_last_seen(self, obj):
+        last_seen = self.context.get('presence_last_seen')
+        if last_seen is None:
+            last_seen = presence.last_seen([obj])
+        value = last_seen.get(str(obj.id))
+        return value.isoformat() if value else None
     
     def get_labels(self, obj):
-        """Get contact labels"""
-        labels = obj.customerlabel_set.select_related('label').all()
-        return [label.label.name for label in labels]
+        """Get contact labels (prefetched through labels__label)"""
+        return [assignment.label.name for assignment in obj.labels.all()]
     
     def get_last_conversation(self, obj):
-        """Get last conversation with unread count"""
-        current_user_id = self.context.get('current_user_id')
+        """
+        Get last conversation with unread count.
         
-        # Get the most recent conversation for this customer
-        last_conversation = obj.conversations.order_by('-last_message_at').first()
+        Reads the annotations added by annotate_contact_previews().
+        """
+        last_conversation = obj.last_conversation_data
+        last_message = obj.last_message_data
         
-        if not last_conversation:
+        if not last_conversation or not last_message:
             return None
         
-        # Get the last message in this conversation
-        last_message = last_conversation.messages.order_by('-created_at').first()
-        
-        if not last_message:
-            return None
-        
-        # Check if current user has read the last message
-        is_read = False
-        if current_user_id:
-            is_read = MessageReadStatus.objects.filter(
-                message_id=last_message.id,
-                user_id=current_user_id
-            ).exists()
-        
-        # Get unread count for current user
-        unread_count = 0
-        if current_user_id:
-            read_message_ids = MessageReadStatus.objects.filter(
-                user_id=current_user_id,
-                message__conversation_id=last_conversation.id
-            ).values_list('message_id', flat=True)
-            
-            unread_count = last_conversation.messages.exclude(
-                id__in=read_message_ids
-            ).count()
+        # Read when the user's cursor is at or past the last message
+        last_read_at = obj.last_conversation_read_at
+        is_read = last_read_at is not None and obj.last_message_created_at <= last_read_at
         
         # Count attachments in last message
-        attachments_count = 0
-        if last_message.attachments:
-            attachments_count = len(last_message.attachments) if isinstance(last_message.attachments, list) else 0
+        attachments = last_message.get('attachments')
+        attachments_count = len(attachments) if isinstance(attachments, list) else 0
         
         return {
-            'id': last_conversation.id,
-            'subject': last_conversation.subject,
-            'status': last_conversation.status,
+            'id': last_conversation['id'],
+            'subject': last_conversation['subject'],
+            'status': last_conversation['status'],
             'last_message': {
-                'content': getattr(last_message, 'content_decrypted', '')[:500] or '',
-                'sender_type': last_message.sender_type,
-                'created_at': last_message.created_at,
+                'content': (last_message.get('content') or '')[:500],
+                'sender_type': last_message['sender_type'],
+                'created_at': obj.last_message_created_at,
                 'is_read': is_read,
-                'message_type': last_message.message_type,
+                'message_type': last_message['message_type'],
                 'attachments_count': attachments_count
             },
-            'unread_count': unread_count,
-            'last_message_at': last_conversation.last_message_at
+            'unread_count': obj.last_conversation_unread_count,
+            'last_message_at': last_conversation['last_message_at']
         }
 
 
@@ -325,42 +315,21 @@ class RecentContactSerializer(serializers.ModelSerializer):
         return obj.last_contact_at or obj.last_seen_at or obj.updated_at
     
     def get_unread_count(self, obj):
-        """Get total unread messages for this contact"""
-        current_user_id = self.context.get('current_user_id')
-        if not current_user_id:
-            return 0
-        
-        # Get all conversations for this customer
-        conversation_ids = obj.conversations.values_list('id', flat=True)
-        
-        # Get read message IDs for current user
-        read_message_ids = MessageReadStatus.objects.filter(
-            user_id=current_user_id,
-            message__conversation_id__in=conversation_ids
-        ).values_list('message_id', flat=True)
-        
-        # Count unread messages
-        return Message.objects.filter(
-            conversation_id__in=conversation_ids,
-            sender_type='customer'  # Only count customer messages as unread
-        ).exclude(id__in=read_message_ids).count()
+        """Get total unread messages for this contact (annotated by annotate_recent_contacts)"""
+        return obj.unread_count
     
     def get_last_message_preview(self, obj):
         """Get preview of last message"""
-        last_conversation = obj.conversations.order_by('-last_message_at').first()
-        if not last_conversation:
-            return None
-        
-        last_message = last_conversation.messages.order_by('-created_at').first()
+        last_message = obj.last_message_data
         if not last_message:
             return None
         
-        content = getattr(last_message, 'content_decrypted', '') or ''
+        content = last_message.get('content') or ''
         return {
             'content': content[:100] + ('...' if len(content) > 100 else ''),
-            'sender_type': last_message.sender_type,
-            'created_at': last_message.created_at,
-            'message_type': last_message.message_type
+            'sender_type': last_message['sender_type'],
+            'created_at': obj.last_message_created_at,
+            'message_type': last_message['message_type']
         }
 
 
@@ -388,69 +357,149 @@ class UnreadContactSerializer(serializers.ModelSerializer):
         return full_name or obj.platform_display_name or obj.platform_username or "Unknown"
     
     def get_unread_details(self, obj):
-        """Get detailed unread message information"""
-        current_user_id = self.context.get('current_user_id')
-        if not current_user_id:
-            return {'total_unread': 0, 'conversations_with_unread': 0}
-        
-        conversation_ids = obj.conversations.values_list('id', flat=True)
-        
-        # Get read message IDs
-        read_message_ids = MessageReadStatus.objects.filter(
-            user_id=current_user_id,
-            message__conversation_id__in=conversation_ids
-        ).values_list('message_id', flat=True)
-        
-        # Count total unread messages
-        total_unread = Message.objects.filter(
-            conversation_id__in=conversation_ids,
-            sender_type='customer'
-        ).exclude(id__in=read_message_ids).count()
-        
-        # Count conversations with unread messages
-        conversations_with_unread = 0
-        for conv_id in conversation_ids:
-            unread_in_conv = Message.objects.filter(
-                conversation_id=conv_id,
-                sender_type='customer'
-            ).exclude(id__in=read_message_ids).count()
-            
-            if unread_in_conv > 0:
-                conversations_with_unread += 1
-        
+        """Get detailed unread message information (annotated by annotate_unread_contacts)"""
         return {
-            'total_unread': total_unread,
-            'conversations_with_unread': conversations_with_unread
+            'total_unread': obj.total_unread,
+            'conversations_with_unread': obj.conversations_with_unread
         }
     
     def get_first_unread_message(self, obj):
         """Get the first unread message from this contact"""
-        current_user_id = self.context.get('current_user_id')
-        if not current_user_id:
-            return None
-        
-        conversation_ids = obj.conversations.values_list('id', flat=True)
-        
-        # Get read message IDs
-        read_message_ids = MessageReadStatus.objects.filter(
-            user_id=current_user_id,
-            message__conversation_id__in=conversation_ids
-        ).values_list('message_id', flat=True)
-        
-        # Get first unread message
-        first_unread = Message.objects.filter(
-            conversation_id__in=conversation_ids,
-            sender_type='customer'
-        ).exclude(id__in=read_message_ids).order_by('created_at').first()
-        
-        if not first_unread:
+        first_unread = obj.first_unread_data
+        if not self.context.get('current_user_id') or not first_unread:
             return None
         
-        content = getattr(first_unread, 'content_decrypted', '') or ''
+        content = first_unread.get('content') or ''
         return {
-            'id': first_unread.id,
+            'id': first_unread['id'],
             'content': content[:200] + ('...' if len(content) > 200 else ''),
-            'conversation_id': first_unread.conversation_id,
-            'created_at': first_unread.created_at,
-            'message_type': first_unread.message_type
-        }
\ No newline at end of file
+            'conversation_id': first_unread['conversation_id'],
+            'created_at': obj.first_unread_created_at,
+            'message_type': first_unread['message_type']
+        }
+
+
+def _last_conversation():
+    """The contact's most recently active conversation, for correlated subqueries"""
+    return Conversation.objects.filter(
+        customer_id=OuterRef('pk')
+    ).order_by(F('last_message_at').desc(nulls_last=True))
+
+
+def _last_message():
+    """Latest message of the annotated last_conversation_id"""
+    return Message.objects.filter(
+        conversation_id=OuterRef('last_conversation_id')
+    ).order_by('-created_at')
+
+
+def _unread_counters(current_user_id):
+    """The user's unread counters of the contact, grouped for aggregation"""
+    return UnreadCounter.objects.filter(
+        conversation__customer_id=OuterRef('pk'),
+        user_id=current_user_id,
+        unread_count__gt=0
+    ).order_by().values('conversation__customer_id')
+
+
+def annotate_contact_previews(contacts, current_user_id=None):
+    """
+    Annotate contacts with everything ContactListSerializer needs, so a page
+    of contacts is one query (plus the label prefetch) regardless of its size.
+    """
+    last_conversation = _last_conversation()
+    last_message = _last_message()
+    
+    contacts = contacts.annotate(
+        last_conversation_id=Subquery(last_conversation.values('id')[:1])
+    ).annotate(
+        last_conversation_data=Subquery(last_conversation.values(
+            data=JSONObject(
+                id='id',
+                subject='subject',
+                status='status',
+                last_message_at='last_message_at'
+            )
+        )[:1]),
+        last_message_data=Subquery(last_message.values(
+            data=JSONObject(
+                content='content_encrypted',
+                sender_type='sender_type',
+                message_type='message_type',
+                attachments='attachments'
+            )
+        )[:1]),
+        last_message_created_at=Subquery(last_message.values('created_at')[:1]),
+        last_conversation_read_at=Subquery(
+            ConversationReadCursor.objects.filter(
+                conversation_id=OuterRef('last_conversation_id'),
+                user_id=current_user_id
+            ).values('last_read_at')[:1]
+        ),
+        last_conversation_unread_count=Coalesce(
+            Subquery(
+                UnreadCounter.objects.filter(
+                    conversation_id=OuterRef('last_conversation_id'),
+                    user_id=current_user_id
+                ).values('unread_count')[:1]
+            ),
+            0
+        )
+    )
+    
+    return contacts.prefetch_related(
+        Prefetch('labels', queryset=CustomerLabel.objects.select_related('label'))
+    )
+
+
+def annotate_recent_contacts(contacts, current_user_id=None):
+    """Annotate contacts with what RecentContactSerializer reads: unread total and last message"""
+    last_message = _last_message()
+    
+    return contacts.annotate(
+        last_conversation_id=Subquery(_last_conversation().values('id')[:1])
+    ).annotate(
+        last_message_data=Subquery(last_message.values(
+            data=JSONObject(
+                content='content_encrypted',
+                sender_type='sender_type',
+                message_type='message_type'
+            )
+        )[:1]),
+        last_message_created_at=Subquery(last_message.values('created_at')[:1]),
+        unread_count=Coalesce(
+            Subquery(_unread_counters(current_user_id).annotate(
+                total=Sum('unread_count')
+            ).values('total')[:1]),
+            0
+        )
+    )
+
+
+def annotate_unread_contacts(contacts, current_user_id):
+    """Annotate contacts with what UnreadContactSerializer reads, from the unread counters"""
+    first_unread = unread_messages(
+        current_user_id,
+        Message.objects.filter(conversation__customer_id=OuterRef('pk'), sender_type='customer')
+    ).order_by('created_at')
+    counters = _unread_counters(current_user_id)
+    
+    return contacts.annotate(
+        total_unread=Coalesce(
+            Subquery(counters.annotate(total=Sum('unread_count')).values('total')[:1]),
+            0
+        ),
+        conversations_with_unread=Coalesce(
+            Subquery(counters.annotate(total=Count('id')).values('total')[:1]),
+            0
+        ),
+        first_unread_data=Subquery(first_unread.values(
+            data=JSONObject(
+                id='id',
+                content='content_encrypted',
+                conversation_id='conversation_id',
+                message_type='message_type'
+            )
+        )[:1]),
+        first_unread_created_at=Subquery(first_unread.values('created_at')[:1])
+    )
@@ -1,3 +1,48 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from conversations.tests import create_conversation, create_tenant_setup
+
+from . import views
+
+
+class ContactsQueryCountTests(TestCase):
+    """
+    The contacts endpoints run a fixed number of queries, however many
+    contacts they return.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant, cls.account, (cls.user,) = create_tenant_setup()
+        cls.factory = APIRequestFactory()
+
+    def _get(self, view):
+        request = self.factory.get('/')
+        request.user_id = self.user.id
+        force_authenticate(request, user=self.user)
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def _assert_constant_queries(self, view):
+        create_conversation(self.tenant, self.account)
+        with CaptureQueriesContext(connection) as queries:
+            self._get(view)
+
+        for _ in range(5):
+            create_conversation(self.tenant, self.account, messages=3)
+        with self.assertNumQueries(len(queries)):
+            response = self._get(view)
+        self.assertEqual(len(response.data['contacts']), 6)
+
+    def test_contacts_list(self):
+        self._assert_constant_queries(views.contacts_list)
+
+    def test_contacts_recent(self):
+        self._assert_constant_queries(views.contacts_recent)
+
+    def test_contacts_unread(self):
+        self._assert_constant_queries(views.contacts_unread)
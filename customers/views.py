@@ -10,17 +10,23 @@ from .serializers import (
     CustomerListSerializer, CustomerDetailSerializer,
     CustomerCreateUpdateSerializer, ConversationListSerializer
 )
-from django.db.models import Count, Q, Max, Prefetch, Exists, OuterRef
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
 
 from .models import Customer, ContactLabel
-from conversations.models import Conversation, Message, MessageReadStatus
+from conversations.models import Conversation
+from conversations.search import contact_search_filter
+from conversations.unread_counters import unread_counters, unread_totals
 from .serializers import (
     ContactsListResponseSerializer, ContactListSerializer, RecentContactSerializer,
-    UnreadContactSerializer, ContactSummarySerializer
+    UnreadContactSerializer, ContactSummarySerializer, annotate_contact_previews,
+    annotate_recent_contacts, annotate_unread_contacts
 )
+from .presence import presence
+from core.pagination import InvalidCursor, KeysetPagination, cached_count, wants_offset_pagination, wants_total
 from core.utils import get_tenant_from_user
+from core.replicas import replica_reads
 
 @api_view(['GET', 'POST'])
 def customer_list_create(request):
@@ -128,6 +134,7 @@ def customer_conversations(request, customer_id):
 
 
 @api_view(['GET'])
+@replica_reads
 def contacts_list(request):
     """
     GET /api/contacts - Get contacts list with latest message preview and unread counts
@@ -137,28 +144,19 @@ def contacts_list(request):
         return error_response
     current_user_id = getattr(request, 'user_id', None)
     
-    # Base queryset with optimizations
+    # Base queryset; previews are annotated on the page only
     contacts = Customer.objects.filter(
         tenant_id=tenant_id,
         is_archived=False
     ).select_related(
         'platform'
-    ).prefetch_related(
-        'customerlabel_set__label',
-        Prefetch(
-            'conversations',
-            queryset=Conversation.objects.select_related().order_by('-last_message_at')
-        )
     )
     
     # Apply filters
     search = request.GET.get('search')
     if search:
-        contacts = contacts.filter(
-            Q(platform_username__icontains=search) |
-            Q(platform_display_name__icontains=search) |
-            Q(email_encrypted__icontains=search)  # This would need proper search on encrypted fields
-        )
+        # Trigram-indexed match on username, display name and email
+        contacts = contacts.filter(contact_search_filter(search))
     
     # Filter by platform
     platform = request.GET.get('platform')
@@ -168,10 +166,9 @@ def contacts_list(request):
     # Filter by status
     contact_status = request.GET.get('status')
     if contact_status == 'online':
-        five_minutes_ago = timezone.now() - timedelta(minutes=5)
-        contacts = contacts.filter(last_seen_at__gte=five_minutes_ago)
+        contacts = contacts.filter(id__in=presence.online_customer_ids(tenant_id))
     elif contact_status == 'typing':
-        contacts = contacts.filter(is_typing=True)
+        contacts = contacts.filter(id__in=presence.typing_customer_ids(tenant_id))
     elif contact_status == 'pinned':
         contacts = contacts.filter(is_pinned=True)
     
@@ -180,7 +177,7 @@ def contacts_list(request):
     if labels:
         label_list = [label.strip() for label in labels.split(',')]
         contacts = contacts.filter(
-            customerlabel_set__label__name__in=label_list
+            labels__label__name__in=label_list
         ).distinct()
     
     # Filter by engagement score
@@ -195,17 +192,8 @@ def contacts_list(request):
     has_unread = request.GET.get('has_unread')
     if has_unread and has_unread.lower() in ('true', '1', 'yes') and current_user_id:
         # Subquery to check for unread messages
-        unread_messages_exist = Message.objects.filter(
-            conversation__customer_id=OuterRef('id'),
-            sender_type='customer'
-        ).exclude(
-            id__in=MessageReadStatus.objects.filter(
-                user_id=current_user_id
-            ).values_list('message_id', flat=True)
-        )
-        
         contacts = contacts.filter(
-            Exists(unread_messages_exist)
+            id__in=unread_counters(tenant_id, current_user_id).values('conversation__customer_id')
         )
     
     # Sorting
@@ -219,26 +207,47 @@ def contacts_list(request):
     ]
     
     if sort_by in valid_sort_fields:
-        contacts = contacts.order_by(sort_by)
+        ordering = (sort_by,)
     elif sort_by == 'unread_count' and current_user_id:
         # Custom sorting by unread count (complex, would need raw SQL for efficiency)
-        contacts = contacts.order_by('-last_contact_at')  # Fallback
+        ordering = ('-last_contact_at',)  # Fallback
     else:
         # Default: pinned first, then by last contact
-        contacts = contacts.order_by('-is_pinned', '-last_contact_at')
+        ordering = ('-is_pinned', '-last_contact_at')
     
-    # Pagination
+    # Pagination: keyset on the sort key plus id unless the client sends an offset
     limit = min(int(request.GET.get('limit', 50)), 100)
     offset = int(request.GET.get('offset', 0))
+    next_cursor = None
     
-    total_count = contacts.count()
-    paginated_contacts = contacts[offset:offset + limit]
+    if wants_offset_pagination(request):
+        contacts = contacts.order_by(*ordering)
+        total_count = contacts.count()
+        paginated_contacts = list(
+            annotate_contact_previews(contacts, current_user_id)[offset:offset + limit]
+        )
+        has_more = (offset + limit) < total_count
+    else:
+        keyset = KeysetPagination(ordering + ('-id',), limit=limit)
+        try:
+            paginated_contacts, next_cursor = keyset.paginate(
+                annotate_contact_previews(contacts, current_user_id),
+                request.GET.get('cursor')
+            )
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        total_count = cached_count(contacts) if wants_total(request) else None
+        has_more = next_cursor is not None
     
     # Serialize contacts
     contact_serializer = ContactListSerializer(
         paginated_contacts,
         many=True,
-        context={'current_user_id': current_user_id}
+        context={
+            'current_user_id': current_user_id,
+            'presence_statuses': presence.statuses(paginated_contacts),
+            'presence_last_seen': presence.last_seen(paginated_contacts)
+        }
     )
     
     # Calculate summary statistics
@@ -261,9 +270,10 @@ def contacts_list(request):
         'pagination': {
             'limit': limit,
             'offset': offset,
-            'has_more': (offset + limit) < total_count,
-            'total_pages': (total_count + limit - 1) // limit,
-            'current_page': (offset // limit) + 1
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'total_pages': (total_count + limit - 1) // limit if total_count is not None else None,
+            'current_page': (offset // limit) + 1 if wants_offset_pagination(request) else None
         }
     }
     
@@ -296,12 +306,7 @@ def contacts_recent(request):
         Q(conversations__last_message_at__gte=cutoff_time)
     ).select_related(
         'platform'
-    ).prefetch_related(
-        Prefetch(
-            'conversations',
-            queryset=Conversation.objects.order_by('-last_message_at')
-        )
-    ).distinct().order_by('-last_contact_at', '-last_seen_at')
+    ).distinct()
     
     # Apply additional filters
     platform = request.GET.get('platform')
@@ -315,12 +320,27 @@ def contacts_recent(request):
         except ValueError:
             pass
     
-    # Pagination
+    # Pagination: keyset on (last_contact_at, id) unless the client sends an offset
     limit = min(int(request.GET.get('limit', 20)), 50)
     offset = int(request.GET.get('offset', 0))
+    next_cursor = None
     
-    total_count = recent_contacts.count()
-    paginated_contacts = recent_contacts[offset:offset + limit]
+    if wants_offset_pagination(request):
+        recent_contacts = recent_contacts.order_by('-last_contact_at', '-last_seen_at')
+        total_count = recent_contacts.count()
+        paginated_contacts = annotate_recent_contacts(recent_contacts, current_user_id)[offset:offset + limit]
+        has_more = (offset + limit) < total_count
+    else:
+        keyset = KeysetPagination(('-last_contact_at', '-id'), limit=limit)
+        try:
+            paginated_contacts, next_cursor = keyset.paginate(
+                annotate_recent_contacts(recent_contacts, current_user_id),
+                request.GET.get('cursor')
+            )
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        total_count = cached_count(recent_contacts) if wants_total(request) else None
+        has_more = next_cursor is not None
     
     # Serialize
     serializer = RecentContactSerializer(
@@ -340,7 +360,8 @@ def contacts_recent(request):
         'pagination': {
             'limit': limit,
             'offset': offset,
-            'has_more': (offset + limit) < total_count
+            'has_more': has_more,
+            'next_cursor': next_cursor
         }
     }
     
@@ -369,18 +390,9 @@ def contacts_unread(request):
         is_archived=False
     ).filter(
         # Has messages that current user hasn't read
-        conversations__messages__sender_type='customer'
-    ).exclude(
-        conversations__messages__id__in=MessageReadStatus.objects.filter(
-            user_id=current_user_id
-        ).values_list('message_id', flat=True)
+        id__in=unread_counters(tenant_id, current_user_id).values('conversation__customer_id')
     ).select_related(
         'platform'
-    ).prefetch_related(
-        Prefetch(
-            'conversations',
-            queryset=Conversation.objects.order_by('-last_message_at')
-        )
     ).distinct()
     
     # Apply filters
@@ -404,7 +416,7 @@ def contacts_unread(request):
     offset = int(request.GET.get('offset', 0))
     
     total_count = unread_contacts.count()
-    paginated_contacts = unread_contacts[offset:offset + limit]
+    paginated_contacts = annotate_unread_contacts(unread_contacts, current_user_id)[offset:offset + limit]
     
     # Serialize
     serializer = UnreadContactSerializer(
@@ -414,14 +426,7 @@ def contacts_unread(request):
     )
     
     # Calculate unread summary
-    total_unread_messages = Message.objects.filter(
-        conversation__customer__tenant_id=tenant_id,
-        sender_type='customer'
-    ).exclude(
-        id__in=MessageReadStatus.objects.filter(
-            user_id=current_user_id
-        ).values_list('message_id', flat=True)
-    ).count()
+    total_unread_messages = unread_totals(tenant_id, current_user_id)['total_unread_messages']
     
     response_data = {
         'contacts': serializer.data,
@@ -462,11 +467,10 @@ def _calculate_contacts_summary(tenant_id, current_user_id):
     ).count()
     
     # Online contacts (active in last 5 minutes)
-    five_minutes_ago = timezone.now() - timedelta(minutes=5)
     online_contacts = Customer.objects.filter(
         tenant_id=tenant_id,
         is_archived=False,
-        last_seen_at__gte=five_minutes_ago
+        id__in=presence.online_customer_ids(tenant_id)
     ).count()
     
     # Recent contacts (active in last 24 hours)
@@ -484,26 +488,10 @@ def _calculate_contacts_summary(tenant_id, current_user_id):
     total_unread_messages = 0
     
     if current_user_id:
-        # Get contacts with unread messages
-        contacts_with_unread = Customer.objects.filter(
-            tenant_id=tenant_id,
-            is_archived=False,
-            conversations__messages__sender_type='customer'
-        ).exclude(
-            conversations__messages__id__in=MessageReadStatus.objects.filter(
-                user_id=current_user_id
-            ).values_list('message_id', flat=True)
-        ).distinct().count()
-        
-        # Total unread messages
-        total_unread_messages = Message.objects.filter(
-            conversation__customer__tenant_id=tenant_id,
-            sender_type='customer'
-        ).exclude(
-            id__in=MessageReadStatus.objects.filter(
-                user_id=current_user_id
-            ).values_list('message_id', flat=True)
-        ).count()
+        # Served from the materialized unread counters
+        unread = unread_totals(tenant_id, current_user_id, customer__is_archived=False)
+        contacts_with_unread = unread['contacts_with_unread']
+        total_unread_messages = unread['total_unread_messages']
     
     return {
         'total_contacts': total_contacts,
@@ -512,4 +500,4 @@ def _calculate_contacts_summary(tenant_id, current_user_id):
         'pinned_contacts': pinned_contacts,
         'online_contacts': online_contacts,
         'recent_contacts_24h': recent_contacts_24h
-    }
\ No newline at end of file
+    }
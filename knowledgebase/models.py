@@ -277,7 +277,7 @@ class KnowledgeRetrievalLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='knowledge_retrieval_logs')
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='knowledge_retrieval_logs')
-    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='knowledge_retrieval_logs')
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='knowledge_retrieval_logs', db_constraint=False)
     query_text = models.TextField()
     query_embedding = ArrayField(models.FloatField(), size=None)
     retrieved_chunks = models.JSONField(default=list)
@@ -287,7 +287,7 @@ class KnowledgeRetrievalLog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = 'knowledge_retrieval_logs'
+        db_table = 'knowledge_retrieval_logs'  # partitioned by month on created_at
 
     def __str__(self):
         return f"{self.tenant.business_name} - {self.conversation.id} - {self.chunks_used_count} chunks"
\ No newline at end of file
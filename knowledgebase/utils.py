@@ -1,18 +1,14 @@
 # knowledge_base/utils.py
-import asyncio
 import json
 import time
 import hashlib
 from typing import List, Dict, Optional
-from openai import OpenAI
-from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
+from ai.embeddings import embedding_service
+from ai.rate_limits import BULK
 from .models import KnowledgeBaseDocument, DocumentChunk, DocumentEmbedding
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 
 class DocumentProcessor:
     """Handle JSON document processing, chunking, and embedding generation"""
@@ -121,9 +117,6 @@ class DocumentProcessor:
                 except Exception as e:
                     failed_embeddings += 1
                     print(f"Error creating embedding for chunk {chunk.chunk_index}: {str(e)}")
-                
-                # Small delay to avoid rate limiting
-                await asyncio.sleep(0.1)
             
             # Update document status
             if failed_embeddings == 0:
@@ -246,28 +239,12 @@ class DocumentProcessor:
         return "\n".join(lines)
     
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate embedding for text with retry logic"""
-        print("------250------")
-        for attempt in range(self.max_retries):
-            try:
-                response = openai_client.embeddings.create(
-                    input=text,
-                    model=self.embedding_model
-                )
-                return response.data[0].embedding
-            
-            except Exception as e:
-                if "rate_limit" in str(e).lower():
-                    wait_time = min(2 ** attempt, 60)  # Exponential backoff, max 60s
-                    print(f"Rate limit hit. Waiting {wait_time}s before retry {attempt + 1}/{self.max_retries}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"Error generating embedding on attempt {attempt + 1}: {str(e)}")
-                    if attempt == self.max_retries - 1:
-                        return None
-                    await asyncio.sleep(1)
-        
-        return None
+        """Generate embedding for text; retries and rate limits are handled by the embedding service"""
+        try:
+            return await embedding_service.embed(text, self.embedding_model, priority=BULK)
+        except Exception as e:
+            print(f"Error generating embedding: {str(e)}")
+            return None
     
     async def generate_embeddings_for_document(self, document: KnowledgeBaseDocument,
                                              regenerate_embeddings: bool = False) -> Dict:
@@ -316,9 +293,6 @@ class DocumentProcessor:
                 else:
                     failed_embeddings += 1
                 
-                # Small delay to avoid rate limiting
-                await asyncio.sleep(0.1)
-                
             except Exception as e:
                 failed_embeddings += 1
                 print(f"Error creating embedding for chunk {chunk.chunk_index}: {str(e)}")
@@ -19,6 +19,7 @@
 # )
 # from .utils import DocumentProcessor
 # from .auth_utils import get_tenant_from_user, get_user_id_from_request
+from core.replicas import replica_reads
 # import asyncio
 # import json
 # import os
@@ -820,6 +821,7 @@ def document_chunks(request, document_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def processing_status(request):
     """Get processing status for all documents"""
     tenant_id, error_response = get_tenant_from_user(request)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',  # Add this
     'leads',
@@ -54,17 +56,58 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'korraai.asgi.application'
 
-# Use in-memory channel layer (no Redis needed)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# Redis channel layer so group_send reaches consumers in every Daphne process.
+# Without REDIS_URL we fall back to the in-memory layer (single process only).
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            # channels_redis serializes payloads with msgpack
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [{
+                    'address': REDIS_URL,
+                    # Connection pool per event loop
+                    'max_connections': int(os.getenv('CHANNEL_LAYER_MAX_CONNECTIONS', '50')),
+                    'health_check_interval': 30,
+                    'socket_keepalive': True,
+                }],
+                'prefix': os.getenv('CHANNEL_LAYER_PREFIX', 'korraai'),
+                # Messages not received within this many seconds are dropped
+                'expiry': int(os.getenv('CHANNEL_LAYER_EXPIRY', '30')),
+                # Group memberships of dead consumers expire after this
+                'group_expiry': int(os.getenv('CHANNEL_LAYER_GROUP_EXPIRY', '86400')),
+                # Per-channel buffer before ChannelFull is raised
+                'capacity': int(os.getenv('CHANNEL_LAYER_CAPACITY', '1500')),
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
+    }
+
+# Django cache shared by every process: cached auth principals and their
+# invalidation, replica stickiness, cached counts. Without a Redis URL the
+# cache is per process and features that need it shared stay off.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', REDIS_URL)
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'korraai',
+        }
     }
-}
 
 # Update REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # Use JWT
+        'tenants.authentication.TenantJWTAuthentication',  # JWT with tenant checks and cached principals
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -77,6 +120,11 @@ REST_FRAMEWORK = {
 # JWT Configuration
 from datetime import timedelta
 
+# Validated JWT principals are cached per user and token. Saving a user or
+# tenant invalidates them in the shared cache; without one (no CACHE_REDIS_URL)
+# principals are not cached at all.
+AUTH_PRINCIPAL_CACHE_SECONDS = int(os.getenv('AUTH_PRINCIPAL_CACHE_SECONDS', '60'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -120,6 +168,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'conversations.middleware.NotificationBatchMiddleware',
+    'core.replicas.ReplicaStickinessMiddleware',
+    'conversations.middleware.AgentPresenceMiddleware',
 ]
 
 ROOT_URLCONF = 'korraai.urls'
@@ -155,20 +206,67 @@ WSGI_APPLICATION = 'korraai.wsgi.application'
 #         'PORT': '5432',       # default PostgreSQL port
 #     }
 # }
-DATABASES = {
-    'default': {
+# Database connections. With DB_POOL each worker process keeps a psycopg
+# connection pool, so database_sync_to_async hops reuse connections instead
+# of opening new ones; keep workers * DB_POOL_MAX_SIZE below max_connections.
+# Without it, connections persist for DB_CONN_MAX_AGE seconds.
+# Set DB_PGBOUNCER when connecting through PgBouncer in transaction mode.
+DB_POOL = os.getenv('DB_POOL', 'true').lower() == 'true'
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+
+def database_settings(prefix='DB'):
+    """Connection settings for one alias, read from <prefix>_* variables with DB_* as fallback"""
+    # Connections use READ COMMITTED; operations that need SERIALIZABLE ask
+    # for it through core.transactions.run_serializable
+    options = {}
+    if DB_POOL:
+        options['pool'] = {
+            'min_size': int(os.getenv(f'{prefix}_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv(f'{prefix}_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv(f'{prefix}_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.getenv(f'{prefix}_POOL_MAX_IDLE', '300')),
+            'max_lifetime': float(os.getenv(f'{prefix}_POOL_MAX_LIFETIME', '1800')),
+        }
+    if DB_PGBOUNCER:
+        # Prepared statements don't survive PgBouncer's transaction mode
+        options['prepare_threshold'] = None
+
+    return {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('DB_NAME', 'django_crm_db'),
-        'USER': os.getenv('DB_USER', 'django_user'),
-        'PASSWORD': os.getenv('DB_PASSWORD', 'django_secure_password_2024'),
-        'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', '5433'),
-        'OPTIONS': {
-            'options': '-c default_transaction_isolation=serializable'
-        },
+        'NAME': os.getenv(f'{prefix}_NAME', os.getenv('DB_NAME', 'django_crm_db')),
+        'USER': os.getenv(f'{prefix}_USER', os.getenv('DB_USER', 'django_user')),
+        'PASSWORD': os.getenv(f'{prefix}_PASSWORD', os.getenv('DB_PASSWORD', 'django_secure_password_2024')),
+        'HOST': os.getenv(f'{prefix}_HOST', os.getenv('DB_HOST', 'localhost')),
+        'PORT': os.getenv(f'{prefix}_PORT', os.getenv('DB_PORT', '5433')),
+        # The pool manages connection lifetime itself
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        # Pooled and persistent connections are checked before reuse
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': options,
     }
+
+
+DATABASES = {
+    'default': database_settings('DB'),
 }
 
+# Optional read replica for heavy dashboard/analytics reads (core.replicas).
+# Pointing REPLICA_DB_HOST at the primary gives a single-instance stand-in.
+if os.getenv('REPLICA_DB_HOST'):
+    DATABASES['replica'] = {
+        **database_settings('REPLICA_DB'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# After a user writes, their reads stay on the primary for this long
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+# Replicas lagging further behind than this are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '2'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -214,3 +312,92 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 LLM_MODEL = os.getenv('LLM_MODEL', 'openai/gpt-4o-mini')
+
+# Real-time notifications are collected per request/transaction and flushed
+# to the channel layer in batches after this delay
+NOTIFICATION_DISPATCH_WINDOW_MS = int(os.getenv('NOTIFICATION_DISPATCH_WINDOW_MS', '25'))
+
+# AI replies are generated by a bounded pool of RAG workers per process
+RAG_WORKER_CONCURRENCY = int(os.getenv('RAG_WORKER_CONCURRENCY', '4'))
+RAG_QUEUE_SIZE = int(os.getenv('RAG_QUEUE_SIZE', '200'))
+
+# Retrieval/usage logs are buffered and bulk-inserted every N rows or T ms.
+# Only a sampled share of retrieval logs keeps the 1536-float query embedding.
+LOG_WRITER_BATCH_SIZE = int(os.getenv('LOG_WRITER_BATCH_SIZE', '200'))
+LOG_WRITER_FLUSH_MS = int(os.getenv('LOG_WRITER_FLUSH_MS', '1000'))
+LOG_WRITER_QUEUE_SIZE = int(os.getenv('LOG_WRITER_QUEUE_SIZE', '10000'))
+RETRIEVAL_LOG_EMBEDDING_SAMPLE_RATE = float(os.getenv('RETRIEVAL_LOG_EMBEDDING_SAMPLE_RATE', '1.0'))
+
+# Customer presence (online/typing). Uses Redis when available so every
+# process sees the same state; last_seen_at is flushed to Postgres in bulk.
+PRESENCE_REDIS_URL = os.getenv('PRESENCE_REDIS_URL', REDIS_URL)
+PRESENCE_TYPING_TTL = int(os.getenv('PRESENCE_TYPING_TTL', '10'))
+PRESENCE_FLUSH_INTERVAL = int(os.getenv('PRESENCE_FLUSH_INTERVAL', '60'))
+
+# Identical search requests (e.g. undebounced keystrokes) are served from cache
+SEARCH_CACHE_SECONDS = int(os.getenv('SEARCH_CACHE_SECONDS', '5'))
+
+# Monthly partitions of messages and AI logs (manage.py manage_partitions, run daily)
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+MESSAGE_ARCHIVE_AFTER_MONTHS = int(os.getenv('MESSAGE_ARCHIVE_AFTER_MONTHS', '12'))
+LOG_RETENTION_MONTHS = int(os.getenv('LOG_RETENTION_MONTHS', '6'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# Incremental analytics rollups (manage.py run_rollups, every few minutes).
+# Events younger than the lag are picked up by the next run.
+ANALYTICS_ROLLUP_LAG_SECONDS = int(os.getenv('ANALYTICS_ROLLUP_LAG_SECONDS', '120'))
+
+# Handover assignment (conversations.assignment): least_loaded or round_robin.
+# Agents count as online for the window after their last API request; load
+# is reconciled from the database by manage.py rebuild_agent_load.
+AGENT_ASSIGNMENT_REDIS_URL = os.getenv('AGENT_ASSIGNMENT_REDIS_URL', REDIS_URL)
+AGENT_ASSIGNMENT_STRATEGY = os.getenv('AGENT_ASSIGNMENT_STRATEGY', 'least_loaded')
+AGENT_MAX_OPEN_CONVERSATIONS = int(os.getenv('AGENT_MAX_OPEN_CONVERSATIONS', '20'))
+AGENT_ONLINE_WINDOW_SECONDS = int(os.getenv('AGENT_ONLINE_WINDOW_SECONDS', '300'))
+# Unread customer messages that weigh as much as one open conversation
+AGENT_BACKLOG_PER_CONVERSATION = int(os.getenv('AGENT_BACKLOG_PER_CONVERSATION', '10'))
+
+# Rolling conversation summaries (conversations.summaries): the last N messages
+# are kept per conversation. Set EVERY_MESSAGES to have an LLM fold each batch
+# of that many new messages into a running summary (0 disables it).
+CONVERSATION_SUMMARY_RECENT_MESSAGES = int(os.getenv('CONVERSATION_SUMMARY_RECENT_MESSAGES', '20'))
+CONVERSATION_SUMMARY_EVERY_MESSAGES = int(os.getenv('CONVERSATION_SUMMARY_EVERY_MESSAGES', '0'))
+CONVERSATION_SUMMARY_MODEL = os.getenv('CONVERSATION_SUMMARY_MODEL', LLM_MODEL)
+
+# Prompt token budgets (ai.prompting). TenantAISetting.prompt_token_budget
+# overrides the default; knowledge chunks leave HISTORY_SHARE of it to history.
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+PROMPT_HISTORY_SHARE = float(os.getenv('PROMPT_HISTORY_SHARE', '0.2'))
+PROMPT_ANALYSIS_HISTORY_TOKENS = int(os.getenv('PROMPT_ANALYSIS_HISTORY_TOKENS', '1500'))
+
+# Embeddings (ai.embeddings) share one async OpenAI client per process
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '8'))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', '4'))
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv('EMBEDDING_TIMEOUT_SECONDS', '30'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '100'))
+
+# Client-side LLM/embedding rate limits (ai.rate_limits), per provider/model
+# and API key, e.g. LLM_RATE_LIMITS='{"openai/gpt-4o-mini": {"rpm": 5000, "tpm": 2000000}}'.
+# Bulk work (ingestion, summaries) leaves BULK_RESERVE of each bucket to live chat.
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', REDIS_URL)
+LLM_RATE_LIMITS = json.loads(os.getenv('LLM_RATE_LIMITS', '{}'))
+LLM_DEFAULT_RPM = int(os.getenv('LLM_DEFAULT_RPM', '500'))
+LLM_DEFAULT_TPM = int(os.getenv('LLM_DEFAULT_TPM', '200000'))
+LLM_RATE_LIMIT_BULK_RESERVE = float(os.getenv('LLM_RATE_LIMIT_BULK_RESERVE', '0.2'))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv('LLM_RATE_LIMIT_RETRIES', '3'))
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv('LLM_COMPLETION_TOKEN_ESTIMATE', '500'))
+
+# Model routing (ai.llm). TenantAISetting.primary_model/fallback_models
+# override these. A model slower than its p95 is hedged with the next one;
+# repeated failures open its circuit for the cooldown.
+LLM_FALLBACK_MODELS = [m for m in os.getenv('LLM_FALLBACK_MODELS', '').split(',') if m]
+LLM_PROVIDER_API_KEYS = json.loads(os.getenv('LLM_PROVIDER_API_KEYS', '{}'))
+LLM_MODEL_API_BASES = json.loads(os.getenv('LLM_MODEL_API_BASES', '{}'))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv('LLM_REQUEST_TIMEOUT_SECONDS', '60'))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.getenv('LLM_HEDGE_DEFAULT_SECONDS', '5'))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv('LLM_HEDGE_MIN_SECONDS', '1'))
+LLM_ROUTER_WINDOW = int(os.getenv('LLM_ROUTER_WINDOW', '100'))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv('LLM_ROUTER_MIN_SAMPLES', '20'))
+LLM_CIRCUIT_FAILURES = int(os.getenv('LLM_CIRCUIT_FAILURES', '5'))
+LLM_CIRCUIT_COOLDOWN_SECONDS = int(os.getenv('LLM_CIRCUIT_COOLDOWN_SECONDS', '30'))
@@ -24,7 +24,7 @@ urlpatterns = [
     path('api/', include('conversations.urls', namespace='conversations')),
     path('api/', include('platforms.urls', namespace='platforms')),
     path('api/', include('tenants.urls', namespace='tenants')),
-    # path('api/', include('analytics.urls', namespace='analytics')),
+    path('api/', include('analytics.urls', namespace='analytics')),
     path('api/', include('ai.urls', namespace='ai')),
     path('api/', include('knowledgebase.urls', namespace='knowledgebase')),
 
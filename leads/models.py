@@ -72,6 +72,10 @@ class Lead(models.Model):
 
     class Meta:
         db_table = 'leads'
+        indexes = [
+            # Change detection for the incremental analytics rollup
+            models.Index(fields=['updated_at'], name='leads_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.customer}"
\ No newline at end of file
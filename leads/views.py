@@ -4,6 +4,7 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from core.replicas import replica_reads
 from .models import LeadStage, LeadCategory, Lead
 from .serializers import (
     LeadCategoryListSerializer, LeadCategoryDetailSerializer,
@@ -13,6 +14,7 @@ from .serializers import (
 
 
 @api_view(['GET', 'POST'])
+@replica_reads
 def lead_stage_list_create(request):
     """
     GET /api/lead-stages - List all lead stages
@@ -115,6 +117,7 @@ def lead_stage_detail(request, stage_id):
 
 
 @api_view(['GET', 'POST'])
+@replica_reads
 def lead_category_list_create(request):
     """
     GET /api/lead-categories - List all lead categories
@@ -233,6 +236,7 @@ def lead_category_detail(request, category_id):
 
 
 @api_view(['GET', 'POST'])
+@replica_reads
 def lead_list_create(request):
     """
     GET /api/leads - List all leads
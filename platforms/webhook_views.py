@@ -529,6 +529,7 @@ from django.views.decorators.http import require_http_methods, require_GET, requ
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync, sync_to_async
@@ -536,9 +537,12 @@ from asgiref.sync import async_to_sync, sync_to_async
 from .models import SocialPlatform, TenantPlatformAccount
 from tenants.models import Tenant
 from customers.models import Customer
-from conversations.models import Conversation, Message
+from conversations.models import Conversation, ExternalMessageKey, Message
 from conversations.notification_utils import DashboardNotifier
+from conversations.utils import HandoverManager
 from ai.models import TenantAISetting
+from ai.rag_service import rag_service
+from core.transactions import run_serializable
 import uuid
 import logging
 import requests
@@ -645,16 +649,27 @@ class FacebookWebhookView(View):
                 customer,
                 timestamp
             )
+            if user_message is None:
+                logger.info(f"Skipping redelivered message {message_id}")
+                return
             
             # Send real-time notification
             DashboardNotifier.notify_new_message(user_message, conversation)
             
-            should_ai_handle = await self._should_ai_handle_conversation(conversation)
-            
+            ai_settings = await self._get_ai_settings(conversation)
+            should_ai_handle = self._should_ai_handle_conversation(conversation, ai_settings)
             if should_ai_handle:
-                await self._send_to_rag_processor(conversation.id, message_text)
-            else:
-                await self._notify_human_agents(conversation.id, user_message)
+                # Escalations and agent requests go to an agent instead of the AI
+                handover, reason = await HandoverManager.should_trigger_handover(
+                    conversation, message_text, ai_settings=ai_settings
+                )
+                if handover and await HandoverManager.initiate_handover(conversation, reason):
+                    should_ai_handle = False
+            
+            if should_ai_handle and await self._send_to_rag_processor(conversation.id, message_text, user_message.id):
+                return
+            # Agents handle it, or no AI reply is coming because the AI queue is full
+            await self._notify_human_agents(conversation.id, user_message)
                 
         except Exception as e:
             logger.error(f"Error processing Facebook message: {e}")
@@ -746,16 +761,27 @@ class WhatsAppWebhookView(View):
                 customer,
                 timestamp
             )
+            if user_message is None:
+                logger.info(f"Skipping redelivered message {message_id}")
+                return
             
             # Send real-time notification
             DashboardNotifier.notify_new_message(user_message, conversation)
             
-            should_ai_handle = await self._should_ai_handle_conversation(conversation)
-            
+            ai_settings = await self._get_ai_settings(conversation)
+            should_ai_handle = self._should_ai_handle_conversation(conversation, ai_settings)
             if should_ai_handle:
-                await self._send_to_rag_processor(conversation.id, message_text)
-            else:
-                await self._notify_human_agents(conversation.id, user_message)
+                # Escalations and agent requests go to an agent instead of the AI
+                handover, reason = await HandoverManager.should_trigger_handover(
+                    conversation, message_text, ai_settings=ai_settings
+                )
+                if handover and await HandoverManager.initiate_handover(conversation, reason):
+                    should_ai_handle = False
+            
+            if should_ai_handle and await self._send_to_rag_processor(conversation.id, message_text, user_message.id):
+                return
+            # Agents handle it, or no AI reply is coming because the AI queue is full
+            await self._notify_human_agents(conversation.id, user_message)
                 
         except Exception as e:
             logger.error(f"Error processing WhatsApp message: {e}")
@@ -778,15 +804,28 @@ class WhatsAppWebhookView(View):
         
         if not created:
             customer.last_contact_at = timezone.now()
-            customer.last_seen_at = timezone.now()
-            customer.save(update_fields=['last_contact_at', 'last_seen_at'])
+            customer.save(update_fields=['last_contact_at'])
+        
+        # last_seen_at is flushed from the presence store in bulk
+        customer.touch()
             
         return customer
     
     @sync_to_async
     def _get_or_create_conversation(self, customer, tenant_account, platform):
+        # Serializable so concurrent webhooks for a new customer message
+        # cannot each create an active conversation
+        conversation = run_serializable(self._find_or_open_conversation, customer, tenant_account, platform)
+        
+        conversation.last_message_at = timezone.now()
+        conversation.save(update_fields=['last_message_at'])
+        
+        return conversation
+    
+    @staticmethod
+    def _find_or_open_conversation(customer, tenant_account, platform):
         try:
-            conversation = Conversation.objects.get(
+            return Conversation.objects.get(
                 customer=customer,
                 platform=platform,
                 platform_account=tenant_account,
@@ -794,7 +833,7 @@ class WhatsAppWebhookView(View):
                 tenant=tenant_account.tenant
             )
         except Conversation.DoesNotExist:
-            conversation = Conversation.objects.create(
+            return Conversation.objects.create(
                 tenant=tenant_account.tenant,
                 customer=customer,
                 platform=platform,
@@ -808,11 +847,6 @@ class WhatsAppWebhookView(View):
                 first_message_at=timezone.now(),
                 last_message_at=timezone.now()
             )
-        
-        conversation.last_message_at = timezone.now()
-        conversation.save(update_fields=['last_message_at'])
-        
-        return conversation
     
     @sync_to_async
     def _create_message(self, tenant, conversation, external_message_id, content, 
@@ -824,55 +858,66 @@ class WhatsAppWebhookView(View):
                 platform_timestamp = timezone.now()
         else:
             platform_timestamp = timezone.now()
+        
+        with transaction.atomic():
+            key = None
+            if external_message_id:
+                # Platforms redeliver webhooks; store each platform message once
+                key, created = ExternalMessageKey.objects.get_or_create(
+                    tenant=tenant,
+                    conversation=conversation,
+                    external_message_id=external_message_id
+                )
+                if not created:
+                    return None
+            
+            message = Message.objects.create(
+                tenant=tenant,
+                conversation=conversation,
+                external_message_id=external_message_id or f"{sender_type}_{uuid.uuid4().hex[:16]}",
+                message_type='text',
+                direction=direction,
+                sender_type=sender_type,
+                sender_id=customer.id if sender_type == 'customer' else None,
+                sender_name=customer.platform_display_name or customer.platform_username,
+                content_encrypted=content,
+                content_hash=str(hash(content)),
+                delivery_status='delivered',
+                platform_timestamp=platform_timestamp,
+                ai_processed=False
+            )
             
-        message = Message.objects.create(
-            tenant=tenant,
-            conversation=conversation,
-            external_message_id=external_message_id or f"{sender_type}_{uuid.uuid4().hex[:16]}",
-            message_type='text',
-            direction=direction,
-            sender_type=sender_type,
-            sender_id=customer.id if sender_type == 'customer' else None,
-            sender_name=customer.platform_display_name or customer.platform_username,
-            content_encrypted=content,
-            content_hash=str(hash(content)),
-            delivery_status='delivered',
-            platform_timestamp=platform_timestamp,
-            ai_processed=False
-        )
+            if key:
+                key.message = message
+                key.save(update_fields=['message'])
         
         return message
     
     @sync_to_async
-    def _should_ai_handle_conversation(self, conversation):
+    def _get_ai_settings(self, conversation):
+        return TenantAISetting.objects.filter(
+            tenant_id=conversation.tenant_id,
+            platform_id=conversation.platform_id
+        ).first()
+    
+    def _should_ai_handle_conversation(self, conversation, ai_settings):
         if conversation.assigned_user_id:
             return False
         if conversation.ai_paused_by_user_id:
             return False
         if not conversation.ai_enabled:
             return False
-            
-        try:
-            ai_settings = TenantAISetting.objects.get(
-                tenant=conversation.tenant,
-                platform=conversation.platform
-            )
-            return ai_settings.auto_response_enabled
-        except TenantAISetting.DoesNotExist:
-            return True
+        
+        return ai_settings.auto_response_enabled if ai_settings else True
     
-    async def _send_to_rag_processor(self, conversation_id, message_text):
+    async def _send_to_rag_processor(self, conversation_id, message_text, message_id=None):
+        """True when the question was queued for an AI reply"""
         try:
-            await channel_layer.group_send(
-                f"rag_processor_{conversation_id}",
-                {
-                    'type': 'process_message',
-                    'message': message_text,
-                    'conversation_id': str(conversation_id)
-                }
-            )
+            # Replies are generated by the RAG service, with or without an open websocket
+            return rag_service.submit(conversation_id, message_text, message_id=message_id)
         except Exception as e:
             logger.error(f"Error sending to RAG processor: {e}")
+            return False
     
     async def _notify_human_agents(self, conversation_id, message):
         try:
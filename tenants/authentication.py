@@ -1,15 +1,89 @@
 # tenants/authentication.py
+import time
+
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache import is_shared_cache
+
+
+def _user_generation_key(user_id):
+    return f'auth:gen:user:{user_id}'
+
+
+def _tenant_generation_key(tenant_id):
+    return f'auth:gen:tenant:{tenant_id}'
+
+
+def _generations(*keys):
+    """
+    Current generation numbers for the keys. A missing generation is started
+    at the current time, so principals cached before it was evicted can never
+    match again.
+    """
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def principal_cache_enabled():
+    """
+    Principals are only cached in a cache shared by every worker; a
+    process-local cache would miss invalidations made by other workers.
+    """
+    return getattr(settings, 'AUTH_PRINCIPAL_CACHE_SECONDS', 60) > 0 and is_shared_cache()
+
+
+def _bump_generation(key):
+    if not principal_cache_enabled():
+        return
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+    # After commit, so a concurrent request cannot re-cache the old row
+    transaction.on_commit(bump)
+
+
+def invalidate_user_principal(user_id):
+    """Drop every cached principal of a user (deactivation, role or permission change)"""
+    _bump_generation(_user_generation_key(user_id))
+
+
+def invalidate_tenant_principals(tenant_id):
+    """Drop the cached principals of every user of a tenant (suspension)"""
+    _bump_generation(_tenant_generation_key(tenant_id))
 
 
 class TenantJWTAuthentication(JWTAuthentication):
     """
     Custom JWT authentication with tenant validation
+
+    Validated principals are cached in the shared cache for
+    AUTH_PRINCIPAL_CACHE_SECONDS per user and token (jti), under the user's
+    and the tenant's generation numbers.
+    Saving a TenantUser or Tenant bumps the generation, so deactivation and
+    suspension take effect on the next request. The tenant is taken from the
+    token's tenant_id claim, so a cache hit costs no database query.
     """
-    
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Views read the tenant from the request
+            request._request.tenant = result[0].tenant
+        return result
+
     def get_user(self, validated_token):
         """
         Get user from validated token and perform tenant checks
@@ -18,7 +92,30 @@ class TenantJWTAuthentication(JWTAuthentication):
             user_id = validated_token['user_id']
         except KeyError:
             raise InvalidToken('Token contained no recognizable user identification')
-        
+
+        tenant_id = validated_token.get('tenant_id')
+        jti = validated_token.get('jti')
+        key = None
+        if tenant_id and jti and principal_cache_enabled():
+            user_generation, tenant_generation = _generations(
+                _user_generation_key(user_id), _tenant_generation_key(tenant_id)
+            )
+            key = f'auth:principal:{user_id}:{user_generation}:{tenant_generation}:{jti}'
+            user = cache.get(key)
+            if user is not None:
+                return user
+
+        user = self._load_user(user_id)
+
+        if tenant_id and str(user.tenant_id) != str(tenant_id):
+            raise AuthenticationFailed('Token was issued for another tenant')
+
+        if key:
+            cache.set(key, user, getattr(settings, 'AUTH_PRINCIPAL_CACHE_SECONDS', 60))
+        return user
+
+    @staticmethod
+    def _load_user(user_id):
         try:
             User = get_user_model()
             user = User.objects.select_related('tenant').get(id=user_id)
@@ -0,0 +1,18 @@
+# tenants/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_tenant_principals, invalidate_user_principal
+from .models import Tenant, TenantUser
+
+
+@receiver([post_save, post_delete], sender=TenantUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Deactivation, role and permission changes apply to the next request"""
+    invalidate_user_principal(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def invalidate_cached_tenant_users(sender, instance, **kwargs):
+    """A suspended tenant's users are rejected on their next request"""
+    invalidate_tenant_principals(instance.id)